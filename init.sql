@@ -1,29 +1,97 @@
 -- public.tb_chart definition
+--
+-- tb_chart é uma view sobre tb_chart_fact, que guarda source, label, analysis e nutrient
+-- como ids smallint das tabelas de dimensão tb_dim_*; a view mantém as colunas de antes,
+-- com nutrient no final. Ver src/db/dimensions.py, que também migra uma tb_chart antiga.
 
--- Drop table
+-- Drop objects
 
-DROP TABLE public.tb_chart;
+DO $$
+BEGIN
+	IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('public.tb_chart')) = 'r' THEN
+		DROP TABLE public.tb_chart;
+	END IF;
+END
+$$;
+DROP VIEW IF EXISTS public.tb_chart;
+-- Tabelas derivadas dos registros (manifesto da carga incremental, rollup anual, cache
+-- de respostas e versão dos dados): sem elas a próxima carga recarrega todos os
+-- arquivos e as recria
+DROP TABLE IF EXISTS public.tb_load_manifest;
+DROP TABLE IF EXISTS public.tb_chart_rollup_yearly;
+DROP TABLE IF EXISTS public.tb_chart_response_cache;
+DROP TABLE IF EXISTS public.tb_chart_data_version;
+DROP TABLE IF EXISTS public.tb_chart_fact;
+DROP TABLE IF EXISTS public.tb_dim_source;
+DROP TABLE IF EXISTS public.tb_dim_analysis;
+DROP TABLE IF EXISTS public.tb_dim_label;
+DROP TABLE IF EXISTS public.tb_dim_nutrient;
 
-CREATE TABLE public.tb_chart (
-	id serial4 NOT NULL,
-	country varchar(2000) NOT NULL,
-	state varchar(2) NOT NULL,
-	city varchar(50) NOT NULL,
-	"source" varchar(4000) NOT NULL,
+CREATE TABLE public.tb_dim_source (
+	id smallserial NOT NULL,
+	"name" varchar(4000) NOT NULL,
+	CONSTRAINT tb_dim_source_pkey PRIMARY KEY (id),
+	CONSTRAINT tb_dim_source_name_key UNIQUE ("name")
+);
+
+CREATE TABLE public.tb_dim_analysis (
+	id smallserial NOT NULL,
+	"name" varchar(4000) NOT NULL,
+	CONSTRAINT tb_dim_analysis_pkey PRIMARY KEY (id),
+	CONSTRAINT tb_dim_analysis_name_key UNIQUE ("name")
+);
+
+CREATE TABLE public.tb_dim_label (
+	id smallserial NOT NULL,
+	"name" varchar(50) NOT NULL,
+	CONSTRAINT tb_dim_label_pkey PRIMARY KEY (id),
+	CONSTRAINT tb_dim_label_name_key UNIQUE ("name")
+);
+
+CREATE TABLE public.tb_dim_nutrient (
+	id smallserial NOT NULL,
+	"name" varchar(1) NOT NULL,
+	CONSTRAINT tb_dim_nutrient_pkey PRIMARY KEY (id),
+	CONSTRAINT tb_dim_nutrient_name_key UNIQUE ("name")
+);
+
+-- Colunas de largura fixa antes das de tamanho variável, para evitar bytes de alinhamento
+CREATE SEQUENCE public.tb_chart_id_seq AS integer;
+
+CREATE TABLE public.tb_chart_fact (
+	id int4 DEFAULT nextval('tb_chart_id_seq'::regclass) NOT NULL,
 	"period" date NOT NULL,
-	"label" varchar(50) NOT NULL,
 	value float8 NOT NULL,
 	created_at timestamp DEFAULT CURRENT_TIMESTAMP NULL,
 	updated_at timestamp DEFAULT CURRENT_TIMESTAMP NULL,
-	analysis varchar(4000) NOT NULL,
+	source_id int2 NOT NULL,
+	label_id int2 NOT NULL,
+	analysis_id int2 NOT NULL,
+	nutrient_id int2 NULL,
+	country varchar(2000) NOT NULL,
+	state varchar(2) NOT NULL,
+	city varchar(50) NOT NULL,
 	"class" varchar(50) NULL,
     nutrient_flow varchar(7) NOT NULL CHECK (nutrient_flow IN ('entrada', 'saída')) DEFAULT 'entrada',
-	CONSTRAINT tb_chart_pkey PRIMARY KEY (id)
+	CONSTRAINT tb_chart_fact_pkey PRIMARY KEY (id)
 );
 
+ALTER SEQUENCE public.tb_chart_id_seq OWNED BY public.tb_chart_fact.id;
+
+CREATE VIEW public.tb_chart AS
+SELECT
+	fact.id, fact.country, fact.state, fact.city, source.name AS "source", fact.period,
+	label.name AS "label", fact.value, fact.created_at, fact.updated_at, analysis.name AS analysis,
+	fact.class, fact.nutrient_flow, nutrient.name AS nutrient
+FROM public.tb_chart_fact AS fact
+JOIN public.tb_dim_source AS source ON source.id = fact.source_id
+JOIN public.tb_dim_label AS label ON label.id = fact.label_id
+JOIN public.tb_dim_analysis AS analysis ON analysis.id = fact.analysis_id
+LEFT JOIN public.tb_dim_nutrient AS nutrient ON nutrient.id = fact.nutrient_id;
+
 -- Table comment
 
-COMMENT ON TABLE public.tb_chart IS 'Armazena dados relacionados ao projeto IS-AGRO, voltado para a exibição de painéis de informações sobre meio ambiente e agronomia no Brasil. Contém registros sobre diferentes tipos de análises, como erosão, GEE, NH3, NPK, orgânicas, pesticidas e poluição, organizados por localização geográfica e período.';
+COMMENT ON VIEW public.tb_chart IS 'Armazena dados relacionados ao projeto IS-AGRO, voltado para a exibição de painéis de informações sobre meio ambiente e agronomia no Brasil. Contém registros sobre diferentes tipos de análises, como erosão, GEE, NH3, NPK, orgânicas, pesticidas e poluição, organizados por localização geográfica e período.';
 COMMENT ON COLUMN public.tb_chart.country IS 'Código do país no formato ISO 3166-1 alfa-2. Exemplo: BR para Brasil.';
 COMMENT ON COLUMN public.tb_chart.state IS 'Código do estado no formato ISO 3166-2. Exemplo: RJ para Rio de Janeiro.';
 COMMENT ON COLUMN public.tb_chart.city IS 'Nome da cidade relacionada ao registro.';
@@ -35,3 +103,9 @@ COMMENT ON COLUMN public.tb_chart.created_at IS 'Data de criação do registro.'
 COMMENT ON COLUMN public.tb_chart.updated_at IS 'Data de atualização do registro.';
 COMMENT ON COLUMN public.tb_chart.analysis IS 'Tipo de indicador referente ao registro, como erosão, GEE, NH3, NPK, orgânicas, pesticidas ou poluição.';
 COMMENT ON COLUMN public.tb_chart.nutrient_flow IS 'Entrada Refere-se ao que é adicionado ao sistema agrícola. Isso pode incluir qualquer substância ou material que enriqueça o solo, as plantas ou o ambiente em torno da área cultivada. Saída: Refere-se ao que é removido do sistema agrícola. Isso pode incluir qualquer material que é retirado do solo, plantas ou do ambiente.';
+COMMENT ON COLUMN public.tb_chart.nutrient IS 'Nutriente do registro (N, P ou K) nos indicadores NPK; vazio nos demais.';
+COMMENT ON TABLE public.tb_chart_fact IS 'Armazena dados relacionados ao projeto IS-AGRO, voltado para a exibição de painéis de informações sobre meio ambiente e agronomia no Brasil. Contém registros sobre diferentes tipos de análises, como erosão, GEE, NH3, NPK, orgânicas, pesticidas e poluição, organizados por localização geográfica e período.';
+COMMENT ON COLUMN public.tb_chart_fact.source_id IS 'Id da fonte em tb_dim_source.';
+COMMENT ON COLUMN public.tb_chart_fact.label_id IS 'Id do rótulo em tb_dim_label.';
+COMMENT ON COLUMN public.tb_chart_fact.analysis_id IS 'Id do indicador em tb_dim_analysis.';
+COMMENT ON COLUMN public.tb_chart_fact.nutrient_id IS 'Id do nutriente em tb_dim_nutrient; nulo fora dos indicadores NPK.';
@@ -16,38 +16,26 @@ fi
 echo "Ativando ambiente virtual..."
 source venv/bin/activate
 
-# Instala os pacotes do requirements.txt
-echo "Instalando dependências..."
-pip install -r requirements.txt
-
-# Executa o script Python de limpesa de dados
-python3 src/db/data_cleanner.py
-
-# Executa o script Python
-echo "Executando o script Python..."
-python3 src/db/ouro_amonia_agro.py
-python3 src/db/ouro_area_agricola_OCDE.py
-python3 src/db/ouro_gee_agropecuaria.py
-python3 src/db/ouro_gee_OCDE.py
-python3 src/db/ouro_npk_carcaca_bovina.py
-python3 src/db/ouro_npk_dejetos.py
-python3 src/db/ouro_npk_deposicao_atmosferica.py
-python3 src/db/ouro_npk_fert_organico_vinhaca.py
-python3 src/db/ouro_npk_fert_sintetico.py
-python3 src/db/ouro_npk_fixbioN.py
-python3 src/db/ouro_npk_producao_agricola.py
-python3 src/db/ouro_npk_sementes.py
-python3 src/db/update_state.py
-python3 src/db/update_countries.py
+# Instala os pacotes do requirements.txt só quando o arquivo muda
+REQUIREMENTS_HASH=$(sha256sum requirements.txt | cut -d' ' -f1)
+if [ "$(cat venv/.requirements.sha256 2>/dev/null)" != "$REQUIREMENTS_HASH" ]; then
+    echo "Instalando dependências..."
+    pip install -r requirements.txt && echo "$REQUIREMENTS_HASH" > venv/.requirements.sha256
+fi
 
-# Gera dados fictícios para os indicadores
-echo "Gerando massa de dados fictícia..."
-python3 src/db/data_mass_generator.py NPK 1000000
-python3 src/db/data_mass_generator.py GEE 1000000
-python3 src/db/data_mass_generator.py NH3 1000000
+# Executa a carga como um grafo de passos (src/db/pipeline.py): esquema, carga
+# incremental dos CSVs registrados em src/db/dataset_specs.py (em paralelo),
+# normalização de países, índices, rollup anual e cache de respostas dos endpoints
+# de gráficos. Passos em dia (ex.: arquivos que não mudaram) são pulados. A massa de
+# dados fictícia não faz parte da carga padrão; para testes de volume, use
+# "python3 src/db/pipeline.py --scale 100" (registros com a fonte 'sintético:<fonte>')
+echo "Executando o pipeline de carga..."
+python3 src/db/pipeline.py
+STATUS=$?
 
 # Desativa o ambiente virtual
 echo "Desativando ambiente virtual..."
 deactivate
 
 echo "Processo concluído."
+exit $STATUS
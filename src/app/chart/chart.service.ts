@@ -232,6 +232,63 @@ export class ChartService {
 		return whereClause;
 	}
 
+	/**
+	 * Resposta pré-calculada por src/db/response_cache.py (tb_chart_response_cache) para
+	 * o endpoint e os parâmetros, ou null se a combinação não foi pré-calculada, se os
+	 * dados mudaram desde o cálculo (data_version diferente de tb_chart_data_version) ou
+	 * se o cache não existe; nesses casos a consulta sobre tb_chart é feita normalmente.
+	 * Intervalos de datas não são pré-calculados.
+	 */
+	private async findCachedResponse(
+		kind: 'sum' | 'percentage' | 'sma',
+		range: number,
+		analysis: string,
+		label?: string,
+		startDate?: string,
+		endDate?: string,
+		country?: string,
+		state?: string,
+		city?: string,
+		source?: string): Promise<IStackedData[] | null> {
+
+		if (startDate || endDate) {
+			return null;
+		}
+
+		// Mesma chave de response_cache.filter_key: query string na ordem source, country, state, city
+		const filters = new URLSearchParams();
+		for (const [name, value] of [['source', source], ['country', country], ['state', state], ['city', city]]) {
+			if (value) {
+				filters.append(name, value);
+			}
+		}
+
+		const queryRunner = this.dataSourceService.getDataSource().createQueryRunner();
+		let result: any[];
+		try {
+			result = await queryRunner.query(`
+				SELECT cache.response
+				FROM tb_chart_response_cache AS cache
+				JOIN tb_chart_data_version AS version ON version.version = cache.data_version
+				WHERE cache.kind = $1 AND cache.analysis = $2 AND cache.range_years = $3
+					AND cache.label = $4 AND cache.filters = $5;
+			`, [kind, analysis, range, label || '', filters.toString()]);
+		} catch (error) {
+			this.logger.warn(`Response cache unavailable, querying tb_chart: ${error.message}`);
+			return null;
+		} finally {
+			await queryRunner.release();
+		}
+
+		if (!result || result.length === 0) {
+			return null;
+		}
+		if (result[0].response.length === 0) {
+			throw new NotFoundException('Nenhum dado encontrado para o período especificado');
+		}
+		return result[0].response;
+	}
+
     async findPercentageAnnual(
         analysis: string,
         label?: string,
@@ -244,6 +301,11 @@ export class ChartService {
     ): Promise<IStackedData[]> {
         this.logger.log(`Finding annual percnetage stacked charts for analysis=${analysis}, label=${label}, startDate=${startDate}, endDate=${endDate}, country=${country}, state=${state}, city=${city}, source=${source}`);
 
+        const cached = await this.findCachedResponse('percentage', 1, analysis, label, startDate, endDate, country, state, city, source);
+        if (cached) {
+            return cached;
+        }
+
         const queryRunner = this.dataSourceService.getDataSource().createQueryRunner();
 		const whereClause = this.getWhereClause(analysis, label, startDate, endDate, country, state, city, source);
 
@@ -362,6 +424,11 @@ export class ChartService {
 
         this.logger.log(`Finding percnetage stacked charts for analysis=${analysis}, range=${range}, label=${label}, startDate=${startDate}, endDate=${endDate}, country=${country}, state=${state}, city=${city}, source=${source}`);
 
+        const cached = await this.findCachedResponse('percentage', range, analysis, label, startDate, endDate, country, state, city, source);
+        if (cached) {
+            return cached;
+        }
+
         const queryRunner = this.dataSourceService.getDataSource().createQueryRunner();
 		const whereClause = this.getWhereClause(analysis, label, startDate, endDate, country, state, city, source);
 
@@ -371,7 +438,7 @@ export class ChartService {
 						Report.end_period_group,
 						Report.total_value,
 						Report.total_count,
-						ROUND((Report.total_value / NULLIF(TotalSum.total_value_all_periods, 0)) * 100, 2) AS percentual_total
+						ROUND(CAST((Report.total_value / NULLIF(TotalSum.total_value_all_periods, 0)) * 100 AS NUMERIC), 2) AS percentual_total
 					FROM (
 						SELECT
 							FLOOR(EXTRACT(YEAR FROM tb_chart.period) / ${range}) * ${range} AS start_period_group,
@@ -422,6 +489,11 @@ export class ChartService {
     ): Promise<IStackedData[]> {
         this.logger.log(`Finding annual mobile average percnetage stacked charts for analysis=${analysis}, label=${label}, startDate=${startDate}, endDate=${endDate}, country=${country}, state=${state}, city=${city}, source=${source}`);
 
+        const cached = await this.findCachedResponse('sma', 1, analysis, label, startDate, endDate, country, state, city, source);
+        if (cached) {
+            return cached;
+        }
+
         const queryRunner = this.dataSourceService.getDataSource().createQueryRunner();
 		const whereClause = this.getWhereClause(analysis, label, startDate, endDate, country, state, city, source);
 
@@ -543,43 +615,39 @@ export class ChartService {
 
         this.logger.log(`Finding mobile-average stacked charts for analysis=${analysis}, range=${range}, label=${label}, startDate=${startDate}, endDate=${endDate}, country=${country}, state=${state}, city=${city}, source=${source}`);
 
+        const cached = await this.findCachedResponse('sma', range, analysis, label, startDate, endDate, country, state, city, source);
+        if (cached) {
+            return cached;
+        }
+
         const queryRunner = this.dataSourceService.getDataSource().createQueryRunner();
 		const whereClause = this.getWhereClause(analysis, label, startDate, endDate, country, state, city, source);
 
+        // Para cada período e rótulo, o percentual do total do rótulo em todos os períodos
         const query = `
 					SELECT
-							Report.label,
-							Report.start_period_group,
-							Report.end_period_group,
-							Report.total_value,
-							Report.total_count,
-							TotalSum.total_value_all_periods,
-							ROUND((CAST(Report.total_value AS DECIMAL) / NULLIF(TotalSum.total_value_all_periods, 0)) * 100, 4) AS media_total
+						Report.label,
+						Report.start_period_group,
+						Report.end_period_group,
+						Report.total_value,
+						Report.total_count,
+						LabelTotals.total_value_all_periods,
+						ROUND((CAST(Report.total_value AS DECIMAL) / NULLIF(LabelTotals.total_value_all_periods, 0)) * 100, 4) AS media_total
 					FROM (
 						SELECT
-							tb_chart.label,  -- Agrupando por rótulo
-							(EXTRACT(YEAR FROM tb_chart.period) / ${range}) * ${range} AS start_period_group,
-							((EXTRACT(YEAR FROM tb_chart.period) / ${range}) * ${range}) + ${range-1} AS end_period_group,
+							tb_chart.label,
+							FLOOR(EXTRACT(YEAR FROM tb_chart.period) / ${range}) * ${range} AS start_period_group,
+							(FLOOR(EXTRACT(YEAR FROM tb_chart.period) / ${range}) * ${range}) + ${range-1} AS end_period_group,
 							SUM(tb_chart.value) AS total_value,
 							COUNT(tb_chart.value) AS total_count
 						FROM
 							tb_chart
             				${whereClause}
 						GROUP BY
-							tb_chart.label,  -- Agrupando também por rótulo
-							(EXTRACT(YEAR FROM tb_chart.period) / ${range}) * ${range}
-						ORDER BY start_period_group ASC, tb_chart.label ASC;
+							tb_chart.label,
+							FLOOR(EXTRACT(YEAR FROM tb_chart.period) / ${range})
 					) AS Report
 					JOIN (
-						SELECT
-							FLOOR(EXTRACT(YEAR FROM tb_chart.period) / ${range}) * ${range} AS start_period_group,
-							SUM(tb_chart.value) AS total_value_period
-						FROM
-							tb_chart
-            				${whereClause}
-						GROUP BY
-							FLOOR(EXTRACT(YEAR FROM tb_chart.period) / ${range})
-
 						SELECT
 							tb_chart.label,
 							SUM(CAST(tb_chart.value AS DECIMAL)) AS total_value_all_periods
@@ -588,10 +656,10 @@ export class ChartService {
             				${whereClause}
 						GROUP BY
 							tb_chart.label
-					) AS PeriodTotals
-					ON Report.start_period_group = PeriodTotals.start_period_group
+					) AS LabelTotals
+					ON Report.label = LabelTotals.label
 					ORDER BY
-						Report.start_period_group ASC;
+						Report.start_period_group ASC, Report.label ASC;
         `;
 
         const result = await queryRunner.query(query);
@@ -603,7 +671,7 @@ export class ChartService {
 
         const stackedData = result.map((item: any) => ({
             period: `${item.start_period_group}-${item.end_period_group}`,
-            entry: [analysis, item.percentual_total],
+            entry: [item.label, item.media_total],
         }));
 
 		return stackedData;
@@ -621,6 +689,11 @@ export class ChartService {
     ): Promise<IStackedData[]> {
         this.logger.log(`Finding annual stacked charts for analysis: ${analysis}, from ${startDate} to ${endDate}`);
 
+        const cached = await this.findCachedResponse('sum', 1, analysis, label, startDate, endDate, country, state, city, source);
+        if (cached) {
+            return cached;
+        }
+
         const queryRunner = this.dataSourceService.getDataSource().createQueryRunner();
 		const whereClause = this.getWhereClause(analysis, label, startDate, endDate, country, state, city, source);
 
@@ -663,6 +736,11 @@ export class ChartService {
     ): Promise<IStackedData[]> {
         this.logger.log(`Finding biennial stacked charts for analysis: ${analysis}, from ${startDate} to ${endDate}`);
 
+        const cached = await this.findCachedResponse('sum', 2, analysis, label, startDate, endDate, country, state, city, source);
+        if (cached) {
+            return cached;
+        }
+
         const queryRunner = this.dataSourceService.getDataSource().createQueryRunner();
 		const whereClause = this.getWhereClause(analysis, label, startDate, endDate, country, state, city, source);
 
@@ -705,6 +783,11 @@ export class ChartService {
     ): Promise<IStackedData[]> {
         this.logger.log(`Finding triennial stacked charts for analysis: ${analysis}, from ${startDate} to ${endDate}`);
 
+        const cached = await this.findCachedResponse('sum', 3, analysis, label, startDate, endDate, country, state, city, source);
+        if (cached) {
+            return cached;
+        }
+
         const queryRunner = this.dataSourceService.getDataSource().createQueryRunner();
 		const whereClause = this.getWhereClause(analysis, label, startDate, endDate, country, state, city, source);
 
@@ -747,6 +830,11 @@ export class ChartService {
     ): Promise<IStackedData[]> {
         this.logger.log(`Finding quadrennial stacked charts for analysis: ${analysis}, from ${startDate} to ${endDate}`);
 
+        const cached = await this.findCachedResponse('sum', 4, analysis, label, startDate, endDate, country, state, city, source);
+        if (cached) {
+            return cached;
+        }
+
         const queryRunner = this.dataSourceService.getDataSource().createQueryRunner();
 		const whereClause = this.getWhereClause(analysis, label, startDate, endDate, country, state, city, source);
 
@@ -789,6 +877,11 @@ export class ChartService {
     ): Promise<IStackedData[]> {
         this.logger.log(`Finding quintennial stacked charts for analysis: ${analysis}, from ${startDate} to ${endDate}`);
 
+        const cached = await this.findCachedResponse('sum', 5, analysis, label, startDate, endDate, country, state, city, source);
+        if (cached) {
+            return cached;
+        }
+
         const queryRunner = this.dataSourceService.getDataSource().createQueryRunner();
 		const whereClause = this.getWhereClause(analysis, label, startDate, endDate, country, state, city, source);
 
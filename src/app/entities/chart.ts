@@ -51,6 +51,10 @@ import { ApiProperty } from '@nestjs/swagger';
 	@ApiProperty({ description: "Tipo de análise referente ao registro, como erosão, GEE, NH3, NPK, orgânicas, pesticidas ou poluição.",  })
 	analysis: string;
 
+	@Column({ type: 'varchar', length: 1, nullable: true })
+	@ApiProperty({ description: "Nutriente do registro (N, P ou K) nos indicadores NPK; vazio nos demais.", nullable: true })
+	nutrient: string;
+
 	@Column({ type: 'varchar', length: 7, default: 'entrada' })
 	@ApiProperty({ description: "Tipo de transação, pode ser 'entrada' ou 'saída'." })
 	nutrient_flow: string;
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+import numpy as np
+from columnar import DictColumn
+
+# Filtros aceitos pelos endpoints, além de analysis e do intervalo de datas
+DIMENSION_FILTERS = ('label', 'country', 'state', 'city', 'source', 'nutrient')
+
+# Início do intervalo quando só endDate é informado (ver ChartService.getWhereClause)
+MIN_DATE = '1900-01-01'
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+def sql_round(value, places):
+    """Arredonda como o ROUND do PostgreSQL para numeric (metade para longe do zero), em um Decimal com places casas."""
+    # + 0 troca -0.00 por 0.00, como o numeric do PostgreSQL, que não tem zero negativo
+    return Decimal(repr(float(value))).quantize(Decimal(1).scaleb(-places), rounding=ROUND_HALF_UP) + 0
+
+def numeric_text(value):
+    """
+    Valor numeric como o node-pg o entrega ao ChartService: texto ('1990', '0.12'), não
+    número. EXTRACT, FLOOR e ROUND retornam numeric, então os períodos e os percentuais
+    das respostas são textos; None continua None (NULL).
+    """
+    return None if value is None else format(Decimal(value), 'f')
+
+def ordinal_years(ordinals):
+    """Converte ordinais de data (date.toordinal) no ano correspondente, sem laço por linha."""
+    days = (np.asarray(ordinals, dtype=np.int64) - EPOCH_ORDINAL).astype('datetime64[D]')
+    return days.astype('datetime64[Y]').astype(np.int64) + 1970
+
+def match(column, value):
+    """Máscara das linhas em que a coluna (DictColumn ou array) é igual ao valor."""
+    if isinstance(column, DictColumn):
+        if value not in column.values:
+            return np.zeros(len(column.codes), dtype=bool)
+        return column.codes == column.values.index(value)
+    return column == value
+
+def filter_mask(data, analysis, label=None, start_date=None, end_date=None,
+                country=None, state=None, city=None, source=None, nutrient=None):
+    """
+    Máscara das linhas selecionadas pelos mesmos filtros de ChartService.getWhereClause.
+
+    Como no serviço, só startDate vai até a data de hoje e só endDate começa em 1900-01-01;
+    os limites são inclusivos.
+    """
+    mask = match(data.columns['analysis'], analysis)
+    if start_date or end_date:
+        start = date.fromisoformat(start_date or MIN_DATE).toordinal()
+        end = date.fromisoformat(end_date).toordinal() if end_date else date.today().toordinal()
+        period = data.columns['period']
+        mask &= (period >= start) & (period <= end)
+    filters = {'label': label, 'country': country, 'state': state, 'city': city, 'source': source, 'nutrient': nutrient}
+    for name, value in filters.items():
+        if value:
+            mask &= match(data.columns[name], value)
+    return mask
+
+def _selection(data, mask, range_years):
+    """Ano agrupado (FLOOR(ano / range) * range), código do rótulo e valor das linhas selecionadas."""
+    label = data.columns['label']
+    buckets = ordinal_years(data.columns['period'][mask]) // range_years * range_years
+    return buckets, np.asarray(label.codes)[mask], np.asarray(data.columns['value'])[mask], label.values
+
+def _group_sums(keys, values):
+    """Soma e contagem por chave, ordenadas pela chave (np.unique + np.bincount)."""
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    sums = np.bincount(inverse, weights=values, minlength=len(unique_keys))
+    counts = np.bincount(inverse, minlength=len(unique_keys))
+    return unique_keys, sums, counts
+
+def sum_by_period(data, analysis, range_years=1, **filters):
+    """
+    Reproduz ChartService.findSum*: soma por período de range_years anos e por rótulo.
+    Retorna uma lista de {'period': início do período, 'entry': [rótulo, soma]}, com os
+    tipos da resposta do serviço: o período em texto (numeric) e a soma em float (float8).
+    """
+    buckets, labels, values, label_values = _selection(data, filter_mask(data, analysis, **filters), range_years)
+    if not len(values):
+        return []
+    keys = buckets * len(label_values) + labels
+    unique_keys, sums, _ = _group_sums(keys, values)
+    groups = [(int(key // len(label_values)), label_values[key % len(label_values)], float(total))
+              for key, total in zip(unique_keys, sums)]
+    groups.sort(key=lambda group: (group[0], group[1]))
+    return [{'period': numeric_text(period), 'entry': [label, total]} for period, label, total in groups]
+
+def percentage_by_period(data, analysis, range_years=1, **filters):
+    """
+    Reproduz ChartService.findPercentageAnnual e findPercentage: participação de cada
+    período no total filtrado. Como no serviço, a versão anual retorna a fração
+    arredondada em 2 casas (sem multiplicar por 100) e o período é o ano; as demais
+    retornam o percentual e o período 'início-fim'. Períodos e percentuais são textos,
+    como os numeric da consulta do serviço (ver numeric_text).
+    """
+    buckets, _, values, _ = _selection(data, filter_mask(data, analysis, **filters), range_years)
+    if not len(values):
+        return []
+    unique_buckets, sums, _ = _group_sums(buckets, values)
+    total = values.sum()
+    result = []
+    for bucket, bucket_sum in zip(unique_buckets, sums):
+        if range_years == 1:
+            share = numeric_text(sql_round(bucket_sum / total, 2) if total else None)
+            result.append({'period': numeric_text(int(bucket)), 'entry': [analysis, share]})
+        else:
+            share = numeric_text(sql_round(bucket_sum / total * 100, 2) if total else None)
+            result.append({'period': f'{int(bucket)}-{int(bucket) + range_years - 1}', 'entry': [analysis, share]})
+    return result
+
+def mobile_average_by_period(data, analysis, range_years=1, **filters):
+    """
+    Reproduz ChartService.findMobileAverage*.
+
+    Anual: percentual de cada ano no total filtrado, em 4 casas, com o período igual ao
+    ano. Para range_years > 1: para cada período e rótulo, o percentual do total daquele
+    rótulo em todos os períodos, com o período 'início-fim' e a entrada [rótulo, percentual].
+    """
+    buckets, labels, values, label_values = _selection(data, filter_mask(data, analysis, **filters), range_years)
+    if not len(values):
+        return []
+    if range_years == 1:
+        unique_buckets, sums, _ = _group_sums(buckets, values)
+        total = values.sum()
+        return [{'period': numeric_text(int(bucket)), 'entry': [analysis, numeric_text(sql_round(bucket_sum / total * 100, 4) if total else None)]}
+                for bucket, bucket_sum in zip(unique_buckets, sums)]
+
+    label_totals = np.bincount(labels, weights=values, minlength=len(label_values))
+    keys = buckets * len(label_values) + labels
+    unique_keys, sums, _ = _group_sums(keys, values)
+    groups = []
+    for key, group_sum in zip(unique_keys, sums):
+        bucket, code = int(key // len(label_values)), int(key % len(label_values))
+        label_total = label_totals[code]
+        share = numeric_text(sql_round(group_sum / label_total * 100, 4) if label_total else None)
+        groups.append((bucket, label_values[code], share))
+    groups.sort(key=lambda group: (group[0], group[1]))
+    return [{'period': f'{bucket}-{bucket + range_years - 1}', 'entry': [label, share]} for bucket, label, share in groups]
+
+# Agregações disponíveis, com os mesmos nomes dos controllers
+AGGREGATIONS = {
+    'sum': sum_by_period,
+    'percentage': percentage_by_period,
+    'sma': mobile_average_by_period,
+}
+
+def compare_with_sql(cursor, data, analysis, range_years=1, **filters):
+    """
+    Compara sum_by_period com a soma calculada pelo PostgreSQL, na mesma forma da
+    consulta de ChartService.findSum*. Retorna a lista de diferenças (vazia se iguais).
+    """
+    conditions = ['analysis = %s']
+    params = [analysis]
+    start_date, end_date = filters.pop('start_date', None), filters.pop('end_date', None)
+    if start_date or end_date:
+        conditions.append('period BETWEEN %s AND %s')
+        params += [start_date or MIN_DATE, end_date or date.today().isoformat()]
+    for name in DIMENSION_FILTERS:
+        if filters.get(name):
+            conditions.append(f'{name} = %s')
+            params.append(filters[name])
+
+    cursor.execute(f"""
+        SELECT FLOOR(EXTRACT(YEAR FROM period) / %s) * %s AS period_group, label, SUM(value)
+        FROM tb_chart
+        WHERE {' AND '.join(conditions)}
+        GROUP BY 1, label
+    """, [range_years, range_years] + params)
+    expected = {(int(period), label): float(total) for period, label, total in cursor.fetchall()}
+    computed = {(int(item['period']), item['entry'][0]): item['entry'][1]
+                for item in sum_by_period(data, analysis, range_years, start_date=start_date, end_date=end_date, **filters)}
+
+    differences = []
+    for key in sorted(set(expected) | set(computed), key=str):
+        sql_value, numpy_value = expected.get(key), computed.get(key)
+        if sql_value is None or numpy_value is None or not np.isclose(sql_value, numpy_value, rtol=1e-9):
+            differences.append({'period': key[0], 'label': key[1], 'sql': sql_value, 'numpy': numpy_value})
+    return differences
+
+if __name__ == "__main__":
+    from snapshot_export import open_snapshot
+
+    parser = argparse.ArgumentParser(description="Calcula as respostas dos endpoints de gráficos a partir de um snapshot.")
+    parser.add_argument('snapshot_dir', help="Diretório gerado por snapshot_export.py")
+    parser.add_argument('kind', choices=list(AGGREGATIONS))
+    parser.add_argument('analysis')
+    parser.add_argument('--range', type=int, default=1, choices=range(1, 6), dest='range_years')
+    parser.add_argument('--start-date')
+    parser.add_argument('--end-date')
+    for name in DIMENSION_FILTERS:
+        parser.add_argument(f'--{name}')
+    args = vars(parser.parse_args())
+
+    snapshot = open_snapshot(args.pop('snapshot_dir'))
+    aggregate = AGGREGATIONS[args.pop('kind')]
+    print(json.dumps(aggregate(snapshot, **args), ensure_ascii=False, indent=2))
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import time
+import numpy as np
+import psycopg2
+from db_utils import get_db_connection, read_csv_file, BulkWriter, DimensionIds, COPY_BATCH_SIZE, FACT_COLUMNS, FACT_TABLE
+from dataset_specs import COUNTRY_STATE_LAYOUT, dataset
+from dimensions import seed_dimensions
+from loader import DATA_DIR, compile_spec, columnar_types, read_dataset_columns, encode_dataset_columns
+from validation import ChunkValidator
+from columnar import iter_csv_columns, slice_rows
+from streaming import BackgroundWriter, run_pipeline
+
+# Banco descartável usado pelo benchmark; é criado no mesmo servidor de DATABASE_HOST
+BENCHMARK_DATABASE = os.getenv('BENCHMARK_DATABASE', 'isagro_benchmark')
+
+# Script que define tb_chart, executado a cada medição para começar de uma tabela vazia
+INIT_SQL = os.path.join(DATA_DIR, '..', '..', 'init.sql')
+
+# CSV real usado como modelo dos arquivos sintéticos (mesmas colunas e valores)
+TEMPLATE_FILE = 'ouro_amonia_agro.csv'
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000, 10_000_000)
+DEFAULT_DATA_DIR = '/tmp/isagro-benchmark'
+DEFAULT_SEED = 42
+
+# Estratégias que gravam uma linha por vez; acima de --row-limit registros são ignoradas
+ROW_BY_ROW = ('insert_record', 'executemany')
+
+# INSERT de um registro com os ids das dimensões já resolvidos, como os gravados pelo COPY;
+# assim as estratégias linha a linha medem só a gravação, sem subconsultas por linha
+INSERT_FACT_QUERY = f"INSERT INTO {FACT_TABLE} ({', '.join(FACT_COLUMNS)}) VALUES ({', '.join(['%s'] * len(FACT_COLUMNS))})"
+
+def benchmark_spec(path):
+    """DatasetSpec de um arquivo sintético, no layout de ouro_amonia_agro.csv."""
+    return dataset(path, COUNTRY_STATE_LAYOUT, 'ISAgro', 'NH3', 'Benchmark')
+
+def generate_dataset(size, data_dir=DEFAULT_DATA_DIR, seed=DEFAULT_SEED):
+    """
+    Gera (ou reaproveita) um CSV com size registros no formato dos arquivos ouro_*.
+
+    O arquivo real TEMPLATE_FILE é repetido quantas vezes for preciso, com o valor
+    multiplicado por um fator aleatório; assim rótulos e estados têm a mesma distribuição
+    do real. Cada repetição recua as datas em um dia, para que as chaves continuem únicas
+    e nenhuma linha seja rejeitada como duplicada (ver validation.ChunkValidator).
+    Retorna o caminho do arquivo.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f'benchmark_{size}_{seed}.csv')
+    if os.path.exists(path):
+        return path
+
+    with open(os.path.join(DATA_DIR, TEMPLATE_FILE), newline='') as file:
+        csv_reader = csv.reader(file)
+        header = next(csv_reader)
+        template = list(csv_reader)
+    locations = [','.join(row[:2]) + ',' for row in template]
+    labels = [',' + row[3] + ',' for row in template]
+    dates = np.array([row[2] for row in template], dtype='datetime64[D]')
+    values = np.array([float(row[4]) for row in template])
+
+    rng = np.random.default_rng(seed)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as file:
+        file.write(','.join(header) + '\n')
+        for start in range(0, size, 1_000_000):
+            index = np.arange(start, min(start + 1_000_000, size))
+            rows = index % len(template)
+            periods = np.datetime_as_string(dates[rows] - index // len(template)).tolist()
+            scaled = (values[rows] * rng.uniform(0.5, 1.5, len(index))).tolist()
+            file.writelines(f'{locations[row]}{period}{labels[row]}{value!r}\n'
+                            for row, period, value in zip(rows.tolist(), periods, scaled))
+    os.rename(temp_path, path)
+    return path
+
+def _parse_rows(spec):
+    """Lê o CSV e converte cada linha em uma tupla na ordem de RECORD_COLUMNS."""
+    transform = compile_spec(spec)
+    return [transform(row) for row in read_csv_file(spec.file)]
+
+def _fact_rows(cursor, records):
+    """Tuplas na ordem de FACT_COLUMNS, com os ids das dimensões resolvidos por DimensionIds."""
+    dimensions = DimensionIds(cursor)
+    return [(country, state, city, dimensions.id('source', source), period, dimensions.id('label', label),
+             value, dimensions.id('analysis', analysis), dimensions.id('nutrient', nutrient))
+            for country, state, city, source, period, label, value, analysis, nutrient in records]
+
+def run_insert_record(conn, cursor, spec):
+    """Um INSERT por linha (INSERT_FACT_QUERY), como os carregadores originais."""
+    start = time.perf_counter()
+    records = _fact_rows(cursor, _parse_rows(spec))
+    parsed = time.perf_counter()
+    for record in records:
+        cursor.execute(INSERT_FACT_QUERY, record)
+    conn.commit()
+    return len(records), parsed - start, time.perf_counter() - parsed
+
+def run_executemany(conn, cursor, spec):
+    """cursor.executemany com INSERT_FACT_QUERY."""
+    start = time.perf_counter()
+    records = _fact_rows(cursor, _parse_rows(spec))
+    parsed = time.perf_counter()
+    cursor.executemany(INSERT_FACT_QUERY, records)
+    conn.commit()
+    return len(records), parsed - start, time.perf_counter() - parsed
+
+def run_copy_text(conn, cursor, spec):
+    """Linhas convertidas uma a uma e gravadas por BulkWriter no formato texto do COPY."""
+    start = time.perf_counter()
+    records = _parse_rows(spec)
+    parsed = time.perf_counter()
+    with BulkWriter(cursor, binary=False) as writer:
+        writer.write_rows(records)
+    conn.commit()
+    return len(records), parsed - start, time.perf_counter() - parsed
+
+def run_copy_binary(conn, cursor, spec):
+    """Leitura colunar do arquivo inteiro e COPY binário vetorizado (loader.load_dataset_columns)."""
+    start = time.perf_counter()
+    data = ChunkValidator(spec).validate(read_dataset_columns(spec))
+    writer = BulkWriter(cursor, binary=True)
+    for offset in range(0, data.length, writer.batch_size):
+        chunk = slice_rows(data, offset, offset + writer.batch_size)
+        writer.write_encoded(encode_dataset_columns(spec, chunk, writer.dimensions), chunk.length)
+    parse_seconds = time.perf_counter() - start - writer.elapsed
+    writer.close()
+    committed = time.perf_counter()
+    conn.commit()
+    return data.length, parse_seconds, writer.elapsed + time.perf_counter() - committed
+
+def run_streaming(conn, cursor, spec):
+    """
+    Leitura em blocos com gravação em uma thread (loader.stream_dataset). Leitura e
+    gravação se sobrepõem; o tempo de banco é o tempo gasto nos COPY pela thread.
+    """
+    start = time.perf_counter()
+    chunks = iter_csv_columns(spec.file, spec.columns, columnar_types(spec), COPY_BATCH_SIZE)
+    writer = BackgroundWriter(cursor)
+    dimensions = DimensionIds(conn.cursor())
+    loaded = run_pipeline(chunks, ChunkValidator(spec).validate,
+                          lambda chunk: encode_dataset_columns(spec, chunk, dimensions), writer)
+    committed = time.perf_counter()
+    conn.commit()
+    db_seconds = writer.writer.elapsed + time.perf_counter() - committed
+    return loaded, committed - start - writer.writer.elapsed, db_seconds
+
+# Estratégias de gravação comparadas, da mais lenta para a mais rápida
+STRATEGIES = {
+    'insert_record': run_insert_record,
+    'executemany': run_executemany,
+    'copy_text': run_copy_text,
+    'copy_binary': run_copy_binary,
+    'streaming': run_streaming,
+}
+
+def reset_table(cursor):
+    """Recria tb_chart vazia no banco do benchmark a partir de init.sql, com as dimensões preenchidas."""
+    with open(INIT_SQL, encoding='utf-8') as file:
+        cursor.execute(file.read())
+    seed_dimensions(cursor)
+
+def ensure_benchmark_database(name=BENCHMARK_DATABASE):
+    """Cria o banco descartável do benchmark, se ainda não existir."""
+    conn = get_db_connection()
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_database WHERE datname = %s", (name,))
+            if cursor.fetchone() is None:
+                cursor.execute(f'CREATE DATABASE "{name}"')
+            cursor.execute("SHOW server_version")
+            return cursor.fetchone()[0]
+    finally:
+        conn.close()
+
+def measure(strategy, path):
+    """
+    Executa uma estratégia sobre um arquivo, em um processo próprio (ver run_benchmark),
+    e retorna as medidas. O pico de RSS é o do processo inteiro, que só executou esta medição.
+    """
+    spec = benchmark_spec(path)
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            reset_table(cursor)
+            conn.commit()
+            start = time.perf_counter()
+            rows, parse_seconds, db_seconds = STRATEGIES[strategy](conn, cursor, spec)
+            elapsed = time.perf_counter() - start
+            cursor.execute("SELECT COUNT(*) FROM tb_chart")
+            if cursor.fetchone()[0] != rows:
+                raise RuntimeError("o número de registros gravados não confere com o arquivo")
+    finally:
+        conn.close()
+    return {
+        'rows': rows,
+        'seconds': round(elapsed, 4),
+        'parse_seconds': round(parse_seconds, 4),
+        'db_seconds': round(db_seconds, 4),
+        'rows_per_second': round(rows / elapsed) if elapsed else None,
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+def _git(*args):
+    try:
+        return subprocess.run(['git', *args], cwd=DATA_DIR, capture_output=True, text=True, check=True).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def git_revision():
+    """Commit atual do repositório, para identificar a versão medida."""
+    return _git('rev-parse', '--short', 'HEAD')
+
+def schema_revision():
+    """
+    Último commit que alterou o esquema de tb_chart (init.sql e dimensions.py). Relatórios
+    com revisões diferentes do esquema não são comparáveis entre si.
+    """
+    return _git('log', '-1', '--format=%h', '--', INIT_SQL, 'dimensions.py')
+
+def run_benchmark(sizes=DEFAULT_SIZES, strategies=tuple(STRATEGIES), row_limit=100_000,
+                  data_dir=DEFAULT_DATA_DIR, seed=DEFAULT_SEED, database=BENCHMARK_DATABASE):
+    """
+    Mede cada estratégia em cada tamanho e retorna o relatório.
+
+    Todas as medições gravam em tb_chart do banco database (recriada a cada medição),
+    nunca no banco configurado em DATABASE_NAME. Cada medição roda em um processo novo,
+    para que o pico de RSS de uma não contamine a seguinte. Estratégias linha a linha
+    são ignoradas acima de row_limit registros.
+    """
+    server_version = ensure_benchmark_database(database)
+    os.environ['DATABASE_NAME'] = database  # lido pelos processos filhos ao importar db_utils
+    context = multiprocessing.get_context('spawn')
+
+    results = []
+    for size in sizes:
+        path = generate_dataset(size, data_dir, seed)
+        for strategy in strategies:
+            result = {'size': size, 'strategy': strategy}
+            if strategy in ROW_BY_ROW and size > row_limit:
+                result['status'] = 'ignorado'
+            else:
+                with context.Pool(1) as pool:
+                    try:
+                        result.update(pool.apply(measure, (strategy, path)), status='ok')
+                    except (psycopg2.Error, RuntimeError, OSError, ValueError) as error:
+                        result.update(status='erro', error=str(error))
+            results.append(result)
+            print_result(result)
+
+    return {
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'revision': git_revision(),
+        'schema_revision': schema_revision(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'postgres': server_version,
+        'copy_batch_size': COPY_BATCH_SIZE,
+        'seed': seed,
+        'results': results,
+    }
+
+def print_result(result):
+    """Imprime uma linha do resumo."""
+    if result['status'] != 'ok':
+        print(f"{result['size']:>10} {result['strategy']:<14} {result['status']} {result.get('error', '')}")
+        return
+    print(f"{result['size']:>10} {result['strategy']:<14} {result['seconds']:>9.2f}s "
+          f"{result['rows_per_second']:>10} registros/s  leitura {result['parse_seconds']:>7.2f}s  "
+          f"banco {result['db_seconds']:>7.2f}s  RSS {result['peak_rss_mb']:>8.1f} MB")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mede a vazão de carga de tb_chart por tamanho de arquivo e estratégia de gravação.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help="Tamanhos dos arquivos, em registros")
+    parser.add_argument('--strategies', nargs='+', choices=list(STRATEGIES), default=list(STRATEGIES))
+    parser.add_argument('--row-limit', type=int, default=100_000,
+                        help="Maior tamanho medido com as estratégias linha a linha (%(default)s)")
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help="Onde os CSVs sintéticos são gerados e reaproveitados")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--database', default=BENCHMARK_DATABASE, help="Banco descartável usado nas medições")
+    parser.add_argument('--output', help="Arquivo JSON do relatório (padrão: benchmark_<data>.json em --data-dir)")
+    args = parser.parse_args()
+
+    print(f"{'Registros':>10} {'Estratégia':<14}")
+    report = run_benchmark(args.sizes, args.strategies, args.row_limit, args.data_dir, args.seed, args.database)
+    output = args.output or os.path.join(args.data_dir, f"benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    print(f"\nRelatório gravado em '{output}'.")
@@ -0,0 +1,145 @@
+import csv
+from collections import namedtuple
+from datetime import datetime
+from itertools import islice
+import numpy as np
+
+# Coluna de strings codificada por dicionário: codes[i] indexa values
+DictColumn = namedtuple('DictColumn', ['codes', 'values'])
+
+# Resultado da leitura colunar:
+#   length:  número de linhas lidas
+#   columns: nome -> np.ndarray (float64 ou int32) ou DictColumn
+#   errors:  máscara booleana das linhas com algum valor que não pôde ser convertido
+ColumnarData = namedtuple('ColumnarData', ['length', 'columns', 'errors'])
+
+# Valor usado nas datas que não puderam ser convertidas
+INVALID_DATE = 0
+
+def dictionary_encode(values):
+    """Codifica uma sequência de strings em DictColumn, guardando cada valor distinto uma única vez."""
+    lookup = {value: code for code, value in enumerate(dict.fromkeys(values))}
+    codes = np.fromiter(map(lookup.__getitem__, values), dtype=np.int32, count=len(values))
+    return DictColumn(codes, list(lookup))
+
+def parse_dates(values, errors):
+    """Converte strings 'AAAA-MM-DD' em ordinais; cada string distinta é convertida uma única vez."""
+    column = dictionary_encode(values)
+    ordinals = np.empty(len(column.values), dtype=np.int32)
+    bad = np.zeros(len(column.values), dtype=bool)
+    for code, value in enumerate(column.values):
+        try:
+            ordinals[code] = datetime.strptime(value, '%Y-%m-%d').toordinal()
+        except ValueError:
+            ordinals[code] = INVALID_DATE
+            bad[code] = True
+    errors |= bad[column.codes]
+    return ordinals[column.codes]
+
+def parse_floats(values, errors):
+    """Converte strings em float64; valores inválidos viram NaN e são marcados em errors."""
+    try:
+        return np.array(values, dtype=np.float64)
+    except ValueError:
+        result = np.empty(len(values), dtype=np.float64)
+        for index, value in enumerate(values):
+            try:
+                result[index] = float(value)
+            except ValueError:
+                result[index] = np.nan
+                errors[index] = True
+        return result
+
+def columns_from_rows(rows, columns, types):
+    """
+    Converte uma lista de linhas do CSV em colunas tipadas.
+
+    columns mapeia o nome de cada coluna desejada para seu índice no arquivo e types
+    mapeia o nome para 'float' (float64), 'date' (ordinal de date.toordinal, em int32)
+    ou 'str' (padrão). Strings repetidas são codificadas por dicionário, de forma que
+    cada valor distinto existe uma única vez na memória. Linhas curtas demais ou com
+    valores inválidos são marcadas em errors. A lista rows é esvaziada.
+    """
+    width = max(columns.values()) + 1
+
+    # Linhas curtas são completadas com vazios para a transposição e marcadas como inválidas
+    errors = np.zeros(len(rows), dtype=bool)
+    if rows and min(map(len, rows)) < width:
+        for line, row in enumerate(rows):
+            if len(row) < width:
+                errors[line] = True
+                rows[line] = row + [''] * (width - len(row))
+
+    # Transpõe as linhas em colunas; só as colunas pedidas são mantidas
+    transposed = list(zip(*rows)) if rows else [()] * width
+    rows.clear()
+    raw = {name: transposed[index] for name, index in columns.items()}
+    del transposed
+    length = len(errors)
+
+    parsed = {}
+    for name, values in raw.items():
+        kind = types.get(name, 'str')
+        if kind == 'float':
+            parsed[name] = parse_floats(values, errors)
+        elif kind == 'date':
+            parsed[name] = parse_dates(values, errors)
+        elif kind == 'str':
+            parsed[name] = dictionary_encode(values)
+        else:
+            raise ValueError(f"Tipo de coluna desconhecido '{kind}' para {name}")
+        raw[name] = None
+
+    return ColumnarData(length, parsed, errors)
+
+def read_csv_rows(file_path):
+    """Lê todas as linhas de um CSV (com cabeçalho), sem o cabeçalho."""
+    with open(file_path, 'r', newline='') as file:
+        csv_reader = csv.reader(file)
+        next(csv_reader)  # Pula o cabeçalho
+        return list(csv_reader)
+
+def iter_csv_rows(file_path, chunk_size):
+    """Lê um CSV (com cabeçalho) em listas de até chunk_size linhas."""
+    with open(file_path, 'r', newline='') as file:
+        csv_reader = csv.reader(file)
+        next(csv_reader)  # Pula o cabeçalho
+        while True:
+            rows = list(islice(csv_reader, chunk_size))
+            if not rows:
+                break
+            yield rows
+
+def read_csv_columns(file_path, columns, types):
+    """Lê um CSV (com cabeçalho) inteiro em colunas tipadas (ver columns_from_rows)."""
+    return columns_from_rows(read_csv_rows(file_path), columns, types)
+
+def iter_csv_columns(file_path, columns, types, chunk_size):
+    """
+    Lê um CSV (com cabeçalho) em blocos de até chunk_size linhas, cada um já convertido
+    em colunas tipadas; a memória usada não depende do tamanho do arquivo.
+    """
+    for rows in iter_csv_rows(file_path, chunk_size):
+        yield columns_from_rows(rows, columns, types)
+
+def take(data, mask):
+    """Retorna apenas as linhas selecionadas pela máscara booleana."""
+    columns = {
+        name: DictColumn(column.codes[mask], column.values) if isinstance(column, DictColumn) else column[mask]
+        for name, column in data.columns.items()
+    }
+    return ColumnarData(int(mask.sum()), columns, data.errors[mask])
+
+def slice_rows(data, start, stop):
+    """Retorna as linhas no intervalo [start, stop)."""
+    columns = {
+        name: DictColumn(column.codes[start:stop], column.values) if isinstance(column, DictColumn) else column[start:stop]
+        for name, column in data.columns.items()
+    }
+    errors = data.errors[start:stop]
+    return ColumnarData(len(errors), columns, errors)
+
+def decode(column):
+    """Reconstrói a lista de valores de uma DictColumn."""
+    values = np.array(column.values, dtype=object)
+    return values[column.codes].tolist()
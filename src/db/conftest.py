@@ -0,0 +1,21 @@
+import psycopg2
+import pytest
+from db_utils import get_db_connection
+
+@pytest.fixture
+def cursor():
+    """
+    Cursor no banco de DATABASE_* em uma transação desfeita no final do teste (ROLLBACK),
+    então os testes podem carregar e apagar registros à vontade. O teste é pulado se o
+    banco não estiver acessível.
+    """
+    try:
+        connection = get_db_connection()
+    except psycopg2.OperationalError as error:
+        pytest.skip(f"banco de dados indisponível: {error}")
+    try:
+        with connection.cursor() as cursor:
+            yield cursor
+    finally:
+        connection.rollback()
+        connection.close()
@@ -1,32 +1,39 @@
 #!/usr/bin/env python3
 
-from db_utils import get_db_connection
+import sys
+from db_utils import run_in_transaction
+from dataset_specs import DATASETS
+from manifest import clear_manifest
+from response_cache import CACHE_TABLE, cache_exists
+from rollup import ROLLUP_TABLE, rollup_exists
 
-def clear_tb_chart():
-    try:
-        # Conectando ao banco de dados
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Apagando os registros da tabela TBChart
-        print("Apagando registros da tabela TBChart...")
-        cursor.execute("DELETE FROM public.tb_chart")
+def delete_records(cursor):
+    """Apaga os registros, a rollup, o cache de respostas e o manifesto da carga incremental; retorna os registros restantes."""
+    cursor.execute("DELETE FROM public.tb_chart_fact")
+    if rollup_exists(cursor):
+        cursor.execute(f"DELETE FROM {ROLLUP_TABLE}")
+    if cache_exists(cursor):
+        cursor.execute(f"DELETE FROM {CACHE_TABLE}")
 
-        # Confirmando a transação
-        conn.commit()
+    # Sem registros, nenhum arquivo pode ser considerado carregado pela carga incremental
+    clear_manifest(cursor, DATASETS)
 
-        # Verificando se os dados foram apagados
-        cursor.execute("SELECT COUNT(*) FROM public.tb_chart")
-        count = cursor.fetchone()[0]
-        print(f"Total de registros restantes na tabela TBChart: {count}")
+    cursor.execute("SELECT COUNT(*) FROM public.tb_chart_fact")
+    return cursor.fetchone()[0]
 
+def clear_tb_chart():
+    # Apagando os registros da tabela TBChart
+    print("Apagando registros da tabela TBChart...")
+    try:
+        count = run_in_transaction(delete_records)
     except Exception as error:
         print(f"Erro ao apagar os registros da tabela TBChart: {error}")
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+        return None
+
+    # Verificando se os dados foram apagados
+    print(f"Total de registros restantes na tabela TBChart: {count}")
+    return count
 
 if __name__ == "__main__":
-    clear_tb_chart()
+    if clear_tb_chart() is None:
+        sys.exit(1)
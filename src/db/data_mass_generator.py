@@ -1,23 +1,77 @@
 #!/usr/bin/env python3
 
-from datetime import datetime
-from db_utils import get_db_connection, insert_record, print_test_results
-import random
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from datetime import date
+import numpy as np
+from db_utils import get_db_connection, close_pool, retry, run_in_transaction, BulkWriter, encode_binary_columns, print_test_results, DB_MAX_CONNECTIONS, DIMENSION_TABLES, FACT_TABLE, PG_EPOCH_ORDINAL, VERIFY_ROW_COUNT
+from dataset_specs import DATASETS, SYNTHETIC_SOURCE_PREFIX, get_dataset, synthetic_source
+from geocodes import geocode_index
+from loader import read_dataset_columns
+from manifest import get_manifest_entry
+from metrics import RunMetrics, combine_reports, format_stages, write_report
+from columnar import DictColumn
+from rollup import ROLLUP_TABLE, RollupDelta, rollup_exists
+from update_countries import resolve_country_code
+from validation import ChunkValidator
 
-def generate_data_for_indicator(indicator, total_records, batch_size=100000):
+# Definir valores básicos
+STATES = ['DF', 'SP', 'MG', 'RJ', 'RS']
+LABELS_BY_INDICATOR = {
+    'NPK': ['Fertilizantes Sintéticos', 'Fertilizantes Orgânicos', 'Fixação biológica de N'],
+    'GEE': ['Emissão de Gases', 'Deposição Atmosférica'],
+    'NH3': ['Manejo de dejetos', 'Adubos orgânicos'],
+}
+SOURCE = 'ISAgro'
+FIRST_YEAR, LAST_YEAR = 2010, 2023
+DEFAULT_SEED = 42
+
+# Primeiro dia de cada mês do intervalo, em dias desde 2000-01-01 (formato binário do COPY)
+MONTH_STARTS = (
+    (np.datetime64(f'{FIRST_YEAR}-01', 'M') + np.arange((LAST_YEAR - FIRST_YEAR + 1) * 12))
+    .astype('datetime64[D]')
+    - np.datetime64('2000-01-01', 'D')
+).astype(np.int32)
+
+def generate_batch(rng, dimensions, indicator, count, rollup=None):
+    """
+    Gera um lote de registros fictícios como arrays NumPy e o codifica para o COPY binário;
+    os ids de fonte (synthetic_source(SOURCE)), rótulo e indicador vêm de dimensions
+    (db_utils.DimensionIds). Os registros são somados em rollup (rollup.RollupDelta), se
+    informado.
+    """
+    labels = LABELS_BY_INDICATOR.get(indicator, ['Desconhecido'])
+    state_codes = rng.integers(0, len(STATES), count)
+    label_codes = rng.integers(0, len(labels), count)
+    periods = MONTH_STARTS[rng.integers(0, len(MONTH_STARTS), count)]
+    values = np.round(rng.uniform(100, 10000, count), 2)
+    if rollup is not None:
+        rollup.add_columns({
+            'analysis': indicator, 'label': DictColumn(label_codes, labels), 'source': synthetic_source(SOURCE),
+            'country': 'BR', 'state': DictColumn(state_codes, STATES), 'city': '',
+        }, periods + PG_EPOCH_ORDINAL, values)
+
+    return encode_binary_columns(
+        'BR', (state_codes, STATES), '', dimensions.id('source', synthetic_source(SOURCE)), periods,
+        dimensions.codes('label', label_codes, labels), values, dimensions.id('analysis', indicator)
+    )
+
+def generate_data_for_indicator(indicator, total_records, batch_size=500000, seed=DEFAULT_SEED):
+    conn = None
+    cursor = None
     try:
         # Conectando ao banco de dados
         conn = get_db_connection()
         cursor = conn.cursor()
+        writer = BulkWriter(cursor, batch_size=batch_size, binary=True)
+        rollup = RollupDelta.for_table(cursor, writer.table)
+        metrics = RunMetrics(f'data_mass_generator {indicator}')
 
-        # Definir valores básicos
-        states = ['DF', 'SP', 'MG', 'RJ', 'RS']
-        labels_by_indicator = {
-            'NPK': ['Fertilizantes Sintéticos', 'Fertilizantes Orgânicos', 'Fixação biológica de N'],
-            'GEE': ['Emissão de Gases', 'Deposição Atmosférica'],
-            'NH3': ['Manejo de dejetos', 'Adubos orgânicos'],
-        }
-        source = 'ISAgro'
+        # Mesma semente, mesmos dados
+        rng = np.random.default_rng(seed)
 
         total_generated = 0
         batches_completed = 0
@@ -26,24 +80,27 @@ def generate_data_for_indicator(indicator, total_records, batch_size=100000):
             batch_count = min(batch_size, total_records - total_generated)
             print(f"Gerando {batch_count} registros para o indicador {indicator} (Batch {batches_completed + 1})...")
 
-            for _ in range(batch_count):
-                state = random.choice(states)
-                label = random.choice(labels_by_indicator.get(indicator, ['Desconhecido']))
-                value = round(random.uniform(100, 10000), 2)
-                date = datetime.strptime(f'{random.randint(2010, 2023)}-{random.randint(1, 12)}-01', '%Y-%m-%d').date()
-
-                # Insere um novo registro fictício
-                insert_record(cursor, 'BR', state, '', source, date, label, value, indicator)
-
-            # Confirmando a transação
-            conn.commit()
+            # Gravando o lote via COPY e confirmando a transação
+            with metrics.stage('transform'):
+                payload = generate_batch(rng, writer.dimensions, indicator, batch_count, rollup)
+            with metrics.stage('write'):
+                writer.write_encoded(payload, batch_count)
+                writer.flush()
+            if rollup is not None:
+                with metrics.stage('rollup'):
+                    rollup.apply(cursor)
+            with metrics.stage('commit'):
+                conn.commit()
+            metrics.count('rows_ok', batch_count)
             total_generated += batch_count
             batches_completed += 1
 
-            # Verificando os registros inseridos
-            print_test_results(cursor, f"Gerado {total_generated}/{total_records} registros para o indicador {indicator}")
+            # Verificando os registros inseridos (SELECT COUNT(*) na tabela inteira)
+            if VERIFY_ROW_COUNT:
+                print_test_results(cursor, f"Gerado {total_generated}/{total_records} registros para o indicador {indicator}")
 
-        print(f"\nGeração concluída: {total_generated} registros gerados para o indicador {indicator}.")
+        print(f"\nGeração concluída para o indicador {indicator}: {format_stages(metrics.finish())}.")
+        print(f"Taxa de gravação via COPY: {writer.rows_per_second():.0f} registros/s")
 
     except Exception as error:
         print(f"Erro durante a geração de dados: {error}")
@@ -53,13 +110,317 @@ def generate_data_for_indicator(indicator, total_records, batch_size=100000):
         if conn:
             conn.close()
 
-if __name__ == "__main__":
-    import sys
-    if len(sys.argv) != 3:
-        print("Uso: python data_mass_generator.py <indicador> <numero_de_registros>")
-        sys.exit(1)
+# Modo realista: perfis extraídos dos arquivos ouro_* (ver profile_dataset)
+
+# Campos categóricos de cada registro gerado; a combinação forma a chave do perfil
+PROFILE_KEY_FIELDS = ('country', 'state', 'label', 'nutrient')
+
+# Quantis guardados da distribuição dos valores de cada chave
+QUANTILE_LEVELS = np.linspace(0, 1, 11)
+
+MAX_SCALE = 1000
+DEFAULT_SHARD_SIZE = 500000
+
+def _normalized(field, values):
+    """Valores distintos de country e state com a mesma normalização da carga (update_countries e geocodes)."""
+    if field == 'state':
+        return [geocode_index().resolve(value)[0] for value in values]
+    if field == 'country':
+        return [resolve_country_code(value) or value for value in values]
+    return list(values)
+
+def profile_dataset(name):
+    """
+    Perfil de um conjunto de dados real, usado para gerar dados sintéticos com as mesmas
+    cardinalidades e distribuições.
+
+    O CSV é lido e validado como na carga (linhas rejeitadas são ignoradas). Cada
+    combinação distinta de país, estado, rótulo e nutriente é uma chave; o perfil guarda
+    as chaves, o número de linhas de cada (chave, ano) e os quantis QUANTILE_LEVELS dos
+    valores de cada chave. Retorna um dict serializável em JSON.
+    """
+    spec = get_dataset(name)
+    data = ChunkValidator(spec).validate(read_dataset_columns(spec))
+
+    fields = {}
+    for field in PROFILE_KEY_FIELDS:
+        column = data.columns.get(field)
+        if column is None:
+            fields[field] = (np.zeros(data.length, dtype=np.int64), [spec.constants.get(field, '' if field != 'nutrient' else None)])
+        else:
+            fields[field] = (np.asarray(column.codes, dtype=np.int64), _normalized(field, column.values))
+
+    # Chave de cada linha: combinação dos códigos dos campos, renumerada de 0 a n_chaves - 1
+    combined = np.ravel_multi_index([codes for codes, _ in fields.values()], [len(values) for _, values in fields.values()])
+    unique_keys, key_of_row = np.unique(combined, return_inverse=True)
+    key_codes = np.unravel_index(unique_keys, [len(values) for _, values in fields.values()])
+    keys = [[fields[field][1][code] for field, code in zip(PROFILE_KEY_FIELDS, codes)]
+            for codes in zip(*(code.tolist() for code in key_codes))]
+
+    years = (data.columns['period'] - date(1970, 1, 1).toordinal()).astype('datetime64[D]').astype('datetime64[Y]').astype(np.int64) + 1970
+    cells, counts = np.unique(np.stack([key_of_row, years], axis=1), axis=0, return_counts=True)
+
+    values = data.columns['value']
+    order = np.argsort(key_of_row, kind='stable')
+    bounds = np.searchsorted(key_of_row[order], np.arange(len(keys) + 1))
+    quantiles = [np.quantile(values[order[start:end]], QUANTILE_LEVELS).tolist() for start, end in zip(bounds[:-1], bounds[1:])]
+
+    return {
+        'dataset': name,
+        'rows': int(data.length),
+        'keys': keys,
+        'cells': [[int(key), int(year), int(count)] for (key, year), count in zip(cells, counts)],
+        'quantiles': quantiles,
+    }
+
+def summarize_profile(profile):
+    """Resumo de uma linha de um perfil: linhas, chaves, rótulos, estados, anos e valores."""
+    keys = profile['keys']
+    years = [year for _, year, _ in profile['cells']]
+    values = np.array(profile['quantiles'])
+    return (f"{profile['dataset']}: {profile['rows']} linhas, {len(keys)} chaves, "
+            f"{len({key[2] for key in keys})} rótulos, {len({key[1] for key in keys})} estados, "
+            f"anos {min(years)}-{max(years)}, valores {values.min():.4g} a {values.max():.4g}")
+
+class ProfileSampler:
+    """
+    Gera as linhas de um conjunto de dados sintético a partir de um perfil.
+
+    O conjunto tem rows * scale linhas: a linha i repete a célula (chave, ano) da linha
+    i % rows do perfil, de modo que chaves, anos e suas frequências são os do arquivo
+    real em qualquer escala. A cópia i // rows recua a data para outro dia do mesmo ano
+    (até 365 cópias sem repetir a data de uma chave). O valor é sorteado da distribuição
+    dos valores da chave, interpolando os quantis do perfil.
+    """
 
-    indicador = sys.argv[1]
-    num_records = int(sys.argv[2])
+    def __init__(self, profile):
+        self.profile = profile
+        self.rows = profile['rows']
+        cells = np.array(profile['cells'], dtype=np.int64)
+        self.row_keys = np.repeat(cells[:, 0], cells[:, 2])
+        self.row_years = np.repeat(cells[:, 1], cells[:, 2])
+        self.quantiles = np.array(profile['quantiles'], dtype=np.float64)
+        self.fields = {}
+        for index, field in enumerate(PROFILE_KEY_FIELDS):
+            column = [key[index] for key in profile['keys']]
+            values = list(dict.fromkeys(column))
+            self.fields[field] = (np.array([values.index(value) for value in column], dtype=np.int64), values)
+
+    def sample(self, rng, start, end):
+        """Colunas das linhas [start, end) do conjunto sintético: chaves, dias desde 2000-01-01 e valores."""
+        index = np.arange(start, end, dtype=np.int64)
+        base = index % self.rows
+        keys = self.row_keys[base]
+        january_first = (self.row_years[base] - 1970).astype('datetime64[Y]').astype('datetime64[D]').astype(np.int64)
+        periods = january_first + (index // self.rows) % 365 + date(1970, 1, 1).toordinal() - PG_EPOCH_ORDINAL
+
+        position = rng.random(len(index)) * (len(QUANTILE_LEVELS) - 1)
+        lower = np.minimum(position.astype(np.int64), len(QUANTILE_LEVELS) - 2)
+        low, high = self.quantiles[keys, lower], self.quantiles[keys, lower + 1]
+        values = low + (position - lower) * (high - low)
+        return keys, periods.astype(np.int32), values
+
+    def encode(self, rng, dimensions, spec, start, end, rollup=None):
+        """
+        Codifica as linhas [start, end) no formato binário do COPY de tb_chart_fact, com a
+        fonte synthetic_source(spec.source). As linhas são somadas em rollup
+        (rollup.RollupDelta), se informado.
+        """
+        keys, periods, values = self.sample(rng, start, end)
+        codes = {field: key_codes[keys] for field, (key_codes, _) in self.fields.items()}
+        nutrients = self.fields['nutrient'][1]
+        if rollup is not None:
+            rollup.add_columns({
+                'analysis': spec.analysis, 'source': synthetic_source(spec.source), 'city': '',
+                **{field: DictColumn(codes[field], self.fields[field][1]) for field in ('label', 'country', 'state')},
+            }, periods + PG_EPOCH_ORDINAL, values)
+        return encode_binary_columns(
+            (codes['country'], self.fields['country'][1]),
+            (codes['state'], self.fields['state'][1]),
+            '',
+            dimensions.id('source', synthetic_source(spec.source)),
+            periods,
+            dimensions.codes('label', codes['label'], self.fields['label'][1]),
+            values,
+            dimensions.id('analysis', spec.analysis),
+            None if nutrients == [None] else dimensions.codes('nutrient', codes['nutrient'], nutrients),
+        )
+
+def plan_shards(profiles, scale, shard_size=DEFAULT_SHARD_SIZE):
+    """
+    Divide a geração em fatias de até shard_size linhas: lista de (conjunto, fatia,
+    início, fim). A divisão só depende dos perfis, da escala e de shard_size.
+    """
+    shards = []
+    for name, profile in profiles.items():
+        total = profile['rows'] * scale
+        for shard, start in enumerate(range(0, total, shard_size)):
+            shards.append((name, shard, start, min(start + shard_size, total)))
+    return shards
+
+def shard_seed(seed, name, shard):
+    """
+    Semente de uma fatia: depende só da semente base, do conjunto e do número da fatia,
+    então os dados gerados são os mesmos com qualquer número de processos.
+    """
+    return [seed, list(DATASETS).index(name), shard]
+
+# Estado dos processos do pool de generate_realistic
+_profiles = None
+_connection_slots = None
+_table = FACT_TABLE
+_seed = DEFAULT_SEED
+
+def delete_synthetic(cursor, names=None):
+    """
+    Remove os registros fictícios (fonte com SYNTHETIC_SOURCE_PREFIX) e os seus grupos
+    da rollup, na transação do cursor; com names, só os dos conjuntos informados, pela
+    fonte fictícia, indicador e rótulos do manifesto. Retorna o número de registros
+    removidos.
+    """
+    if names is None:
+        keys = [("source.name LIKE %s", (SYNTHETIC_SOURCE_PREFIX + '%',), "source LIKE %s")]
+    else:
+        keys = []
+        for name in names:
+            entry = get_manifest_entry(cursor, name)
+            if entry is not None:
+                params = (synthetic_source(entry['source']), entry['analysis'], sorted(entry['labels']))
+                keys.append(("source.name = %s AND analysis.name = %s AND label.name = ANY(%s)", params,
+                             "source = %s AND analysis = %s AND label = ANY(%s)"))
+
+    deleted = 0
+    rollup = rollup_exists(cursor)
+    for condition, params, rollup_condition in keys:
+        cursor.execute(f"""
+            DELETE FROM {FACT_TABLE} AS fact
+            USING {DIMENSION_TABLES['source']} AS source, {DIMENSION_TABLES['analysis']} AS analysis,
+                  {DIMENSION_TABLES['label']} AS label
+            WHERE source.id = fact.source_id AND analysis.id = fact.analysis_id AND label.id = fact.label_id
+              AND {condition}
+        """, params)
+        deleted += cursor.rowcount
+        # A fonte faz parte da chave da rollup: os grupos fictícios só têm registros fictícios
+        if rollup:
+            cursor.execute(f"DELETE FROM {ROLLUP_TABLE} WHERE {rollup_condition}", params)
+    return deleted
+
+def _init_generator_worker(profiles, connection_slots, table, seed):
+    global _profiles, _connection_slots, _table, _seed
+    _profiles = {name: ProfileSampler(profile) for name, profile in profiles.items()}
+    _connection_slots = connection_slots
+    _table = table
+    _seed = seed
+
+def _write_shard(name, index, start, end):
+    """Uma tentativa de gravar uma fatia, em uma conexão do pool e uma transação."""
+    metrics = RunMetrics(f'{name}#{index}')
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            writer = BulkWriter(cursor, table=_table, binary=True)
+            rollup = RollupDelta.for_table(cursor, _table)
+            rng = np.random.default_rng(shard_seed(_seed, name, index))
+            with metrics.stage('transform'):
+                payload = _profiles[name].encode(rng, writer.dimensions, get_dataset(name), start, end, rollup)
+            writer.write_encoded(payload, end - start)
+            writer.close()
+            metrics.add_time('write', writer.elapsed)
+            # Os grupos da rollup tocados pela fatia são atualizados na mesma transação
+            if rollup is not None:
+                with metrics.stage('rollup'):
+                    rollup.apply(cursor)
+        with metrics.stage('commit'):
+            conn.commit()
+    finally:
+        conn.close()
+    metrics.count('rows_ok', end - start)
+    return metrics.finish()
+
+def _generate_shard(shard):
+    """
+    Gera e grava uma fatia em sua própria transação, repetida em erros transitórios (os
+    dados da fatia são os mesmos a cada tentativa); executado no processo filho.
+    """
+    with _connection_slots:
+        try:
+            return retry(_write_shard, *shard)
+        finally:
+            close_pool()
+
+def load_profiles(names=None, path=None):
+    """Perfis dos conjuntos informados (padrão: todos), lidos de path (JSON) ou dos CSVs."""
+    if path:
+        with open(path, encoding='utf-8') as file:
+            profiles = json.load(file)
+        return {name: profiles[name] for name in names} if names else profiles
+    return {name: profile_dataset(name) for name in names or DATASETS}
+
+def generate_realistic(scale, names=None, workers=None, max_connections=None, seed=DEFAULT_SEED,
+                       shard_size=DEFAULT_SHARD_SIZE, table=FACT_TABLE, profile_path=None):
+    """
+    Gera scale vezes cada conjunto de dados real (1 a MAX_SCALE), com as distribuições
+    de seus perfis (ver ProfileSampler), e grava em table via COPY binário. Os registros
+    têm a fonte do conjunto real com SYNTHETIC_SOURCE_PREFIX (ver delete_synthetic).
+
+    O trabalho é dividido em fatias (plan_shards), gravadas em paralelo por um pool de
+    processos, cada uma em sua transação e com sua semente (shard_seed); no máximo
+    max_connections conexões ficam abertas ao mesmo tempo. Retorna o relatório de
+    métricas da geração (ver metrics.combine_reports).
+    """
+    if not 1 <= scale <= MAX_SCALE:
+        raise ValueError(f"Escala deve estar entre 1 e {MAX_SCALE}: {scale}")
+    start = time.perf_counter()
+    profiles = load_profiles(names, profile_path)
+    for profile in profiles.values():
+        print(summarize_profile(profile))
+
+    shards = plan_shards(profiles, scale, shard_size)
+    workers = workers or os.cpu_count()
+    connection_slots = multiprocessing.Semaphore(max_connections or DB_MAX_CONNECTIONS)
+    print(f"\nGerando {sum(end - begin for _, _, begin, end in shards)} registros em {len(shards)} fatias com {workers} processos...")
+    reports = []
+    with multiprocessing.Pool(workers, initializer=_init_generator_worker,
+                              initargs=(profiles, connection_slots, table, seed)) as pool:
+        for report in pool.imap_unordered(_generate_shard, shards):
+            reports.append(report)
+            print(f"  {report['name']}: {format_stages(report)}")
+
+    report = combine_reports(f'data_mass_generator x{scale}', reports, time.perf_counter() - start)
+    print(f"\nGeração concluída: {format_stages(report)}, {report['rows_per_second']} registros/s.")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Gera massa de dados fictícia: aleatória por indicador ou, com --scale, a partir dos perfis dos CSVs reais.")
+    parser.add_argument('indicator', nargs='?', help="Indicador (NPK, GEE, NH3) do modo aleatório")
+    parser.add_argument('records', nargs='?', type=int, help="Número de registros do modo aleatório")
+    parser.add_argument('seed', nargs='?', type=int, default=DEFAULT_SEED, help="Semente base")
+    parser.add_argument('--scale', type=int, help=f"Gera N vezes os conjuntos reais (1 a {MAX_SCALE})")
+    parser.add_argument('--datasets', nargs='+', choices=list(DATASETS), help="Conjuntos usados no modo realista (padrão: todos)")
+    parser.add_argument('--workers', type=int, help="Número de processos (padrão: número de CPUs)")
+    parser.add_argument('--max-connections', type=int, help="Máximo de conexões simultâneas com o banco")
+    parser.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE, help="Registros por fatia")
+    parser.add_argument('--profile', help="Lê os perfis deste JSON em vez dos CSVs")
+    parser.add_argument('--save-profile', help="Grava os perfis dos CSVs neste JSON e termina")
+    parser.add_argument('--report', help="Grava o relatório da geração em JSON neste arquivo")
+    parser.add_argument('--delete', action='store_true', help="Remove os registros fictícios já gravados e termina")
+    args = parser.parse_args()
 
-    generate_data_for_indicator(indicador, num_records)
+    if args.delete:
+        print(f"{run_in_transaction(delete_synthetic)} registros fictícios removidos.")
+    elif args.save_profile:
+        profiles = load_profiles(args.datasets)
+        with open(args.save_profile, 'w', encoding='utf-8') as file:
+            json.dump(profiles, file, ensure_ascii=False)
+        for profile in profiles.values():
+            print(summarize_profile(profile))
+    elif args.scale:
+        report = generate_realistic(args.scale, args.datasets, args.workers, args.max_connections, args.seed,
+                                    args.shard_size, profile_path=args.profile)
+        if args.report:
+            write_report(report, args.report)
+    elif args.indicator and args.records:
+        generate_data_for_indicator(args.indicator, args.records, seed=args.seed)
+    else:
+        parser.error("informe <indicador> <numero_de_registros> ou --scale")
@@ -0,0 +1,109 @@
+from collections import namedtuple
+
+# Descrição declarativa de cada CSV carregado em tb_chart.
+#   file:         nome do arquivo CSV (relativo a src/db)
+#   columns:      campo de tb_chart -> índice da coluna no CSV
+#   constants:    campo de tb_chart -> valor fixo para todas as linhas
+#   source:       fonte gravada em tb_chart.source
+#   analysis:     indicador gravado em tb_chart.analysis
+#   coercions:    campo -> nome da conversão (ver loader.COERCIONS)
+#   description:  rótulo usado nas mensagens de progresso
+DatasetSpec = namedtuple('DatasetSpec', [
+    'file', 'columns', 'constants', 'source', 'analysis', 'coercions', 'description'
+])
+
+DEFAULT_COERCIONS = {'period': 'date', 'value': 'float'}
+
+# Layouts de colunas encontrados nos arquivos ouro_*
+COUNTRY_STATE_LAYOUT = {'country': 0, 'state': 1, 'period': 2, 'label': 3, 'value': 4}
+COUNTRY_LAYOUT = {'country': 0, 'period': 1, 'label': 2, 'value': 3}
+NPK_LAYOUT = {'state': 0, 'period': 1, 'label': 2, 'nutrient': 3, 'value': 4}
+# ouro_npk_fert_sintetico.csv tem uma coluna de índice antes das demais
+NPK_INDEXED_LAYOUT = {'state': 1, 'period': 2, 'label': 3, 'nutrient': 4, 'value': 5}
+
+BRAZIL = {'country': 'BR'}
+
+def dataset(file, columns, source, analysis, description, constants=None, coercions=None):
+    """Cria um DatasetSpec preenchendo os valores padrão."""
+    return DatasetSpec(
+        file=file,
+        columns=columns,
+        constants=constants or {},
+        source=source,
+        analysis=analysis,
+        coercions=coercions or DEFAULT_COERCIONS,
+        description=description,
+    )
+
+# Os registros fictícios de data_mass_generator são gravados com a fonte do conjunto real
+# precedida deste prefixo, para que possam ser filtrados (source LIKE 'sintético:%') e
+# removidos sem afetar os reais
+SYNTHETIC_SOURCE_PREFIX = 'sintético:'
+
+def synthetic_source(source):
+    """Fonte dos registros fictícios gerados a partir de um conjunto com a fonte informada."""
+    return SYNTHETIC_SOURCE_PREFIX + source
+
+# Rótulos aceitos em cada indicador; linhas com outros rótulos vão para a quarentena
+# (ver validation.ChunkValidator)
+LABELS_BY_ANALYSIS = {
+    'NH3': frozenset({
+        'Adubos organicos', 'Deposição de dejetos', 'Fertilizante', 'Manejo de dejetos',
+        'Queima resíduos de colheita',
+    }),
+    'Área Agrícola': frozenset({'Área Agrícola'}),
+    'GEE': frozenset({
+        'Emissão de CH4', 'Emissão de CO2', 'Emissão de CO2e', 'Emissão de N2O', 'GEE',
+    }),
+    'NPK': frozenset({
+        'Carcaça Bovina', 'Dejetos galináceos', 'Dejetos suínos', 'Deposição Atmosférica',
+        'Fertilizante orgânico vinhaça', 'Fertilizantes Sintéticos', 'Fixação biológica de N',
+        'Outras Produções Agrícolas', 'Principais Produções Agrícolas', 'Sementes',
+    }),
+}
+
+# Nutrientes da coluna nutrient dos arquivos NPK
+NUTRIENTS = ('N', 'P', 'K')
+
+# Registro dos conjuntos de dados, na ordem em que são carregados
+DATASETS = {
+    'ouro_amonia_agro': dataset(
+        'ouro_amonia_agro.csv', COUNTRY_STATE_LAYOUT, 'ISAgro', 'NH3', 'Adubos orgânicos'),
+    'ouro_area_agricola_OCDE': dataset(
+        'ouro_area_agricola_OCDE.csv', COUNTRY_LAYOUT, 'OCDE', 'Área Agrícola', 'Área Agrícola'),
+    'ouro_gee_agropecuaria': dataset(
+        'ouro_gee_agropecuaria.csv', COUNTRY_STATE_LAYOUT, 'ISAgro', 'GEE', 'Emissão de CO2e'),
+    'ouro_gee_OCDE': dataset(
+        'ouro_gee_OCDE.csv', COUNTRY_LAYOUT, 'OCDE', 'GEE', 'Emissão de CO2e'),
+    'ouro_npk_carcaca_bovina': dataset(
+        'ouro_npk_carcaca_bovina.csv', NPK_LAYOUT, 'ISAgro', 'NPK', 'Carcaça Bovina',
+        constants=BRAZIL),
+    'ouro_npk_dejetos': dataset(
+        'ouro_npk_dejetos.csv', NPK_LAYOUT, 'ISAgro', 'NPK', 'Dejetos',
+        constants=BRAZIL),
+    'ouro_npk_deposicao_atmosferica': dataset(
+        'ouro_npk_deposicao_atmosferica.csv', NPK_LAYOUT, 'ISAgro', 'NPK', 'Deposição Atmosférica',
+        constants=BRAZIL),
+    'ouro_npk_fert_organico_vinhaca': dataset(
+        'ouro_npk_fert_organico_vinhaca.csv', NPK_LAYOUT, 'ISAgro', 'NPK', 'Fertilizante orgânico vinhaça',
+        constants=BRAZIL),
+    'ouro_npk_fert_sintetico': dataset(
+        'ouro_npk_fert_sintetico.csv', NPK_INDEXED_LAYOUT, 'ISAgro', 'NPK', 'Fertilizantes Sintéticos',
+        constants=BRAZIL),
+    'ouro_npk_fixbioN': dataset(
+        'ouro_npk_fixbioN.csv', NPK_LAYOUT, 'ISAgro', 'NPK', 'Fixação biológica de N',
+        constants=BRAZIL),
+    'ouro_npk_producao_agricola': dataset(
+        'ouro_npk_producao_agricola.csv', NPK_LAYOUT, 'ISAgro', 'NPK', 'Produção Agrícola',
+        constants=BRAZIL),
+    'ouro_npk_sementes': dataset(
+        'ouro_npk_sementes.csv', NPK_LAYOUT, 'ISAgro', 'NPK', 'Sementes',
+        constants=BRAZIL),
+}
+
+def get_dataset(name):
+    """Retorna o DatasetSpec registrado com o nome informado."""
+    try:
+        return DATASETS[name]
+    except KeyError:
+        raise KeyError(f"Conjunto de dados desconhecido: {name}. Disponíveis: {', '.join(DATASETS)}")
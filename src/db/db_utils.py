@@ -1,6 +1,17 @@
 import psycopg2
+import psycopg2.extensions
+from psycopg2.extras import execute_values
 import csv
+import io
+import numpy as np
 import os
+import random
+import struct
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
 
 # Configurações de conexão com o banco de dados
 DB_HOST = os.getenv('DATABASE_HOST', 'localhost')
@@ -8,22 +19,270 @@ DB_PORT = os.getenv('DATABASE_PORT', '5432')
 DB_NAME = os.getenv('DATABASE_NAME', 'postgres')
 DB_USER = os.getenv('DATABASE_USER', 'postgres')
 DB_PASSWORD = os.getenv('DATABASE_PASSWORD', 'postgres')
+DB_MAX_CONNECTIONS = int(os.getenv('DATABASE_MAX_CONNECTIONS', '4'))
+
+# Pool de conexões de cada processo (ver ConnectionPool). O padrão comporta as
+# conexões paralelas de create_indexes mais a conexão de quem as iniciou
+DB_POOL_SIZE = int(os.getenv('DATABASE_POOL_SIZE', str(DB_MAX_CONNECTIONS + 1)))
+DB_POOL_TIMEOUT = float(os.getenv('DATABASE_POOL_TIMEOUT', '60'))
+# Conexões ociosas há mais tempo que isto são testadas (SELECT 1) antes de serem reutilizadas
+DB_POOL_CHECK_INTERVAL = float(os.getenv('DATABASE_POOL_CHECK_INTERVAL', '30'))
+
+# Limite de cada comando no servidor (statement_timeout; '0' desliga) e da conexão, em segundos
+DB_STATEMENT_TIMEOUT = os.getenv('DATABASE_STATEMENT_TIMEOUT', '30min')
+DB_CONNECT_TIMEOUT = int(os.getenv('DATABASE_CONNECT_TIMEOUT', '10'))
+
+# Novas tentativas em erros transitórios, com espera exponencial a partir de DB_RETRY_BACKOFF segundos
+DB_RETRY_ATTEMPTS = int(os.getenv('DATABASE_RETRY_ATTEMPTS', '3'))
+DB_RETRY_BACKOFF = float(os.getenv('DATABASE_RETRY_BACKOFF', '0.5'))
+
+# SQLSTATEs de erros que podem não se repetir em uma nova tentativa: conflitos de
+# serialização e deadlocks, servidor reiniciando ou em recuperação, conexão perdida
+TRANSIENT_PGCODES = frozenset({
+    '40001', '40P01',
+    '57P01', '57P02', '57P03',
+    '08000', '08001', '08003', '08004', '08006',
+})
+
+# Configurações da carga em massa (COPY)
+COPY_BATCH_SIZE = int(os.getenv('COPY_BATCH_SIZE', '50000'))
+COPY_FORMAT = os.getenv('COPY_FORMAT', 'text')
+
+# Executa o SELECT COUNT(*) de print_test_results depois de cada carga; desligado por
+# padrão, pois percorre a tabela inteira
+VERIFY_ROW_COUNT = os.getenv('VERIFY_ROW_COUNT', '0') == '1'
+
+# Colunas de tb_chart, que é uma view sobre FACT_TABLE e as tabelas de dimensão
+# (ver dimensions.py); nutrient é exposta pela view depois das colunas originais
+CHART_COLUMNS = ('country', 'state', 'city', 'source', 'period', 'label', 'value', 'analysis')
+
+# Campos de cada registro recebido pelos carregadores (BulkWriter.insert_record)
+RECORD_COLUMNS = CHART_COLUMNS + ('nutrient',)
+
+# Tabela física dos registros e as colunas preenchidas pelos carregadores; source,
+# label, analysis e nutrient são gravados como ids smallint das tabelas de dimensão.
+# created_at e updated_at ficam com o DEFAULT do servidor
+FACT_TABLE = 'tb_chart_fact'
+FACT_COLUMNS = ('country', 'state', 'city', 'source_id', 'period', 'label_id', 'value', 'analysis_id', 'nutrient_id')
+
+# Tabela de cada dimensão, pelo nome do campo do registro
+DIMENSION_TABLES = {
+    'source': 'tb_dim_source',
+    'analysis': 'tb_dim_analysis',
+    'label': 'tb_dim_label',
+    'nutrient': 'tb_dim_nutrient',
+}
+
+# Cabeçalho e terminador do formato binário do COPY do PostgreSQL
+PGCOPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('!ii', 0, 0)
+PGCOPY_TRAILER = struct.pack('!h', -1)
+
+# Datas no formato binário são dias desde 2000-01-01
+PG_EPOCH_ORDINAL = date(2000, 1, 1).toordinal()
+
+# Caracteres que precisam de escape no formato texto do COPY
+_COPY_TEXT_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+def is_transient_error(error):
+    """
+    Indica se o erro é transitório (ver TRANSIENT_PGCODES). Erros de conexão sem SQLSTATE
+    também são; statement_timeout (57014), os demais erros do servidor e PoolTimeout
+    não: repetir enquanto a conexão do chamador continua ocupada só piora a espera.
+    """
+    if isinstance(error, PoolTimeout):
+        return False
+    if isinstance(error, psycopg2.Error) and error.pgcode:
+        return error.pgcode in TRANSIENT_PGCODES
+    return isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError))
+
+def retry(operation, *args, attempts=None, **kwargs):
+    """
+    Executa operation(*args, **kwargs), repetindo-a em erros transitórios até attempts
+    vezes (DB_RETRY_ATTEMPTS), com espera exponencial e um pouco de variação aleatória.
+    A operação deve poder ser repetida: em geral, uma transação inteira.
+    """
+    attempts = attempts or DB_RETRY_ATTEMPTS
+    for attempt in range(1, attempts + 1):
+        try:
+            return operation(*args, **kwargs)
+        except psycopg2.Error as error:
+            if attempt == attempts or not is_transient_error(error):
+                raise
+            delay = DB_RETRY_BACKOFF * 2 ** (attempt - 1) * random.uniform(1, 1.5)
+            print(f"Erro transitório no banco de dados ({' '.join(str(error).split())}); nova tentativa {attempt + 1}/{attempts} em {delay:.1f}s")
+            time.sleep(delay)
+
+class PoolTimeout(psycopg2.OperationalError):
+    """Nenhuma conexão do pool ficou livre em DB_POOL_TIMEOUT segundos."""
+
+class PooledConnection(psycopg2.extensions.connection):
+    """
+    Conexão do ConnectionPool: close() a devolve ao pool em vez de fechá-la. Depois de
+    devolvida, novas chamadas a close() não fazem nada: a conexão pode já estar com
+    outra thread.
+    """
+
+    pool = None
+    released_at = 0.0
+    _released = False
+
+    def close(self):
+        if self._released:
+            return
+        if self.pool is not None:
+            self.pool.putconn(self)
+        else:
+            super().close()
+
+    def discard(self):
+        """Fecha de fato a conexão."""
+        self.pool = None
+        if not self.closed:
+            super().close()
+
+class ConnectionPool:
+    """
+    Pool de conexões de um processo, seguro para várias threads.
+
+    No máximo size conexões ficam abertas; getconn espera até timeout segundos por uma
+    livre. Conexões ociosas há mais de DB_POOL_CHECK_INTERVAL segundos são testadas
+    antes de serem entregues, e as quebradas são substituídas. Ao voltar ao pool a
+    conexão é limpa (ROLLBACK e DISCARD ALL), então parâmetros de sessão (SET) e
+    tabelas temporárias não passam de um uso para o outro.
+    """
+
+    def __init__(self, size=None, timeout=None):
+        self.size = size or DB_POOL_SIZE
+        self.timeout = DB_POOL_TIMEOUT if timeout is None else timeout
+        self.pid = os.getpid()
+        self._idle = []
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        options = f'-c statement_timeout={DB_STATEMENT_TIMEOUT}'
+        conn = retry(psycopg2.connect,
+                     host=DB_HOST, port=DB_PORT, database=DB_NAME, user=DB_USER, password=DB_PASSWORD,
+                     connect_timeout=DB_CONNECT_TIMEOUT, options=options,
+                     application_name=os.path.basename(sys.argv[0] or 'python')[:63],
+                     connection_factory=PooledConnection)
+        conn.pool = self
+        return conn
+
+    def _healthy(self, conn):
+        if conn.closed:
+            return False
+        if time.monotonic() - conn.released_at < DB_POOL_CHECK_INTERVAL:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        """Retorna uma conexão livre (ociosa e saudável, ou nova)."""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(f"nenhuma das {self.size} conexões do pool ficou livre em {self.timeout:.0f}s")
+        try:
+            while True:
+                with self._lock:
+                    conn = self._idle.pop() if self._idle else None
+                if conn is None:
+                    return self._connect()
+                if self._healthy(conn):
+                    conn.pool = self
+                    conn._released = False
+                    return conn
+                conn.discard()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn):
+        """Devolve uma conexão ao pool; conexões quebradas são fechadas."""
+        conn.pool = None
+        conn._released = True
+        try:
+            if not conn.closed:
+                conn.rollback()
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute("DISCARD ALL")
+                conn.autocommit = False
+        except psycopg2.Error:
+            conn.discard()
+        if not conn.closed:
+            conn.released_at = time.monotonic()
+            with self._lock:
+                self._idle.append(conn)
+        self._slots.release()
+
+    def closeall(self):
+        """Fecha as conexões ociosas (as que estão em uso são fechadas quando devolvidas)."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.discard()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """
+    Pool de conexões do processo atual. Um processo filho (multiprocessing) cria o seu:
+    as conexões herdadas do pai são abandonadas sem serem fechadas, para não encerrar
+    as sessões do pai.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = ConnectionPool()
+        return _pool
+
+def close_pool():
+    """Fecha as conexões ociosas do pool do processo."""
+    if _pool is not None and _pool.pid == os.getpid():
+        _pool.closeall()
 
 def get_db_connection():
-    """Estabelece uma conexão com o banco de dados."""
+    """
+    Retorna uma conexão do pool do processo (ver ConnectionPool), abrindo uma nova se
+    preciso, com novas tentativas em erros transitórios. close() devolve a conexão ao pool.
+    """
     try:
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD
-        )
-        return conn
+        return get_pool().getconn()
     except Exception as e:
         print(f"Erro ao conectar ao banco de dados: {e}")
         raise
 
+@contextmanager
+def transaction():
+    """
+    Cursor em uma conexão do pool, dentro de uma transação: COMMIT se o bloco with
+    terminar sem erro, ROLLBACK caso contrário; a conexão volta ao pool no final.
+    """
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            yield cursor
+        conn.commit()
+    except BaseException:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def run_in_transaction(work, *args, **kwargs):
+    """Executa work(cursor, *args, **kwargs) em transaction(), repetindo a transação inteira em erros transitórios."""
+    def attempt():
+        with transaction() as cursor:
+            return work(cursor, *args, **kwargs)
+    return retry(attempt)
+
 def read_csv_file(file_path):
     """Lê um arquivo CSV e retorna os dados em uma lista de listas."""
     try:
@@ -35,18 +294,284 @@ def read_csv_file(file_path):
         print(f"Erro ao ler o arquivo CSV: {e}")
         raise
 
-def insert_record(cursor, country, state, city, source, period, label, value, analysis):
-    """Insere um novo registro na tabela tb_chart."""
+# INSERT de um registro em FACT_TABLE; os ids das dimensões são buscados pelo nome
+INSERT_RECORD_QUERY = f"""
+INSERT INTO {FACT_TABLE} (country, state, city, source_id, period, label_id, value, analysis_id, nutrient_id, created_at, updated_at)
+VALUES (
+    %s, %s, %s, (SELECT id FROM {DIMENSION_TABLES['source']} WHERE name = %s), %s,
+    (SELECT id FROM {DIMENSION_TABLES['label']} WHERE name = %s), %s,
+    (SELECT id FROM {DIMENSION_TABLES['analysis']} WHERE name = %s),
+    (SELECT id FROM {DIMENSION_TABLES['nutrient']} WHERE name = %s), NOW(), NOW()
+)
+"""
+
+def insert_record(cursor, country, state, city, source, period, label, value, analysis, nutrient=None):
+    """Insere um novo registro na tabela; fonte, indicador e rótulo já devem existir nas dimensões."""
     try:
-        query = """
-        INSERT INTO tb_chart (country, state, city, source, period, label, value, created_at, updated_at, analysis)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, NOW(), NOW(), %s)
-        """
-        cursor.execute(query, (country, state, city, source, period, label, value, analysis))
+        cursor.execute(INSERT_RECORD_QUERY, (country, state, city, source, period, label, value, analysis, nutrient))
     except Exception as e:
         print(f"Erro ao inserir o registro: {e}")
         raise
 
+class DimensionIds:
+    """
+    Ids smallint dos valores das tabelas de dimensão (DIMENSION_TABLES).
+
+    Cada dimensão é lida inteira na primeira consulta; valores que ainda não existem são
+    inseridos (INSERT ... ON CONFLICT DO NOTHING), na transação do cursor. Os valores
+    conhecidos de antemão são criados antes das cargas (dimensions.seed_dimensions),
+    para que cargas em paralelo não esperem umas pelas outras na inserção.
+    """
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self._ids = {}
+
+    def _load(self, dimension):
+        if dimension not in self._ids:
+            self.cursor.execute(f"SELECT name, id FROM {DIMENSION_TABLES[dimension]}")
+            self._ids[dimension] = dict(self.cursor.fetchall())
+        return self._ids[dimension]
+
+    def lookup(self, dimension, names):
+        """Lista dos ids dos nomes informados, criando os que não existem."""
+        ids = self._load(dimension)
+        missing = sorted({name for name in names if name not in ids})
+        if missing:
+            table = DIMENSION_TABLES[dimension]
+            execute_values(self.cursor, f"INSERT INTO {table} (name) VALUES %s ON CONFLICT (name) DO NOTHING",
+                           [(name,) for name in missing])
+            self.cursor.execute(f"SELECT name, id FROM {table} WHERE name = ANY(%s)", (missing,))
+            ids.update(self.cursor.fetchall())
+        return [ids[name] for name in names]
+
+    def id(self, dimension, name):
+        """Id de um nome, ou None (NULL) se o nome for None."""
+        if name is None:
+            return None
+        ids = self._load(dimension)
+        return ids[name] if name in ids else self.lookup(dimension, [name])[0]
+
+    def array(self, dimension, names):
+        """Ids dos nomes em um array int16, na mesma ordem."""
+        return np.array(self.lookup(dimension, list(names)), dtype=np.int16)
+
+    def codes(self, dimension, codes, names):
+        """
+        Id de cada linha de uma coluna codificada por dicionário (códigos que indexam names,
+        como em uma DictColumn). Só os nomes usados pelos códigos são consultados.
+        """
+        codes = np.asarray(codes)
+        used = np.unique(codes)
+        ids = np.zeros(len(names), dtype=np.int16)
+        ids[used] = self.array(dimension, [names[code] for code in used.tolist()])
+        return ids[codes]
+
+def copy_from_buffer(cursor, buffer, table=FACT_TABLE, columns=FACT_COLUMNS, binary=False):
+    """Envia um buffer já codificado para a tabela usando COPY ... FROM STDIN."""
+    try:
+        buffer.seek(0)
+        fmt = 'binary' if binary else 'text'
+        query = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT {fmt})"
+        cursor.copy_expert(query, buffer)
+    except Exception as e:
+        print(f"Erro ao copiar os registros para a tabela {table}: {e}")
+        raise
+
+def encode_text_row(country, state, city, source_id, period, label_id, value, analysis_id, nutrient_id=None):
+    """Codifica um registro (com os ids das dimensões) como uma linha do formato texto do COPY."""
+    return '\t'.join((
+        str(country).translate(_COPY_TEXT_ESCAPES),
+        str(state).translate(_COPY_TEXT_ESCAPES),
+        str(city).translate(_COPY_TEXT_ESCAPES),
+        str(source_id),
+        period.isoformat(),
+        str(label_id),
+        repr(float(value)),
+        str(analysis_id),
+        '\\N' if nutrient_id is None else str(nutrient_id),
+    )) + '\n'
+
+def _binary_text(value):
+    data = str(value).encode('utf-8')
+    return struct.pack('!i', len(data)) + data
+
+def _binary_smallint(value):
+    return struct.pack('!i', -1) if value is None else struct.pack('!ih', 2, value)
+
+def encode_binary_row(country, state, city, source_id, period, label_id, value, analysis_id, nutrient_id=None):
+    """Codifica um registro (com os ids das dimensões) como uma tupla do formato binário do COPY."""
+    return b''.join((
+        struct.pack('!h', len(FACT_COLUMNS)),
+        _binary_text(country),
+        _binary_text(state),
+        _binary_text(city),
+        _binary_smallint(source_id),
+        struct.pack('!ii', 4, period.toordinal() - PG_EPOCH_ORDINAL),
+        _binary_smallint(label_id),
+        struct.pack('!id', 8, float(value)),
+        _binary_smallint(analysis_id),
+        _binary_smallint(nutrient_id),
+    ))
+
+def encode_binary_columns(country, state, city, source_id, period, label_id, value, analysis_id, nutrient_id=None):
+    """
+    Codifica um lote inteiro de registros no formato binário do COPY, sem laço por linha.
+
+    period é um array de dias desde 2000-01-01 e value um array de float64. Os campos
+    texto (country, state, city) são uma str (mesmo valor em todas as linhas) ou uma tupla
+    (códigos, dicionário), com os códigos indexando a lista de strings do dicionário. Os
+    ids das dimensões são um int (ou None, gravado como NULL) ou um array com um id por
+    linha. As linhas são agrupadas pela combinação de códigos dos campos texto: dentro de
+    um grupo todas têm o mesmo tamanho, e cada grupo vira um array estruturado
+    serializado de uma vez com tobytes().
+    """
+    fields = dict(zip(FACT_COLUMNS, (country, state, city, source_id, period, label_id, value, analysis_id, nutrient_id)))
+    period = np.asarray(period, dtype=np.int32)
+    value = np.asarray(value, dtype=np.float64)
+    count = len(value)
+
+    text_columns = ('country', 'state', 'city')
+    categorical = [name for name in text_columns if isinstance(fields[name], tuple)]
+    encoded = {
+        name: [item.encode('utf-8') for item in fields[name][1]] if name in categorical
+        else str(fields[name]).encode('utf-8')
+        for name in text_columns
+    }
+    id_arrays = {name: np.asarray(fields[name], dtype=np.int16) for name in FACT_COLUMNS
+                 if name.endswith('_id') and isinstance(fields[name], (np.ndarray, list))}
+
+    if categorical:
+        codes = [np.asarray(fields[name][0], dtype=np.int64) for name in categorical]
+        dims = [len(encoded[name]) for name in categorical]
+        keys = np.ravel_multi_index(codes, dims)
+        order = np.argsort(keys, kind='stable')
+        group_keys, starts = np.unique(keys[order], return_index=True)
+        bounds = list(zip(starts, list(starts[1:]) + [count]))
+    else:
+        order = np.arange(count)
+        group_keys, bounds = [0], [(0, count)]
+
+    chunks = []
+    for group_key, (start, end) in zip(group_keys, bounds):
+        rows = order[start:end]
+        group_codes = dict(zip(categorical, np.unravel_index(group_key, dims))) if categorical else {}
+        layout = [('field_count', '>i2')]
+        texts = {}
+        for name in FACT_COLUMNS:
+            if name == 'period':
+                layout += [('period_len', '>i4'), ('period', '>i4')]
+            elif name == 'value':
+                layout += [('value_len', '>i4'), ('value', '>f8')]
+            elif name.endswith('_id'):
+                layout.append((name + '_len', '>i4'))
+                if fields[name] is not None:
+                    layout.append((name, '>i2'))
+            else:
+                text = encoded[name][group_codes[name]] if name in group_codes else encoded[name]
+                texts[name] = text
+                layout.append((name + '_len', '>i4'))
+                if text:
+                    layout.append((name, f'S{len(text)}'))
+
+        block = np.empty(len(rows), dtype=np.dtype(layout))
+        block['field_count'] = len(FACT_COLUMNS)
+        for name, text in texts.items():
+            block[name + '_len'] = len(text)
+            if text:
+                block[name] = text
+        for name in FACT_COLUMNS:
+            if name.endswith('_id'):
+                block[name + '_len'] = -1 if fields[name] is None else 2
+                if fields[name] is not None:
+                    block[name] = id_arrays[name][rows] if name in id_arrays else fields[name]
+        block['period_len'] = 4
+        block['period'] = period[rows]
+        block['value_len'] = 8
+        block['value'] = value[rows]
+        chunks.append(block.tobytes())
+
+    return b''.join(chunks)
+
+class BulkWriter:
+    """
+    Acumula registros em um buffer em memória e os grava na tabela via COPY,
+    em lotes de batch_size registros. Substitui insert_record nos carregadores:
+    a assinatura de insert_record é a mesma, sem o cursor. Os nomes de fonte,
+    rótulo, indicador e nutriente são convertidos nos ids das dimensões.
+    """
+
+    def __init__(self, cursor, table=FACT_TABLE, batch_size=None, binary=None):
+        self.cursor = cursor
+        self.table = table
+        self.dimensions = DimensionIds(cursor)
+        self.batch_size = batch_size or COPY_BATCH_SIZE
+        self.binary = (COPY_FORMAT == 'binary') if binary is None else binary
+        self.rows_written = 0
+        self.elapsed = 0.0
+        self._pending = 0
+        self._new_buffer()
+
+    def _new_buffer(self):
+        if self.binary:
+            self._buffer = io.BytesIO()
+            self._buffer.write(PGCOPY_HEADER)
+        else:
+            self._buffer = io.StringIO()
+        self._pending = 0
+
+    def insert_record(self, country, state, city, source, period, label, value, analysis, nutrient=None):
+        """Adiciona um registro ao lote atual, gravando o lote quando ele estiver cheio."""
+        ids = self.dimensions
+        row = (country, state, city, ids.id('source', source), period, ids.id('label', label), value,
+               ids.id('analysis', analysis), ids.id('nutrient', nutrient))
+        if self.binary:
+            self._buffer.write(encode_binary_row(*row))
+        else:
+            self._buffer.write(encode_text_row(*row))
+        self._pending += 1
+        if self._pending >= self.batch_size:
+            self.flush()
+
+    def write_rows(self, rows):
+        """Adiciona vários registros (tuplas na ordem de RECORD_COLUMNS; nutrient é opcional) ao lote."""
+        for row in rows:
+            self.insert_record(*row)
+
+    def write_encoded(self, data, row_count):
+        """Adiciona ao lote registros já codificados no formato do writer (ex.: encode_binary_columns)."""
+        self._buffer.write(data)
+        self._pending += row_count
+        if self._pending >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Grava o lote pendente na tabela com um único COPY."""
+        if not self._pending:
+            return
+        if self.binary:
+            self._buffer.write(PGCOPY_TRAILER)
+        start = time.perf_counter()
+        copy_from_buffer(self.cursor, self._buffer, self.table, binary=self.binary)
+        self.elapsed += time.perf_counter() - start
+        self.rows_written += self._pending
+        self._new_buffer()
+
+    def close(self):
+        """Grava o que restou no buffer."""
+        self.flush()
+
+    def rows_per_second(self):
+        return self.rows_written / self.elapsed if self.elapsed else 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        return False
+
 def print_test_results(cursor, label):
     """Realiza uma consulta para verificar os registros inseridos e imprime os resultados."""
     try:
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+import argparse
+import time
+from db_utils import get_db_connection, DimensionIds, DIMENSION_TABLES, FACT_TABLE
+from dataset_specs import DATASETS, LABELS_BY_ANALYSIS, NUTRIENTS
+from indexes import create_indexes
+
+# tb_chart é uma view que junta a tabela física (FACT_TABLE) às tabelas de dimensão:
+# source, label, analysis e nutrient ficam em cada registro como ids smallint, em vez
+# de varchar repetidos. A view mantém as colunas de antes (com nutrient no final),
+# então a API e os leitores em Python não mudam.
+VIEW_NAME = 'tb_chart'
+
+DIMENSION_DDL = """
+CREATE TABLE IF NOT EXISTS public.{table} (
+    id smallserial NOT NULL,
+    name varchar({length}) NOT NULL,
+    CONSTRAINT {table}_pkey PRIMARY KEY (id),
+    CONSTRAINT {table}_name_key UNIQUE (name)
+)
+"""
+
+# Tamanho do nome em cada dimensão, o mesmo das antigas colunas de tb_chart
+DIMENSION_LENGTHS = {'source': 4000, 'analysis': 4000, 'label': 50, 'nutrient': 1}
+
+# As colunas de largura fixa vêm antes das de tamanho variável, para evitar bytes de
+# alinhamento em cada registro. Não há chaves estrangeiras para as dimensões, para que
+# o COPY não precise verificá-las; os ids são sempre obtidos de DimensionIds.
+FACT_DDL = f"""
+CREATE TABLE IF NOT EXISTS public.{FACT_TABLE} (
+    id int4 DEFAULT nextval('tb_chart_id_seq'::regclass) NOT NULL,
+    "period" date NOT NULL,
+    value float8 NOT NULL,
+    created_at timestamp DEFAULT CURRENT_TIMESTAMP NULL,
+    updated_at timestamp DEFAULT CURRENT_TIMESTAMP NULL,
+    source_id int2 NOT NULL,
+    label_id int2 NOT NULL,
+    analysis_id int2 NOT NULL,
+    nutrient_id int2 NULL,
+    country varchar(2000) NOT NULL,
+    state varchar(2) NOT NULL,
+    city varchar(50) NOT NULL,
+    "class" varchar(50) NULL,
+    nutrient_flow varchar(7) NOT NULL CHECK (nutrient_flow IN ('entrada', 'saída')) DEFAULT 'entrada',
+    CONSTRAINT {FACT_TABLE}_pkey PRIMARY KEY (id)
+)
+"""
+
+# Consulta da view sobre uma tabela com a estrutura de FACT_TABLE (ex.: a de staging
+# de staged_reload, antes da troca)
+VIEW_QUERY = f"""
+SELECT
+    fact.id, fact.country, fact.state, fact.city, source.name AS "source", fact.period,
+    label.name AS "label", fact.value, fact.created_at, fact.updated_at, analysis.name AS analysis,
+    fact.class, fact.nutrient_flow, nutrient.name AS nutrient
+FROM public.{{fact_table}} AS fact
+JOIN public.{DIMENSION_TABLES['source']} AS source ON source.id = fact.source_id
+JOIN public.{DIMENSION_TABLES['label']} AS label ON label.id = fact.label_id
+JOIN public.{DIMENSION_TABLES['analysis']} AS analysis ON analysis.id = fact.analysis_id
+LEFT JOIN public.{DIMENSION_TABLES['nutrient']} AS nutrient ON nutrient.id = fact.nutrient_id
+"""
+
+VIEW_DDL = f"CREATE OR REPLACE VIEW public.{VIEW_NAME} AS{VIEW_QUERY.format(fact_table=FACT_TABLE)}"
+
+# Cópia de uma tabela tb_chart antiga (com os nomes em cada registro) para FACT_TABLE
+MIGRATE_QUERY = f"""
+INSERT INTO {FACT_TABLE} (id, period, value, created_at, updated_at, source_id, label_id, analysis_id,
+                          country, state, city, class, nutrient_flow)
+SELECT old.id, old.period, old.value, old.created_at, old.updated_at, source.id, label.id, analysis.id,
+       old.country, old.state, old.city, old.class, old.nutrient_flow
+FROM {{old_table}} AS old
+JOIN {DIMENSION_TABLES['source']} AS source ON source.name = old.source
+JOIN {DIMENSION_TABLES['label']} AS label ON label.name = old.label
+JOIN {DIMENSION_TABLES['analysis']} AS analysis ON analysis.name = old.analysis
+"""
+
+def known_dimension_values():
+    """Valores de cada dimensão declarados em dataset_specs."""
+    return {
+        'source': sorted({spec.source for spec in DATASETS.values()}),
+        'analysis': sorted({spec.analysis for spec in DATASETS.values()}),
+        'label': sorted(set().union(*LABELS_BY_ANALYSIS.values())),
+        'nutrient': list(NUTRIENTS),
+    }
+
+def seed_dimensions(cursor):
+    """
+    Cria nas dimensões os valores declarados em dataset_specs, para que as cargas em
+    paralelo já os encontrem; valores novos continuam sendo criados pelas cargas.
+    """
+    dimensions = DimensionIds(cursor)
+    for dimension, names in known_dimension_values().items():
+        dimensions.lookup(dimension, names)
+
+def relation_kind(cursor, name):
+    """relkind do pg_class ('r' tabela, 'v' view) de uma relação de public, ou None se não existir."""
+    cursor.execute("""
+        SELECT c.relkind FROM pg_class AS c JOIN pg_namespace AS n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public' AND c.relname = %s
+    """, (name,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def relation_comments(cursor, name):
+    """Comentários de uma relação de public: {None: comentário da relação, coluna: comentário}."""
+    cursor.execute("""
+        SELECT NULL, obj_description(%(name)s::regclass, 'pg_class')
+        UNION ALL
+        SELECT attname, col_description(attrelid, attnum)
+        FROM pg_attribute WHERE attrelid = %(name)s::regclass AND attnum > 0 AND NOT attisdropped
+    """, {'name': f'public.{name}'})
+    return {column: comment for column, comment in cursor.fetchall() if comment}
+
+def create_view(cursor, comments=None):
+    """Cria (ou recria) a view tb_chart com os comentários informados (ver relation_comments)."""
+    cursor.execute(VIEW_DDL)
+    for column, comment in (comments or {}).items():
+        if column is None:
+            cursor.execute(f"COMMENT ON VIEW {VIEW_NAME} IS %s", (comment,))
+        else:
+            cursor.execute(f'COMMENT ON COLUMN {VIEW_NAME}."{column}" IS %s', (comment,))
+
+def migrate_chart_table(cursor):
+    """
+    Converte uma tabela tb_chart antiga na tabela física e na view: os nomes distintos
+    vão para as dimensões, os registros para FACT_TABLE (com os mesmos ids) e a
+    sequência tb_chart_id_seq passa a pertencer a FACT_TABLE.id.
+    """
+    old_table = f'{VIEW_NAME}_old'
+    comments = relation_comments(cursor, VIEW_NAME)
+    cursor.execute(f"LOCK TABLE {VIEW_NAME} IN ACCESS EXCLUSIVE MODE")
+    cursor.execute(f"ALTER TABLE {VIEW_NAME} RENAME TO {old_table}")
+
+    dimensions = DimensionIds(cursor)
+    for dimension in ('source', 'label', 'analysis'):
+        cursor.execute(f"SELECT DISTINCT {dimension} FROM {old_table}")
+        dimensions.lookup(dimension, sorted(name for name, in cursor.fetchall()))
+
+    cursor.execute(FACT_DDL)
+    cursor.execute(MIGRATE_QUERY.format(old_table=old_table))
+    migrated = cursor.rowcount
+    cursor.execute(f"ALTER SEQUENCE tb_chart_id_seq OWNED BY {FACT_TABLE}.id")
+    cursor.execute(f"DROP TABLE {old_table}")
+    if comments.get(None):
+        cursor.execute(f"COMMENT ON TABLE {FACT_TABLE} IS %s", (comments[None],))
+    create_view(cursor, comments)
+    return migrated
+
+def ensure_schema(cursor):
+    """
+    Garante as dimensões, FACT_TABLE e a view tb_chart, com os valores conhecidos nas
+    dimensões. Se tb_chart ainda for uma tabela, ela é migrada (migrate_chart_table).
+    Retorna o número de registros migrados (0 se não houve migração).
+    """
+    for dimension, table in DIMENSION_TABLES.items():
+        cursor.execute(DIMENSION_DDL.format(table=table, length=DIMENSION_LENGTHS[dimension]))
+    seed_dimensions(cursor)
+
+    if relation_kind(cursor, VIEW_NAME) == 'r':
+        return migrate_chart_table(cursor)
+
+    cursor.execute("CREATE SEQUENCE IF NOT EXISTS tb_chart_id_seq AS integer")
+    cursor.execute(FACT_DDL)
+    cursor.execute(f"ALTER SEQUENCE tb_chart_id_seq OWNED BY {FACT_TABLE}.id")
+    create_view(cursor)
+    return 0
+
+def table_sizes(cursor):
+    """Tamanho total em bytes (com índices e TOAST) de FACT_TABLE e das dimensões."""
+    sizes = {}
+    for table in (FACT_TABLE,) + tuple(DIMENSION_TABLES.values()):
+        cursor.execute("SELECT pg_total_relation_size(%s)", (table,))
+        sizes[table] = cursor.fetchone()[0]
+    return sizes
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cria ou migra as tabelas de dimensão, tb_chart_fact e a view tb_chart.")
+    parser.add_argument('action', choices=['ensure', 'sizes'], nargs='?', default='ensure')
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            if args.action == 'sizes':
+                for table, size in table_sizes(cursor).items():
+                    print(f"{table:<30} {size / 2**20:>10.2f} MB")
+            else:
+                start = time.perf_counter()
+                migrated = ensure_schema(cursor)
+                conn.commit()
+                if migrated:
+                    print(f"{migrated} registros migrados de tb_chart para {FACT_TABLE}; criando índices...")
+                    create_indexes(FACT_TABLE)
+                print(f"Esquema de tb_chart pronto em {time.perf_counter() - start:.2f}s.")
+    finally:
+        conn.close()
@@ -0,0 +1,70 @@
+import csv
+import os
+from functools import lru_cache
+from columnar import DictColumn, dictionary_encode
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+GEOCODE_FILE = os.path.join(DATA_DIR, 'ouro_ibge_geocodigo.csv')
+
+# Códigos que não constam no arquivo do IBGE, mas aparecem nos dados de origem
+MANUAL_CORRECTIONS = {'1': 'DF', '34': 'SP'}
+
+class GeocodeIndex:
+    """
+    Índice em memória do arquivo de geocódigos do IBGE (UF-id, UF-sigla, UF-nome,
+    municipio-id, municipio-nome).
+
+    states mapeia o código numérico da UF (incluindo MANUAL_CORRECTIONS) e a própria
+    sigla para a sigla; municipalities mapeia o código do município para (sigla, nome).
+    Cada consulta é uma busca em dict.
+    """
+
+    def __init__(self, filename=GEOCODE_FILE):
+        self.states = dict(MANUAL_CORRECTIONS)
+        self.municipalities = {}
+        with open(filename, 'r', newline='') as file:
+            reader = csv.reader(file)
+            next(reader)  # Pular o cabeçalho
+            for state_id, state, _, municipality_id, municipality in reader:
+                state = state.strip()
+                self.states[state_id.strip()] = state
+                self.states[state] = state
+                self.municipalities[municipality_id.strip()] = (state, municipality.strip())
+
+    def resolve(self, code):
+        """
+        (sigla, cidade) de um código de UF, sigla ou código de município; a cidade fica
+        vazia quando o código é de UF. Códigos desconhecidos são devolvidos sem alteração,
+        para que a validação os rejeite.
+        """
+        state = self.states.get(code)
+        if state is not None:
+            return state, ''
+        return self.municipalities.get(code, (code, ''))
+
+    def codes(self):
+        """Todos os códigos reconhecidos por resolve."""
+        return frozenset(self.states) | frozenset(self.municipalities)
+
+@lru_cache(maxsize=None)
+def geocode_index():
+    """GeocodeIndex de GEOCODE_FILE, lido uma única vez por processo."""
+    return GeocodeIndex()
+
+def enrich_geocodes(data, index=None):
+    """
+    Normaliza a coluna state de um ColumnarData (columnar.ColumnarData) para a sigla da
+    UF e, se não houver coluna city, cria city com o nome do município (vazio nas linhas
+    com código de UF). Cada valor distinto é resolvido uma única vez.
+    """
+    state = data.columns.get('state')
+    if not isinstance(state, DictColumn):
+        return data
+    resolved = [(index or geocode_index()).resolve(code) for code in state.values]
+    states = dictionary_encode([state for state, _ in resolved])
+    columns = dict(data.columns, state=DictColumn(states.codes[state.codes], states.values))
+    if 'city' not in columns:
+        cities = dictionary_encode([city for _, city in resolved])
+        columns['city'] = DictColumn(cities.codes[state.codes], cities.values)
+    return data._replace(columns=columns)
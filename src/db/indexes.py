@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from db_utils import run_in_transaction, DB_MAX_CONNECTIONS, FACT_TABLE
+
+# Índice secundário de tb_chart_fact; o nome real é <tabela>_<suffix>
+IndexSpec = namedtuple('IndexSpec', ['suffix', 'method', 'columns', 'description'])
+
+# Índices usados pelas consultas da API (ChartService): todas filtram por analysis,
+# e em seguida por label, país/estado e intervalo de period; o BRIN atende às
+# varreduras por intervalo de datas com um índice de poucas páginas. A view tb_chart
+# resolve os nomes de analysis e label nas dimensões e filtra os ids na tabela física.
+CHART_INDEXES = (
+    IndexSpec('analysis_label_period_idx', 'btree', ('analysis_id', 'label_id', 'period'),
+              "analysis + label + intervalo de datas (findSum*, findMobileAverage*)"),
+    IndexSpec('analysis_country_state_period_idx', 'btree', ('analysis_id', 'country', 'state', 'period'),
+              "analysis + filtros de país/estado + intervalo de datas"),
+    IndexSpec('period_brin_idx', 'brin', ('period',),
+              "intervalos de datas"),
+)
+
+# Memória de cada sessão que cria um índice
+INDEX_MAINTENANCE_WORK_MEM = os.getenv('INDEX_MAINTENANCE_WORK_MEM', '256MB')
+
+def index_name(table, spec):
+    return f'{table}_{spec.suffix}'
+
+def index_statement(table, spec):
+    """Comando CREATE INDEX de um índice declarado."""
+    return (f"CREATE INDEX IF NOT EXISTS {index_name(table, spec)} "
+            f"ON {table} USING {spec.method} ({', '.join(spec.columns)})")
+
+def drop_indexes(cursor, table=FACT_TABLE):
+    """Remove os índices declarados da tabela (a chave primária é mantida)."""
+    for spec in CHART_INDEXES:
+        cursor.execute(f"DROP INDEX IF EXISTS {index_name(table, spec)}")
+
+def rename_indexes(cursor, old_table, new_table):
+    """Renomeia os índices declarados de old_table para os nomes de new_table (ex.: na troca do staging)."""
+    for spec in CHART_INDEXES:
+        cursor.execute(f"ALTER INDEX IF EXISTS {index_name(old_table, spec)} RENAME TO {index_name(new_table, spec)}")
+
+def _build_index(cursor, table, spec):
+    cursor.execute("SET LOCAL maintenance_work_mem = %s", (INDEX_MAINTENANCE_WORK_MEM,))
+    cursor.execute(index_statement(table, spec))
+
+def _create_index(table, spec):
+    """Cria um índice em sua própria conexão do pool; executado em uma thread de create_indexes."""
+    start = time.perf_counter()
+    run_in_transaction(_build_index, table, spec)
+    return index_name(table, spec), time.perf_counter() - start
+
+def create_indexes(table=FACT_TABLE, workers=None):
+    """
+    Cria os índices declarados em paralelo, um por conexão, e atualiza as estatísticas.
+
+    CREATE INDEX bloqueia só as escritas na tabela, então vários podem ser criados ao
+    mesmo tempo; a tabela precisa estar confirmada (COMMIT) antes da chamada.
+    Retorna a lista de (índice, segundos).
+    """
+    workers = min(workers or DB_MAX_CONNECTIONS, len(CHART_INDEXES))
+    with ThreadPoolExecutor(workers) as executor:
+        timings = list(executor.map(lambda spec: _create_index(table, spec), CHART_INDEXES))
+
+    run_in_transaction(lambda cursor: cursor.execute(f"ANALYZE {table}"))
+    return timings
+
+@contextmanager
+def deferred_indexes(table=FACT_TABLE, workers=None):
+    """
+    Remove os índices declarados antes de uma carga em massa e os recria, em paralelo,
+    quando o bloco with termina sem erro. Em caso de erro os índices são recriados do
+    mesmo jeito, para que a tabela não fique sem eles.
+    """
+    run_in_transaction(drop_indexes, table)
+    try:
+        yield
+    finally:
+        create_indexes(table, workers)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gerencia os índices secundários de tb_chart_fact.")
+    parser.add_argument('action', choices=['create', 'drop', 'list'])
+    parser.add_argument('--table', default=FACT_TABLE)
+    parser.add_argument('--workers', type=int, help="Índices criados ao mesmo tempo (padrão: DATABASE_MAX_CONNECTIONS)")
+    args = parser.parse_args()
+
+    if args.action == 'list':
+        for spec in CHART_INDEXES:
+            print(f"{index_statement(args.table, spec)}  -- {spec.description}")
+    elif args.action == 'drop':
+        run_in_transaction(drop_indexes, args.table)
+        print(f"Índices secundários de {args.table} removidos.")
+    else:
+        start = time.perf_counter()
+        for name, seconds in create_indexes(args.table, args.workers):
+            print(f"{name:<50} {seconds:>8.2f}s")
+        print(f"Índices criados e estatísticas atualizadas em {time.perf_counter() - start:.2f}s.")
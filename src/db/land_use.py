@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import re
+import sys
+from collections import namedtuple
+from psycopg2.extras import execute_values
+from db_utils import read_csv_file, run_in_transaction
+from dimensions import relation_kind
+from manifest import ensure_manifest_table, file_hash, get_manifest_entry, save_manifest_entry
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+LAND_USE_FILE = os.path.join(DATA_DIR, 'prata_mapbiomas_codigo_uso_terra.csv')
+
+# Nome do arquivo no manifesto de cargas (tb_load_manifest)
+MANIFEST_NAME = 'prata_mapbiomas_codigo_uso_terra'
+
+LAND_USE_TABLE = 'tb_dim_land_use'
+CLOSURE_TABLE = 'tb_land_use_closure'
+LEVEL_VIEW = 'tb_land_use_level'
+
+# Classes de uso da terra do MapBiomas: code é o código do MapBiomas, path a posição
+# na hierarquia ('3.2.1.1') e level a profundidade (1 para as classes de primeiro nível)
+LAND_USE_DDL = f"""
+CREATE TABLE IF NOT EXISTS public.{LAND_USE_TABLE} (
+    code int2 NOT NULL,
+    parent_code int2 NULL,
+    "level" int2 NOT NULL,
+    "path" varchar(20) NOT NULL,
+    name varchar(200) NOT NULL,
+    "label" varchar(200) NOT NULL,
+    CONSTRAINT {LAND_USE_TABLE}_pkey PRIMARY KEY (code),
+    CONSTRAINT {LAND_USE_TABLE}_path_key UNIQUE ("path")
+)
+"""
+
+# Fecho transitivo da hierarquia: uma linha por par (ancestral, descendente), incluindo
+# a própria classe (distance 0), e nenhuma outra. Os descendentes de uma classe são
+# WHERE ancestor_code = X, sem DISTINCT. Cada classe tem no máximo um ancestral por
+# nível (a restrição UNIQUE, que também serve às junções por nível).
+CLOSURE_DDL = f"""
+CREATE TABLE IF NOT EXISTS public.{CLOSURE_TABLE} (
+    ancestor_code int2 NOT NULL,
+    descendant_code int2 NOT NULL,
+    ancestor_level int2 NOT NULL,
+    distance int2 NOT NULL,
+    CONSTRAINT {CLOSURE_TABLE}_pkey PRIMARY KEY (ancestor_code, descendant_code),
+    CONSTRAINT {CLOSURE_TABLE}_descendant_level_key UNIQUE (descendant_code, ancestor_level)
+)
+"""
+
+# Agrupamento por nível: uma linha por classe e nível, de 1 até a profundidade máxima.
+# Nos níveis abaixo do seu, a classe não tem ancestral e aparece como o próprio grupo
+# (is_padding), para que as classes mais rasas não fiquem de fora dos níveis mais
+# profundos. Agregar um indicador por classe em qualquer nível é uma única junção por
+# igualdade, sem perder nem repetir valores:
+#
+#   JOIN tb_land_use_level AS level
+#     ON level.descendant_code = indicador.code AND level.ancestor_level = 2
+#
+# e o GROUP BY em level.ancestor_code.
+LEVEL_VIEW_DDL = f"""
+CREATE OR REPLACE VIEW public.{LEVEL_VIEW} AS
+SELECT
+    land_use.code AS descendant_code,
+    levels.level::int2 AS ancestor_level,
+    COALESCE(closure.ancestor_code, land_use.code) AS ancestor_code,
+    closure.ancestor_code IS NULL AS is_padding
+FROM public.{LAND_USE_TABLE} AS land_use
+CROSS JOIN generate_series(1, (SELECT MAX("level") FROM public.{LAND_USE_TABLE})) AS levels (level)
+LEFT JOIN public.{CLOSURE_TABLE} AS closure
+    ON closure.descendant_code = land_use.code AND closure.ancestor_level = levels.level
+"""
+
+LandUseClass = namedtuple('LandUseClass', ['code', 'parent_code', 'level', 'path', 'name', 'label'])
+
+# "3.2.1.1. Soja" ou "1.1 Formação Florestal": posição na hierarquia e nome
+CLASS_PATTERN = re.compile(r'^(\d+(?:\.\d+)*)\.?\s+(.+)$')
+
+def parse_land_use_classes(rows):
+    """
+    Converte as linhas do CSV (codigo, classe_cod, rotulo) em LandUseClass, com o pai de
+    cada classe encontrado pela posição na hierarquia ('3.2.1' é pai de '3.2.1.1').
+    Levanta ValueError para classes sem posição, posições repetidas ou pais ausentes.
+    """
+    parsed = []
+    for line, row in enumerate(rows, start=2):  # linha no arquivo, contando o cabeçalho
+        if len(row) < 3:
+            raise ValueError(f"Linha {line}: esperadas 3 colunas, encontradas {len(row)}")
+        match = CLASS_PATTERN.match(row[1].strip())
+        if match is None:
+            raise ValueError(f"Linha {line}: classe sem posição na hierarquia: {row[1]!r}")
+        parsed.append((int(row[0]), match.group(1), match.group(2).strip(), row[2].strip()))
+
+    codes_by_path = {}
+    for code, path, _, _ in parsed:
+        if path in codes_by_path:
+            raise ValueError(f"Posição {path} repetida nos códigos {codes_by_path[path]} e {code}")
+        codes_by_path[path] = code
+
+    classes = []
+    for code, path, name, label in parsed:
+        parts = path.split('.')
+        parent_path = '.'.join(parts[:-1])
+        if parent_path and parent_path not in codes_by_path:
+            raise ValueError(f"Classe {path} ({name}) sem a classe pai {parent_path}")
+        classes.append(LandUseClass(code, codes_by_path.get(parent_path), len(parts), path, name, label))
+    return classes
+
+def closure_rows(classes):
+    """Pares (ancestral, descendente, nível do ancestral, distância) do fecho transitivo (ver CLOSURE_DDL)."""
+    by_code = {land_use.code: land_use for land_use in classes}
+    rows = []
+    for land_use in classes:
+        ancestor = land_use
+        while ancestor is not None:
+            rows.append((ancestor.code, land_use.code, ancestor.level, land_use.level - ancestor.level))
+            ancestor = by_code.get(ancestor.parent_code)
+    return rows
+
+def ensure_land_use_tables(cursor):
+    """Cria as tabelas de classes e do fecho e a view por nível, se ainda não existirem."""
+    cursor.execute(LAND_USE_DDL)
+    cursor.execute(CLOSURE_DDL)
+    cursor.execute(LEVEL_VIEW_DDL)
+
+def load_land_use(cursor, classes):
+    """Substitui as classes e o fecho pelos calculados de classes; retorna (classes, pares)."""
+    # O fecho é derivado das classes: recriado a cada carga, o que também converte o de
+    # versões anteriores (uma linha por nível, com chave em descendant_code e ancestor_level)
+    cursor.execute(f"DROP VIEW IF EXISTS {LEVEL_VIEW}")
+    cursor.execute(f"DROP TABLE IF EXISTS {CLOSURE_TABLE}")
+    ensure_land_use_tables(cursor)
+    cursor.execute(f"DELETE FROM {LAND_USE_TABLE}")
+    execute_values(cursor, f"""
+        INSERT INTO {LAND_USE_TABLE} (code, parent_code, level, path, name, label) VALUES %s
+    """, classes)
+    closure = closure_rows(classes)
+    execute_values(cursor, f"""
+        INSERT INTO {CLOSURE_TABLE} (ancestor_code, descendant_code, ancestor_level, distance) VALUES %s
+    """, closure)
+    cursor.execute(f"ANALYZE {LAND_USE_TABLE}")
+    cursor.execute(f"ANALYZE {CLOSURE_TABLE}")
+    return len(classes), len(closure)
+
+def land_use_up_to_date(cursor, path=LAND_USE_FILE):
+    """O arquivo não mudou desde a última carga registrada no manifesto (com a view por nível já criada)."""
+    ensure_manifest_table(cursor)
+    entry = get_manifest_entry(cursor, MANIFEST_NAME)
+    return entry is not None and entry['file_hash'] == file_hash(path) and relation_kind(cursor, LEVEL_VIEW) == 'v'
+
+def process_land_use(path=LAND_USE_FILE, force=False):
+    """
+    Carrega a hierarquia de uso da terra do MapBiomas em uma transação, repetida em erros
+    transitórios, se o arquivo mudou desde a última carga (ou sempre, com force).
+    Retorna (classes, pares do fecho), (0, 0) se o arquivo não mudou, ou None em caso de erro.
+    """
+    def load(cursor):
+        if not force and land_use_up_to_date(cursor, path):
+            return 0, 0
+        classes = parse_land_use_classes(read_csv_file(path))
+        counts = load_land_use(cursor, classes)
+        save_manifest_entry(cursor, MANIFEST_NAME, file_hash(path), counts[0], 'MapBiomas', 'Uso da Terra', [])
+        return counts
+
+    try:
+        counts = run_in_transaction(load)
+    except Exception as error:
+        print(f"Erro ao carregar as classes de uso da terra: {error}")
+        return None
+
+    if counts == (0, 0):
+        print(f"Arquivo CSV '{os.path.basename(path)}' não mudou desde a última carga; ignorado.")
+    else:
+        print(f"{counts[0]} classes de uso da terra carregadas em {LAND_USE_TABLE} ({counts[1]} pares em {CLOSURE_TABLE}).")
+    return counts
+
+def print_tree(cursor):
+    """Imprime a hierarquia carregada, com o número de descendentes de cada classe."""
+    cursor.execute(f"""
+        SELECT land_use.code, land_use.level, land_use.path, land_use.name,
+               COUNT(*) - 1
+        FROM {LAND_USE_TABLE} AS land_use
+        JOIN {CLOSURE_TABLE} AS closure ON closure.ancestor_code = land_use.code
+        GROUP BY land_use.code
+        ORDER BY string_to_array(land_use.path, '.')::int[]
+    """)
+    for code, level, path, name, descendants in cursor.fetchall():
+        print(f"{'  ' * (level - 1)}{path} {name} (código {code}, {descendants} descendentes)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Carrega a hierarquia de classes de uso da terra do MapBiomas.")
+    parser.add_argument('action', choices=['load', 'tree'], nargs='?', default='load')
+    parser.add_argument('--file', default=LAND_USE_FILE, help="CSV com codigo, classe_cod e rotulo")
+    parser.add_argument('--force', action='store_true', help="Recarrega mesmo que o arquivo não tenha mudado")
+    args = parser.parse_args()
+
+    if args.action == 'tree':
+        run_in_transaction(print_tree)
+    elif process_land_use(args.file, args.force) is None:
+        sys.exit(1)
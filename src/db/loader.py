@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+from functools import lru_cache
+from db_utils import get_db_connection, read_csv_file, retry, BulkWriter, DimensionIds, encode_binary_columns, print_test_results, COPY_BATCH_SIZE, DIMENSION_TABLES, FACT_TABLE, PG_EPOCH_ORDINAL, RECORD_COLUMNS, VERIFY_ROW_COUNT
+from columnar import DictColumn, columns_from_rows, iter_csv_rows, read_csv_rows, slice_rows
+from streaming import BackgroundWriter, run_pipeline
+from dataset_specs import DATASETS, get_dataset
+from geocodes import enrich_geocodes, geocode_index
+from manifest import ensure_manifest_table, file_hash, get_manifest_entry, save_manifest_entry
+from metrics import RunMetrics, combine_reports, format_stages, write_report
+from rollup import ROLLUP_KEY, RollupDelta
+from validation import ChunkValidator, Quarantine
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+@lru_cache(maxsize=None)
+def parse_date(value):
+    """Converte 'AAAA-MM-DD' em date; as datas se repetem muito, então o resultado é memoizado."""
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+# Conversões disponíveis para os campos declarados nos DatasetSpec
+COERCIONS = {
+    'date': parse_date,
+    'float': float,
+    'int': int,
+    'str': str,
+    'strip': str.strip,
+}
+
+def dataset_path(spec):
+    """Caminho absoluto do CSV de um DatasetSpec."""
+    return os.path.join(DATA_DIR, spec.file)
+
+def compile_spec(spec):
+    """
+    Compila um DatasetSpec em uma função linha -> tupla na ordem de RECORD_COLUMNS.
+
+    A função é gerada uma única vez por spec, com índices e constantes embutidos,
+    para que o laço de carga não precise consultar o spec a cada linha. O código de
+    state é convertido na sigla da UF e, sem coluna city, o nome do município vem do
+    mesmo código (ver geocodes.GeocodeIndex.resolve).
+    """
+    namespace = {'_coerce_' + name: fn for name, fn in COERCIONS.items()}
+    namespace['_resolve_geocode'] = geocode_index().resolve
+    constants = dict(spec.constants, source=spec.source, analysis=spec.analysis)
+    expressions = []
+    for field in RECORD_COLUMNS:
+        if field in spec.columns:
+            expression = f'row[{spec.columns[field]}]'
+            coercion = spec.coercions.get(field)
+            if coercion:
+                if coercion not in COERCIONS:
+                    raise ValueError(f"Conversão desconhecida '{coercion}' para o campo {field}")
+                expression = f'_coerce_{coercion}({expression})'
+            if field == 'state':
+                expression = f'_resolve_geocode({expression})[0]'
+        elif field == 'city' and 'state' in spec.columns:
+            expression = f"_resolve_geocode(row[{spec.columns['state']}])[1]"
+        else:
+            # Sem coluna de nutriente, o registro fica com nutrient NULL
+            namespace['_const_' + field] = constants.get(field, None if field == 'nutrient' else '')
+            expression = '_const_' + field
+        expressions.append(expression)
+
+    source = f"def transform(row):\n    return ({', '.join(expressions)},)\n"
+    exec(compile(source, f'<dataset {spec.file}>', 'exec'), namespace)
+    return namespace['transform']
+
+# Conversões que o leitor colunar sabe fazer, com o tipo de coluna correspondente
+COLUMNAR_TYPES = {'date': 'date', 'float': 'float', 'str': 'str', None: 'str'}
+
+def columnar_types(spec):
+    """Tipos das colunas do spec para read_csv_columns, ou None se alguma conversão não for suportada."""
+    types = {}
+    for field in spec.columns:
+        coercion = spec.coercions.get(field)
+        if coercion not in COLUMNAR_TYPES:
+            return None
+        types[field] = COLUMNAR_TYPES[coercion]
+    return types
+
+def read_dataset_columns(spec, metrics=None):
+    """Lê o CSV de um DatasetSpec em colunas tipadas (ver columnar.read_csv_columns)."""
+    metrics = metrics or RunMetrics(spec.file)
+    with metrics.stage('read'):
+        rows = read_csv_rows(dataset_path(spec))
+    with metrics.stage('parse'):
+        return columns_from_rows(rows, spec.columns, columnar_types(spec))
+
+def encode_dataset_columns(spec, data, dimensions, rollup=None):
+    """
+    Codifica colunas lidas de um DatasetSpec no formato binário do COPY de tb_chart_fact.
+    Fonte, indicador, rótulo e nutriente são convertidos em ids por dimensions
+    (db_utils.DimensionIds), uma consulta por valor distinto. Os códigos do IBGE em
+    state viram a sigla da UF e o nome do município (geocodes.enrich_geocodes); isso é
+    feito depois da validação, para que as chaves repetidas sejam comparadas pelos
+    códigos do arquivo. Com rollup (rollup.RollupDelta), os registros do bloco são
+    somados aos grupos da rollup.
+    """
+    data = enrich_geocodes(data)
+    constants = dict(spec.constants, source=spec.source, analysis=spec.analysis)
+    if rollup is not None:
+        rollup.add_columns({name: data.columns.get(name, constants.get(name, '')) for name in ROLLUP_KEY[:-1]},
+                           data.columns['period'], data.columns['value'])
+    fields = []
+    for field in RECORD_COLUMNS:
+        column = data.columns.get(field)
+        if field in DIMENSION_TABLES:
+            if isinstance(column, DictColumn):
+                fields.append(dimensions.codes(field, column.codes, column.values))
+            else:
+                fields.append(dimensions.id(field, constants.get(field)))
+        elif column is None:
+            fields.append(constants.get(field, ''))
+        elif isinstance(column, DictColumn):
+            fields.append((column.codes, column.values))
+        elif field == 'period':
+            fields.append(column - PG_EPOCH_ORDINAL)
+        else:
+            fields.append(column)
+    return encode_binary_columns(*fields)
+
+def dataset_validator(spec):
+    """
+    ChunkValidator de um DatasetSpec, com as linhas rejeitadas em QUARANTINE_DIR;
+    a quarentena de uma carga anterior do mesmo arquivo é removida.
+    """
+    quarantine = Quarantine(dataset_path(spec))
+    quarantine.remove_previous()
+    return ChunkValidator(spec, quarantine)
+
+def finish_validation(spec, validator, metrics):
+    """Fecha a quarentena, soma as rejeições por motivo em metrics e imprime um resumo."""
+    validator.close()
+    metrics.count('rows_rejected', validator.rejected)
+    for reason, count in validator.summary().items():
+        metrics.count(f'rejected_{reason}', count)
+    if validator.rejected:
+        reasons = ', '.join(f"{reason}: {count}" for reason, count in validator.summary().items())
+        print(f"{validator.rejected} linha(s) de {spec.file} enviada(s) para {validator.quarantine.path} ({reasons})")
+
+def stream_dataset(cursor, spec, table=FACT_TABLE, chunk_size=None, metrics=None, labels=None):
+    """
+    Carrega um DatasetSpec em blocos de chunk_size linhas, com memória limitada.
+
+    Cada bloco é lido e convertido em colunas, validado (validation.ChunkValidator) e
+    codificado para o COPY binário enquanto o bloco anterior é gravado por uma thread
+    (streaming.BackgroundWriter). Linhas rejeitadas vão para a quarentena sem interromper
+    a carga. Os tempos de cada etapa e os registros aceitos e rejeitados são somados em
+    metrics. Os grupos da rollup tocados pelos blocos são atualizados na mesma transação
+    (rollup.RollupDelta). Se labels for um set, recebe os rótulos lidos do arquivo.
+    Retorna o número de registros gravados.
+    """
+    chunk_size = chunk_size or COPY_BATCH_SIZE
+    metrics = metrics or RunMetrics(spec.file)
+    types = columnar_types(spec)
+    validator = dataset_validator(spec)
+    rollup = RollupDelta.for_table(cursor, table)
+    writer = BackgroundWriter(cursor, table)
+    # Os ids são consultados nesta thread enquanto a do writer faz o COPY; cursores
+    # não podem ser compartilhados entre threads, a conexão sim
+    dimensions = DimensionIds(cursor.connection.cursor())
+
+    def parse(rows):
+        # As linhas originais são mantidas até a validação, para a quarentena
+        with metrics.stage('parse'):
+            data = columns_from_rows(list(rows), spec.columns, types)
+            if labels is not None:
+                labels.update(data.columns['label'].values if 'label' in data.columns else [spec.constants.get('label', '')])
+            return rows, data
+
+    def validate(chunk):
+        rows, data = chunk
+        with metrics.stage('validate'):
+            return validator.validate(data, rows)
+
+    def transform(chunk):
+        with metrics.stage('transform'):
+            return encode_dataset_columns(spec, chunk, dimensions, rollup)
+
+    chunks = map(parse, metrics.timed('read', iter_csv_rows(dataset_path(spec), chunk_size)))
+    try:
+        loaded = run_pipeline(chunks, validate, transform, writer)
+    finally:
+        finish_validation(spec, validator, metrics)
+    metrics.add_time('write', writer.writer.elapsed)
+    if rollup is not None:
+        with metrics.stage('rollup'):
+            rollup.apply(cursor)
+    metrics.count('rows_ok', loaded)
+    return loaded
+
+def load_dataset_columns(cursor, spec, data, table=FACT_TABLE, metrics=None, rows=None):
+    """
+    Grava colunas já lidas de um DatasetSpec via COPY binário, em lotes, sem laço por linha.
+    As linhas rejeitadas na validação vão para a quarentena; rows são as linhas originais
+    do CSV, gravadas na quarentena. A rollup é atualizada como em stream_dataset.
+    """
+    metrics = metrics or RunMetrics(spec.file)
+    validator = dataset_validator(spec)
+    try:
+        with metrics.stage('validate'):
+            data = validator.validate(data, rows)
+    finally:
+        finish_validation(spec, validator, metrics)
+
+    rollup = RollupDelta.for_table(cursor, table)
+    writer = BulkWriter(cursor, table=table, binary=True)
+    start_time = time.perf_counter()
+    for start in range(0, data.length, writer.batch_size):
+        chunk = slice_rows(data, start, start + writer.batch_size)
+        writer.write_encoded(encode_dataset_columns(spec, chunk, writer.dimensions, rollup), chunk.length)
+    writer.close()
+    metrics.add_time('transform', time.perf_counter() - start_time - writer.elapsed)
+    metrics.add_time('write', writer.elapsed)
+    if rollup is not None:
+        with metrics.stage('rollup'):
+            rollup.apply(cursor)
+    metrics.count('rows_ok', data.length)
+    return data.length
+
+def dataset_labels(spec, rows):
+    """Rótulos distintos presentes nas linhas de um conjunto de dados."""
+    if 'label' not in spec.columns:
+        return {spec.constants.get('label', '')}
+    index = spec.columns['label']
+    return {row[index] for row in rows if len(row) > index}
+
+def load_dataset(cursor, spec, writer=None, rows=None, table=FACT_TABLE, metrics=None, labels=None):
+    """
+    Carrega um DatasetSpec na tabela informada e retorna o número de registros gravados.
+
+    Se rows não for informado e as conversões do spec forem suportadas pelo leitor
+    colunar, o CSV é lido em blocos de colunas tipadas e gravado via COPY binário
+    (stream_dataset); caso contrário, cada linha passa pela função gerada por
+    compile_spec, e as linhas que não puderem ser convertidas vão para a quarentena.
+    Os tempos de cada etapa e os registros aceitos e descartados são somados em
+    metrics. Em FACT_TABLE, os grupos da rollup tocados são atualizados na mesma
+    transação. Se labels for um set, recebe os rótulos lidos do arquivo.
+    """
+    metrics = metrics or RunMetrics(spec.file)
+    if rows is None and writer is None and columnar_types(spec) is not None:
+        return stream_dataset(cursor, spec, table, metrics=metrics, labels=labels)
+
+    transform = compile_spec(spec)
+    owns_writer = writer is None
+    if owns_writer:
+        writer = BulkWriter(cursor, table=table)
+    insert = writer.insert_record
+    write_time = writer.elapsed
+    rollup = RollupDelta.for_table(cursor, writer.table)
+    key_indexes = [RECORD_COLUMNS.index(name) for name in ROLLUP_KEY[:-1]]
+    period_index, value_index = RECORD_COLUMNS.index('period'), RECORD_COLUMNS.index('value')
+
+    loaded = 0
+    rejected = []
+    quarantine = Quarantine(dataset_path(spec))
+    quarantine.remove_previous()
+    if rows is None:
+        with metrics.stage('read'):
+            rows = read_csv_file(dataset_path(spec))
+    if labels is not None:
+        labels.update(dataset_labels(spec, rows))
+    start = time.perf_counter()
+    for line, row in enumerate(rows, start=2):  # linha no arquivo, contando o cabeçalho
+        try:
+            record = transform(row)
+        except (ValueError, IndexError) as error:
+            rejected.append((line, 'linha_incompleta' if isinstance(error, IndexError) else 'valor_invalido', row))
+            continue
+        insert(*record)
+        if rollup is not None:
+            rollup.add(tuple(record[index] for index in key_indexes) + (record[period_index].year,), record[value_index])
+        loaded += 1
+
+    if owns_writer:
+        writer.close()
+    # A conversão e a gravação se alternam no laço; o tempo dos COPY vem do writer
+    write_time = writer.elapsed - write_time
+    metrics.add_time('transform', time.perf_counter() - start - write_time)
+    metrics.add_time('write', write_time)
+    if rollup is not None:
+        with metrics.stage('rollup'):
+            rollup.apply(cursor)
+    metrics.count('rows_ok', loaded)
+    metrics.count('rows_rejected', len(rejected))
+    if rejected:
+        quarantine.write(*zip(*rejected))
+        quarantine.close()
+        print(f"{len(rejected)} linha(s) de {spec.file} enviada(s) para {quarantine.path}")
+    return loaded
+
+def delete_dataset_records(cursor, spec, labels, metrics, max_id=None):
+    """
+    Remove de FACT_TABLE os registros com a fonte, o indicador e um dos rótulos de um
+    DatasetSpec (e id até max_id, se informado) e retorna quantos foram removidos. Se a
+    rollup existir, os grupos removidos são descontados dela na mesma transação.
+    """
+    if not labels:
+        return 0
+    dimensions = DimensionIds(cursor)
+    delete_query = f"""
+        DELETE FROM {FACT_TABLE}
+        WHERE source_id = %s AND analysis_id = %s AND label_id = ANY(%s)
+    """
+    params = (dimensions.id('source', spec.source), dimensions.id('analysis', spec.analysis),
+              dimensions.lookup('label', sorted(labels)))
+    if max_id is not None:
+        delete_query += " AND id <= %s"
+        params += (max_id,)
+    rollup = RollupDelta.for_table(cursor, FACT_TABLE)
+    if rollup is None:
+        cursor.execute(delete_query, params)
+        return cursor.rowcount
+
+    # Os registros removidos são descontados dos seus grupos na rollup
+    with metrics.stage('rollup'):
+        cursor.execute(f"""
+            WITH deleted AS ({delete_query} RETURNING label_id, country, state, city, period, value)
+            SELECT %s, label.name, %s, deleted.country, deleted.state, deleted.city,
+                   EXTRACT(YEAR FROM deleted.period)::int, SUM(deleted.value), COUNT(*)
+            FROM deleted
+            JOIN {DIMENSION_TABLES['label']} AS label ON label.id = deleted.label_id
+            GROUP BY label.name, deleted.country, deleted.state, deleted.city, EXTRACT(YEAR FROM deleted.period)
+        """, params + (spec.analysis, spec.source))
+        groups = cursor.fetchall()
+        rollup.subtract(groups)
+        rollup.apply(cursor)
+    return sum(group[-1] for group in groups)
+
+def load_dataset_incremental(cursor, name, spec, metrics=None, force=False):
+    """
+    Carrega um conjunto de dados apenas se o CSV mudou desde a última carga registrada
+    em tb_load_manifest (ou sempre, com force). Retorna None quando o arquivo não mudou;
+    caso contrário, retorna (registros removidos, registros gravados).
+
+    Os registros do arquivo são identificados por source, analysis e rótulo: os
+    rótulos de cada arquivo não se repetem entre arquivos com a mesma fonte e
+    indicador. Antes de gravar a nova versão, são removidos os registros com os
+    rótulos da carga anterior; a nova versão é gravada em blocos (stream_dataset), que
+    também coletam os rótulos do arquivo para o manifesto, e por fim são removidos os
+    registros anteriores com rótulos que não estavam no manifesto. Se a rollup existir,
+    os grupos dos registros removidos e gravados são atualizados na mesma transação.
+    """
+    metrics = metrics or RunMetrics(spec.file)
+    ensure_manifest_table(cursor)
+    path = dataset_path(spec)
+    with metrics.stage('read'):
+        digest = file_hash(path)
+    entry = get_manifest_entry(cursor, name)
+    if entry and entry['file_hash'] == digest and not force:
+        return None
+
+    previous_labels = set(entry['labels'] if entry else ())
+    # Registros gravados a partir daqui têm id maior (tb_chart_id_seq só cresce)
+    cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {FACT_TABLE}")
+    last_id = cursor.fetchone()[0]
+    deleted = delete_dataset_records(cursor, spec, previous_labels, metrics)
+
+    labels = set()
+    loaded = load_dataset(cursor, spec, metrics=metrics, labels=labels)
+    # Rótulos que não estavam no manifesto: registros anteriores com eles (ex.: de uma
+    # carga não incremental) são removidos, preservando os que acabaram de ser gravados
+    if labels - previous_labels:
+        deleted += delete_dataset_records(cursor, spec, labels - previous_labels, metrics, last_id)
+    save_manifest_entry(cursor, name, digest, loaded, spec.source, spec.analysis, labels)
+    return deleted, loaded
+
+def process_dataset(name, incremental=False, verify_count=VERIFY_ROW_COUNT, trace_memory=False, force=False):
+    """
+    Carrega um conjunto de dados registrado em uma conexão do pool, em uma única transação,
+    repetida inteira em erros transitórios (ver db_utils.retry). Com incremental e force,
+    o arquivo é substituído mesmo que não tenha mudado.
+    Retorna o relatório de métricas da carga (ver metrics.RunMetrics), ou None em caso de erro.
+    """
+    try:
+        spec = get_dataset(name)
+
+        def attempt():
+            metrics = RunMetrics(name, trace_memory)
+            conn = get_db_connection()
+            try:
+                with conn.cursor() as cursor:
+                    if incremental:
+                        result = load_dataset_incremental(cursor, name, spec, metrics, force)
+                    else:
+                        result = load_dataset(cursor, spec, metrics=metrics)
+
+                    # Confirmando a transação
+                    with metrics.stage('commit'):
+                        conn.commit()
+
+                    # Verificando os registros inseridos (SELECT COUNT(*) na tabela inteira)
+                    if verify_count and result is not None:
+                        print_test_results(cursor, spec.description)
+                return metrics, result
+            finally:
+                # Devolve a conexão ao pool (com ROLLBACK se a transação não terminou)
+                conn.close()
+
+        metrics, result = retry(attempt)
+        if result is None:
+            print(f"Arquivo CSV '{spec.file}' não mudou desde a última carga; ignorado.")
+            metrics.count('files_unchanged')
+            return metrics.finish()
+        if incremental:
+            print(f"Arquivo CSV '{spec.file}' mudou: {result[0]} registros substituídos.")
+
+        # Mensagem indicando o carregamento completo
+        report = metrics.finish()
+        print(f"\nArquivo CSV '{spec.file}' carregado com sucesso: {format_stages(report)}.")
+        return report
+
+    except Exception as error:
+        print(f"Erro durante o processamento dos dados de {name}: {error}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Carrega os CSVs registrados em dataset_specs.DATASETS.")
+    parser.add_argument('datasets', nargs='*', help="Conjuntos de dados a carregar (padrão: todos)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Recarrega apenas os arquivos que mudaram desde a última carga")
+    parser.add_argument('--verify-count', action='store_true', default=VERIFY_ROW_COUNT,
+                        help="Conta os registros de tb_chart depois de cada arquivo (percorre a tabela inteira)")
+    parser.add_argument('--trace-memory', action='store_true', help="Mede o pico de memória com tracemalloc")
+    parser.add_argument('--report', help="Grava o relatório da execução em JSON neste arquivo")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    reports = []
+    failures = []
+    for name in args.datasets or list(DATASETS):
+        report = process_dataset(name, args.incremental, args.verify_count, args.trace_memory)
+        if report:
+            reports.append(report)
+        else:
+            failures.append(name)
+    if args.report:
+        write_report(combine_reports('loader', reports, time.perf_counter() - start), args.report)
+    if failures:
+        sys.exit(f"Falha ao carregar: {', '.join(failures)}")
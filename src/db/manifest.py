@@ -0,0 +1,62 @@
+import hashlib
+
+# Registro dos arquivos já carregados em tb_chart, usado pela carga incremental
+MANIFEST_DDL = """
+CREATE TABLE IF NOT EXISTS public.tb_load_manifest (
+    dataset varchar(200) NOT NULL,
+    file_hash char(64) NOT NULL,
+    row_count integer NOT NULL,
+    "source" varchar(4000) NOT NULL,
+    analysis varchar(4000) NOT NULL,
+    labels text[] NOT NULL,
+    loaded_at timestamp DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    CONSTRAINT tb_load_manifest_pkey PRIMARY KEY (dataset)
+)
+"""
+
+def file_hash(file_path, block_size=1 << 20):
+    """Calcula o SHA-256 do conteúdo de um arquivo."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def ensure_manifest_table(cursor):
+    """Cria a tabela de manifesto, se ainda não existir."""
+    cursor.execute(MANIFEST_DDL)
+
+def get_manifest_entry(cursor, dataset):
+    """Retorna a entrada do manifesto de um conjunto de dados, ou None se ele nunca foi carregado."""
+    cursor.execute("""
+        SELECT file_hash, row_count, source, analysis, labels, loaded_at
+        FROM tb_load_manifest
+        WHERE dataset = %s
+    """, (dataset,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return dict(zip(('file_hash', 'row_count', 'source', 'analysis', 'labels', 'loaded_at'), row))
+
+def save_manifest_entry(cursor, dataset, digest, row_count, source, analysis, labels):
+    """Grava (ou substitui) a entrada do manifesto de um conjunto de dados."""
+    cursor.execute("""
+        INSERT INTO tb_load_manifest (dataset, file_hash, row_count, source, analysis, labels, loaded_at)
+        VALUES (%s, %s, %s, %s, %s, %s, NOW())
+        ON CONFLICT (dataset) DO UPDATE SET
+            file_hash = EXCLUDED.file_hash,
+            row_count = EXCLUDED.row_count,
+            source = EXCLUDED.source,
+            analysis = EXCLUDED.analysis,
+            labels = EXCLUDED.labels,
+            loaded_at = EXCLUDED.loaded_at
+    """, (dataset, digest, row_count, source, analysis, sorted(labels)))
+
+def clear_manifest(cursor, datasets):
+    """
+    Apaga as entradas dos conjuntos informados; usado quando os registros deles em
+    tb_chart são apagados ou substituídos por completo. Entradas de outras cargas
+    (ex.: land_use) são mantidas.
+    """
+    ensure_manifest_table(cursor)
+    cursor.execute("DELETE FROM tb_load_manifest WHERE dataset = ANY(%s)", (list(datasets),))
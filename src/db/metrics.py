@@ -0,0 +1,123 @@
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Etapas do pipeline, na ordem em que aparecem nos relatórios
+STAGES = ('read', 'parse', 'validate', 'transform', 'write', 'rollup', 'commit')
+
+class RunMetrics:
+    """
+    Tempos por etapa e contadores de uma execução (ex.: a carga de um arquivo).
+
+    Os tempos são acumulados por etapa com stage() ou add_time(); os contadores com
+    count(). Com trace_memory, o pico de memória alocada pelo Python (incluindo os
+    arrays do NumPy) é medido com tracemalloc, o que deixa a execução mais lenta.
+    Pode ser usado por várias threads ao mesmo tempo.
+    """
+
+    def __init__(self, name, trace_memory=False):
+        self.name = name
+        self.started_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.stages = {}
+        self.counters = {'rows_ok': 0, 'rows_rejected': 0}
+        self.elapsed = None
+        self.memory_peak = None
+        self.trace_memory = trace_memory and not tracemalloc.is_tracing()
+        self._lock = threading.Lock()
+        if self.trace_memory:
+            tracemalloc.start()
+        self._start = time.perf_counter()
+
+    def add_time(self, stage, seconds):
+        """Soma seconds ao tempo da etapa."""
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, stage):
+        """Mede o tempo do bloco with e o soma ao tempo da etapa."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+
+    def timed(self, stage, iterable):
+        """Repassa os itens de iterable, somando à etapa o tempo gasto para produzir cada um."""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_time(stage, time.perf_counter() - start)
+                return
+            self.add_time(stage, time.perf_counter() - start)
+            yield item
+
+    def count(self, counter, amount=1):
+        """Soma amount ao contador."""
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def finish(self):
+        """Encerra a medição (tempo total e pico de memória) e retorna o relatório."""
+        if self.elapsed is None:
+            self.elapsed = time.perf_counter() - self._start
+            if self.trace_memory:
+                self.memory_peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+        return self.report()
+
+    def report(self):
+        """Relatório da execução em um dict serializável em JSON."""
+        elapsed = self.elapsed if self.elapsed is not None else time.perf_counter() - self._start
+        return {
+            'name': self.name,
+            'started_at': self.started_at,
+            'seconds': round(elapsed, 4),
+            'stages': {stage: round(seconds, 4) for stage, seconds in sorted(self.stages.items(), key=_stage_order)},
+            'counters': dict(self.counters),
+            'rows_per_second': round(self.counters['rows_ok'] / elapsed) if elapsed else None,
+            'memory_peak_mb': round(self.memory_peak / 2**20, 1) if self.memory_peak is not None else None,
+        }
+
+def _stage_order(item):
+    return (STAGES.index(item[0]) if item[0] in STAGES else len(STAGES), item[0])
+
+def combine_reports(name, reports, elapsed):
+    """
+    Junta os relatórios de várias execuções (ex.: um por arquivo) em um relatório da rodada.
+    Tempos por etapa e contadores são somados; com execuções em paralelo, a soma dos
+    tempos pode passar do tempo total da rodada.
+    """
+    stages = {}
+    counters = {}
+    for report in reports:
+        for stage, seconds in report['stages'].items():
+            stages[stage] = stages.get(stage, 0.0) + seconds
+        for counter, value in report['counters'].items():
+            counters[counter] = counters.get(counter, 0) + value
+    peaks = [report['memory_peak_mb'] for report in reports if report['memory_peak_mb'] is not None]
+    return {
+        'name': name,
+        'started_at': min((report['started_at'] for report in reports), default=time.strftime('%Y-%m-%dT%H:%M:%S')),
+        'seconds': round(elapsed, 4),
+        'stages': {stage: round(seconds, 4) for stage, seconds in sorted(stages.items(), key=_stage_order)},
+        'counters': counters,
+        'rows_per_second': round(counters.get('rows_ok', 0) / elapsed) if elapsed else None,
+        'memory_peak_mb': max(peaks) if peaks else None,
+        'runs': list(reports),
+    }
+
+def format_stages(report):
+    """Resumo de uma linha dos tempos por etapa, para as mensagens de progresso."""
+    stages = ', '.join(f"{stage} {seconds:.2f}s" for stage, seconds in report['stages'].items())
+    return f"{report['counters'].get('rows_ok', 0)} registros em {report['seconds']:.2f}s ({stages})"
+
+def write_report(report, path):
+    """Grava o relatório em JSON."""
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+import argparse
+import multiprocessing
+import os
+import time
+from contextlib import nullcontext
+from db_utils import get_db_connection, close_pool, retry, run_in_transaction, DB_MAX_CONNECTIONS, FACT_TABLE
+from dataset_specs import DATASETS, get_dataset
+from loader import dataset_path, load_dataset, load_dataset_incremental
+from indexes import deferred_indexes
+from manifest import ensure_manifest_table, file_hash
+from metrics import RunMetrics, combine_reports, write_report
+
+# Semáforo compartilhado entre os processos, limitando as conexões simultâneas
+_connection_slots = None
+
+# Indica se os processos fazem carga incremental (ver loader.load_dataset_incremental)
+_incremental = False
+
+# Tabela de destino das cargas
+_table = FACT_TABLE
+
+# Mede o pico de memória de cada carga com tracemalloc
+_trace_memory = False
+
+def _init_worker(connection_slots, incremental, table, trace_memory=False):
+    global _connection_slots, _incremental, _table, _trace_memory
+    _connection_slots = connection_slots
+    _incremental = incremental
+    _table = table
+    _trace_memory = trace_memory
+
+def _load_once(name):
+    """
+    Uma tentativa de carga de um conjunto de dados, em uma conexão do pool e uma transação.
+    Na carga completa, retorna também o hash e os rótulos do arquivo carregado, para o
+    manifesto (a carga incremental já o atualiza).
+    """
+    metrics = RunMetrics(name, _trace_memory)
+    spec = get_dataset(name)
+    loaded_file = None
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            if _incremental:
+                result = load_dataset_incremental(cursor, name, spec, metrics)
+                loaded = result[1] if result else 0
+                status = None if result else 'inalterado'
+            else:
+                with metrics.stage('read'):
+                    digest = file_hash(dataset_path(spec))
+                labels = set()
+                loaded, status = load_dataset(cursor, spec, table=_table, metrics=metrics, labels=labels), None
+                loaded_file = (digest, labels)
+        with metrics.stage('commit'):
+            conn.commit()
+        return loaded, status, metrics, loaded_file
+    finally:
+        conn.close()
+
+def _load_in_worker(name):
+    """
+    Carrega um conjunto de dados em sua própria transação, repetida em erros transitórios;
+    executado no processo filho. A conexão é fechada ao liberar a vaga em _connection_slots,
+    para que os processos ociosos não passem do limite de conexões.
+    """
+    with _connection_slots:
+        start = time.perf_counter()
+        try:
+            loaded, status, metrics, loaded_file = retry(_load_once, name)
+            return name, loaded, time.perf_counter() - start, None, status, metrics.finish(), loaded_file
+        except Exception as error:
+            return name, 0, time.perf_counter() - start, str(error), None, RunMetrics(name).finish(), None
+        finally:
+            close_pool()
+
+def load_all_parallel(names=None, workers=None, max_connections=None, incremental=False, table=FACT_TABLE,
+                      report_path=None, trace_memory=False, defer_indexes=False):
+    """
+    Carrega os conjuntos de dados em paralelo, um por processo do pool.
+
+    Cada arquivo é carregado em sua própria transação; no máximo max_connections
+    conexões ficam abertas ao mesmo tempo, independentemente do número de processos.
+    Com incremental, arquivos que não mudaram desde a última carga são ignorados
+    (a carga incremental sempre grava em tb_chart_fact). Com defer_indexes, os índices
+    secundários da tabela são removidos antes da carga e recriados depois (ver
+    indexes.deferred_indexes). Com report_path, o relatório de
+    métricas da rodada (ver metrics.combine_reports) é gravado em JSON nesse arquivo.
+    Retorna a lista de (nome, registros, segundos, erro, situação, relatório de métricas,
+    arquivo carregado); arquivo carregado é (hash, rótulos) nas cargas completas sem
+    erro (ver staged_reload.record_manifest) e None nas demais.
+    """
+    names = names or list(DATASETS)
+    for name in names:
+        get_dataset(name)  # valida os nomes antes de criar o pool
+    workers = min(workers or os.cpu_count() or 1, len(names))
+    max_connections = max_connections or DB_MAX_CONNECTIONS
+
+    if incremental:
+        # Cria o manifesto antes de iniciar os processos, para que eles não disputem o CREATE TABLE
+        run_in_transaction(ensure_manifest_table)
+
+    print(f"Carregando {len(names)} arquivos com {workers} processos e até {max_connections} conexões...")
+    start = time.perf_counter()
+    connection_slots = multiprocessing.BoundedSemaphore(max_connections)
+    with deferred_indexes(table, max_connections) if defer_indexes else nullcontext():
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(connection_slots, incremental, table, trace_memory)) as pool:
+            results = list(pool.imap_unordered(_load_in_worker, names))
+    elapsed = time.perf_counter() - start
+
+    print_summary(results, elapsed)
+    if report_path:
+        write_report(combine_reports('parallel_loader', [result[5] for result in results], elapsed), report_path)
+    return results
+
+def print_summary(results, elapsed):
+    """Imprime o tempo de carga por arquivo e o tempo total."""
+    print(f"\n{'Arquivo':<35} {'Registros':>10} {'Tempo (s)':>10}  Status")
+    for name, loaded, seconds, error, status, *_ in sorted(results, key=lambda result: result[0]):
+        status = f"ERRO: {error}" if error else (status or "ok")
+        print(f"{name:<35} {loaded:>10} {seconds:>10.2f}  {status}")
+    total = sum(result[1] for result in results)
+    failures = sum(1 for result in results if result[3])
+    print(f"\nTotal: {total} registros em {elapsed:.2f}s ({total / elapsed if elapsed else 0:.0f} registros/s), {failures} arquivo(s) com erro.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Carrega os CSVs registrados em paralelo.")
+    parser.add_argument('datasets', nargs='*', help="Conjuntos de dados a carregar (padrão: todos)")
+    parser.add_argument('--workers', type=int, help="Número de processos (padrão: número de CPUs)")
+    parser.add_argument('--max-connections', type=int, help="Máximo de conexões simultâneas com o banco")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Recarrega apenas os arquivos que mudaram desde a última carga")
+    parser.add_argument('--trace-memory', action='store_true', help="Mede o pico de memória de cada carga com tracemalloc")
+    parser.add_argument('--defer-indexes', action='store_true',
+                        help="Remove os índices secundários antes da carga e os recria em paralelo depois")
+    parser.add_argument('--report', help="Grava o relatório de métricas da rodada em JSON neste arquivo")
+    args = parser.parse_args()
+
+    load_all_parallel(args.datasets, args.workers, args.max_connections, args.incremental,
+                      report_path=args.report, trace_memory=args.trace_memory, defer_indexes=args.defer_indexes)
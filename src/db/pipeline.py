@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+
+import argparse
+import fnmatch
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from db_utils import run_in_transaction, DimensionIds, DB_MAX_CONNECTIONS, FACT_TABLE
+from dataset_specs import DATASETS, get_dataset, synthetic_source
+from dimensions import VIEW_NAME, ensure_schema, relation_kind
+from indexes import CHART_INDEXES, create_indexes, deferred_indexes, index_name
+from land_use import LAND_USE_FILE, land_use_up_to_date, process_land_use
+from loader import dataset_path, process_dataset
+from manifest import ensure_manifest_table, file_hash, get_manifest_entry
+from metrics import write_report
+from response_cache import CACHE_TABLE, cache_up_to_date, process_cache
+from rollup import DATA_VERSION_TABLE, ROLLUP_TABLE, build_rollup
+from update_countries import update_country_codes
+
+# Passo do pipeline:
+#   name:        nome usado em --only e no resumo
+#   depends:     passos que precisam terminar antes
+#   run:         função que recebe force; retorna um texto curto para o resumo ou
+#                levanta uma exceção em caso de erro
+#   up_to_date:  função que indica se o passo pode ser pulado (None: sempre executa);
+#                só é consultada se nenhuma dependência foi executada nesta rodada
+#   description: texto de --list
+#   stale_after: dependências que, se executadas nesta rodada, impedem que o passo seja
+#                pulado (None: todas)
+Step = namedtuple('Step', ['name', 'depends', 'run', 'up_to_date', 'description', 'stale_after'], defaults=(None,))
+
+# Situação final de cada passo no resumo
+STATUS_OK = 'ok'
+STATUS_UP_TO_DATE = 'atualizado'
+STATUS_FAILED = 'erro'
+STATUS_BLOCKED = 'não executado'
+
+def load_step_name(name):
+    return f'load:{name}'
+
+def _load(name, force):
+    report = process_dataset(name, incremental=True, force=force)
+    if report is None:
+        raise RuntimeError(f"falha ao carregar {name}")
+    return f"{report['counters'].get('rows_ok', 0)} registros"
+
+def _load_up_to_date(name):
+    """O CSV não mudou desde a última carga registrada no manifesto."""
+    def check(cursor):
+        ensure_manifest_table(cursor)
+        entry = get_manifest_entry(cursor, name)
+        return entry is not None and entry['file_hash'] == file_hash(dataset_path(get_dataset(name)))
+    return run_in_transaction(check)
+
+def _land_use(force):
+    counts = process_land_use(force=force)
+    if counts is None:
+        raise RuntimeError("falha ao carregar as classes de uso da terra")
+    return f"{counts[0]} classes, {counts[1]} pares no fecho"
+
+def _schema(force):
+    migrated = run_in_transaction(ensure_schema)
+    return f"{migrated} registros migrados" if migrated else "ok"
+
+def _schema_up_to_date():
+    return run_in_transaction(lambda cursor: relation_kind(cursor, VIEW_NAME) == 'v' and relation_kind(cursor, FACT_TABLE) == 'r')
+
+def _countries(force):
+    report = update_country_codes()
+    if report is None:
+        raise RuntimeError("falha ao normalizar os países")
+    return f"{report['updated']} registros"
+
+def _countries_up_to_date():
+    def check(cursor):
+        cursor.execute(f"SELECT NOT EXISTS (SELECT 1 FROM {FACT_TABLE} WHERE LENGTH(country) > 2 OR country ~ '^[0-9]+$')")
+        return cursor.fetchone()[0]
+    return run_in_transaction(check)
+
+def datasets_to_generate(cursor, scale):
+    """
+    Conjuntos de dados carregados cuja massa fictícia não está completa: a tabela não
+    tem exatamente scale vezes os registros do arquivo com a fonte fictícia do conjunto
+    (dataset_specs.synthetic_source), o indicador e os rótulos do manifesto. Isso inclui
+    os arquivos recarregados com outro número de registros e as gerações interrompidas.
+    """
+    ensure_manifest_table(cursor)
+    dimensions = DimensionIds(cursor)
+    missing = []
+    for name in DATASETS:
+        entry = get_manifest_entry(cursor, name)
+        if entry is None or not entry['row_count']:
+            continue
+        cursor.execute(f"""
+            SELECT COUNT(*) FROM {FACT_TABLE}
+            WHERE source_id = %s AND analysis_id = %s AND label_id = ANY(%s)
+        """, (dimensions.id('source', synthetic_source(entry['source'])), dimensions.id('analysis', entry['analysis']),
+              dimensions.lookup('label', sorted(entry['labels']))))
+        if cursor.fetchone()[0] != entry['row_count'] * scale:
+            missing.append(name)
+    return missing
+
+def _generate(scale, workers, force):
+    from data_mass_generator import delete_synthetic, generate_realistic
+
+    names = run_in_transaction(datasets_to_generate, scale)
+    if not names:
+        return "nenhum conjunto sem massa fictícia"
+    # A massa incompleta ou de uma versão anterior do arquivo é gerada de novo do zero
+    run_in_transaction(delete_synthetic, names)
+    # Os índices secundários são removidos durante a carga em massa e recriados no final
+    with deferred_indexes(FACT_TABLE, workers):
+        report = generate_realistic(scale, names, max_connections=workers)
+    return f"{report['counters'].get('rows_ok', 0)} registros ({len(names)} conjuntos)"
+
+def _indexes(workers, force):
+    timings = create_indexes(FACT_TABLE, workers)
+    return f"{len(timings)} índices"
+
+def _indexes_up_to_date():
+    def check(cursor):
+        cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s", (FACT_TABLE,))
+        existing = {name for name, in cursor.fetchall()}
+        return all(index_name(FACT_TABLE, spec) in existing for spec in CHART_INDEXES)
+    return run_in_transaction(check)
+
+def _rollup(force):
+    rows = build_rollup()
+    if rows is None:
+        raise RuntimeError("falha ao recalcular a rollup")
+    return f"{rows} linhas"
+
+def _rollup_up_to_date():
+    return run_in_transaction(lambda cursor: relation_kind(cursor, ROLLUP_TABLE) == 'r' and relation_kind(cursor, DATA_VERSION_TABLE) == 'r')
+
+def _cache(force):
+    count = process_cache(force=force)
+    if count is None:
+        raise RuntimeError("falha ao recalcular o cache de respostas")
+    return f"{count} respostas"
+
+def build_steps(scale=None, workers=None):
+    """
+    Grafo de passos da carga completa, na ordem de declaração:
+
+        schema -> load:<conjunto> (um por arquivo, em paralelo) -> countries
+               -> [generate] -> indexes -> rollup -> cache
+        land_use (independente dos demais)
+
+    Os arquivos são carregados de forma incremental (loader.load_dataset_incremental) e
+    pulados quando não mudaram; os estados já chegam com a sigla da UF
+    (loader.encode_dataset_columns). generate só existe com scale e gera apenas os conjuntos
+    cuja massa fictícia não está completa (datasets_to_generate), com uma fonte própria
+    (dataset_specs.synthetic_source). As cargas, countries e
+    generate mantêm a rollup incrementalmente (rollup.RollupDelta), então ela só é
+    recalculada inteira quando ainda não existe. cache recalcula as respostas
+    dos endpoints depois de generate ou rollup e sempre que a versão dos dados
+    (rollup.DATA_VERSION_TABLE) muda.
+    """
+    workers = workers or DB_MAX_CONNECTIONS
+    loads = [load_step_name(name) for name in DATASETS]
+    steps = [Step('schema', (), _schema, _schema_up_to_date, "Dimensões, tb_chart_fact e a view tb_chart")]
+    for name in DATASETS:
+        steps.append(Step(load_step_name(name), ('schema',), lambda force, name=name: _load(name, force),
+                          lambda name=name: _load_up_to_date(name), f"Carga incremental de {get_dataset(name).file}"))
+    steps += [
+        Step('land_use', (), _land_use, lambda: run_in_transaction(land_use_up_to_date),
+             f"Hierarquia de uso da terra do MapBiomas ({os.path.basename(LAND_USE_FILE)})"),
+        Step('countries', tuple(loads), _countries, _countries_up_to_date, "Nomes de países -> ISO 3166-1 alfa-2"),
+    ]
+    normalized = ('countries',)
+    if scale:
+        steps.append(Step('generate', normalized, lambda force: _generate(scale, workers, force),
+                          lambda: not run_in_transaction(datasets_to_generate, scale),
+                          f"Massa de dados fictícia ({scale}x os arquivos reais)"))
+        normalized = ('generate',)
+    steps += [
+        Step('indexes', normalized, lambda force: _indexes(workers, force), _indexes_up_to_date, "Índices secundários e ANALYZE"),
+        Step('rollup', ('indexes',), _rollup, _rollup_up_to_date, f"Recalcula {ROLLUP_TABLE}", ()),
+        Step('cache', ('rollup',), _cache, lambda: run_in_transaction(cache_up_to_date),
+             f"Respostas dos endpoints em {CACHE_TABLE}", ('generate', 'rollup')),
+    ]
+    return {step.name: step for step in steps}
+
+def select_steps(steps, patterns, with_dependencies=False):
+    """
+    Nomes dos passos que casam com algum dos padrões (fnmatch, ex.: 'load:*'), mais as
+    dependências deles com with_dependencies. Passos fora da seleção são considerados
+    já concluídos.
+    """
+    selected = {name for name in steps if any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)}
+    unknown = [pattern for pattern in patterns if not any(fnmatch.fnmatchcase(name, pattern) for name in steps)]
+    if unknown:
+        raise KeyError(f"Passos desconhecidos: {', '.join(unknown)}. Disponíveis: {', '.join(steps)}")
+    pending = list(selected) if with_dependencies else []
+    while pending:
+        for dependency in steps[pending.pop()].depends:
+            if dependency not in selected:
+                selected.add(dependency)
+                pending.append(dependency)
+    return selected
+
+def run_pipeline(steps, selected=None, workers=None, force=False):
+    """
+    Executa os passos selecionados (padrão: todos) em uma pool de threads, começando
+    cada passo assim que suas dependências terminam. Um passo é pulado se nenhuma
+    dependência de stale_after foi executada nesta rodada e up_to_date() indicar que está em dia
+    (a menos que force); quando um passo falha, os que dependem dele não são executados.
+    Retorna {passo: (situação, segundos, detalhe)}.
+    """
+    selected = set(steps) if selected is None else set(selected)
+    results = {}
+    ran = set()
+    running = {}
+
+    def blocked(step):
+        return any(results.get(dependency, (None,))[0] in (STATUS_FAILED, STATUS_BLOCKED)
+                   for dependency in step.depends)
+
+    def ready(step):
+        return all(dependency in results or dependency not in selected for dependency in step.depends)
+
+    def execute(step):
+        start = time.perf_counter()
+        stale_after = step.depends if step.stale_after is None else step.stale_after
+        if not force and step.up_to_date and not any(dependency in ran for dependency in stale_after) and step.up_to_date():
+            return STATUS_UP_TO_DATE, time.perf_counter() - start, ''
+        print(f"\n==> {step.name}: {step.description}")
+        detail = step.run(force)
+        return STATUS_OK, time.perf_counter() - start, detail or ''
+
+    with ThreadPoolExecutor(workers or DB_MAX_CONNECTIONS) as executor:
+        pending = [name for name in steps if name in selected]
+        while pending or running:
+            for name in list(pending):
+                step = steps[name]
+                if blocked(step):
+                    results[name] = (STATUS_BLOCKED, 0.0, '')
+                    pending.remove(name)
+                elif ready(step):
+                    running[executor.submit(execute, step)] = (name, time.perf_counter())
+                    pending.remove(name)
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, start = running.pop(future)
+                try:
+                    results[name] = future.result()
+                    if results[name][0] == STATUS_OK:
+                        ran.add(name)
+                except Exception as error:
+                    results[name] = (STATUS_FAILED, time.perf_counter() - start, str(error))
+                    print(f"Erro no passo {name}: {error}")
+    return {name: results[name] for name in steps if name in results}
+
+def print_summary(results, elapsed):
+    """Imprime a situação e o tempo de cada passo e o tempo total."""
+    print(f"\n{'Passo':<42} {'Situação':<14} {'Tempo (s)':>10}  Detalhe")
+    for name, (status, seconds, detail) in results.items():
+        print(f"{name:<42} {status:<14} {seconds:>10.2f}  {detail}")
+    counts = {status: sum(1 for result in results.values() if result[0] == status)
+              for status in (STATUS_OK, STATUS_UP_TO_DATE, STATUS_FAILED, STATUS_BLOCKED)}
+    print(f"Total: {elapsed:.2f}s; " + ', '.join(f"{count} {status}" for status, count in counts.items()))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Executa a carga completa de tb_chart como um grafo de passos.")
+    parser.add_argument('--only', nargs='+', metavar='PASSO', help="Executa só estes passos (aceita padrões, ex.: 'load:*')")
+    parser.add_argument('--with-deps', action='store_true', help="Com --only, inclui as dependências dos passos escolhidos")
+    parser.add_argument('--force', action='store_true', help="Executa os passos mesmo que estejam em dia (recarrega também os arquivos que não mudaram)")
+    parser.add_argument('--scale', type=int, help="Inclui o passo generate: massa fictícia com N vezes os arquivos reais, gravada com a fonte 'sintético:<fonte>'")
+    parser.add_argument('--workers', type=int, help="Passos executados ao mesmo tempo (padrão: DATABASE_MAX_CONNECTIONS)")
+    parser.add_argument('--list', action='store_true', help="Lista os passos e suas dependências")
+    parser.add_argument('--report', help="Grava o resumo em JSON neste arquivo")
+    args = parser.parse_args()
+
+    steps = build_steps(args.scale, args.workers)
+    if args.list:
+        for step in steps.values():
+            depends = ', '.join(step.depends) if len(step.depends) < 4 else f"{len(step.depends)} passos"
+            print(f"{step.name:<42} {step.description}" + (f"  (depois de: {depends})" if depends else ''))
+        sys.exit(0)
+
+    try:
+        selected = select_steps(steps, args.only, args.with_deps) if args.only else None
+    except KeyError as error:
+        parser.error(error.args[0])
+    start = time.perf_counter()
+    results = run_pipeline(steps, selected, args.workers, args.force)
+    elapsed = time.perf_counter() - start
+    print_summary(results, elapsed)
+    if args.report:
+        write_report({
+            'name': 'pipeline',
+            'seconds': round(elapsed, 4),
+            'steps': {name: {'status': status, 'seconds': round(seconds, 4), 'detail': detail}
+                      for name, (status, seconds, detail) in results.items()},
+        }, args.report)
+    if any(status in (STATUS_FAILED, STATUS_BLOCKED) for status, _, _ in results.values()):
+        sys.exit(1)
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import sys
+import time
+from urllib.parse import urlencode
+import numpy as np
+from psycopg2.extras import execute_values
+from aggregation import AGGREGATIONS, EPOCH_ORDINAL
+from columnar import ColumnarData, dictionary_encode, take
+from db_utils import run_in_transaction
+from dimensions import relation_kind
+from rollup import DATA_VERSION_TABLE, ROLLUP_TABLE, data_version, ensure_rollup_table, rollup_exists
+
+# Respostas prontas dos endpoints /sum, /percentage e /sma (formato IStackedData:
+# [{period, entry: [rótulo, valor]}]) por combinação de parâmetros. label vazio
+# significa todos os rótulos e filters é a query string dos filtros restantes
+# (ex.: 'country=BR'), vazia sem filtros. data_version é a versão dos dados
+# (rollup.DATA_VERSION_TABLE) com que as respostas foram calculadas: uma resposta só
+# vale enquanto for igual à versão atual (ver cached_response e ChartService).
+CACHE_TABLE = 'tb_chart_response_cache'
+
+CACHE_DDL = f"""
+CREATE TABLE IF NOT EXISTS public.{CACHE_TABLE} (
+    kind varchar(20) NOT NULL,
+    analysis varchar(4000) NOT NULL,
+    range_years int2 NOT NULL,
+    "label" varchar(50) NOT NULL,
+    filters varchar(4000) NOT NULL,
+    response jsonb NOT NULL,
+    data_version bigint NOT NULL,
+    computed_at timestamptz NOT NULL DEFAULT now(),
+    CONSTRAINT {CACHE_TABLE}_pkey PRIMARY KEY (kind, analysis, range_years, "label", filters)
+)
+"""
+
+# Intervalos dos endpoints: annual, biennial, triennial, quadrennial e quintennial
+RANGES = range(1, 6)
+
+# Filtros além de label, na ordem usada na chave filters; são os que a rollup permite
+CACHE_FILTERS = ('source', 'country', 'state', 'city')
+
+# Filtros pré-calculados por padrão, um de cada vez, para cada valor presente nos dados
+DEFAULT_FILTERS = ('source', 'country', 'state')
+
+def filter_key(**filters):
+    """Chave filters de uma combinação: query string com os filtros informados, na ordem de CACHE_FILTERS."""
+    unknown = set(filters) - set(CACHE_FILTERS)
+    if unknown:
+        raise ValueError(f"Filtros sem cache: {', '.join(sorted(unknown))}")
+    return urlencode([(name, filters[name]) for name in CACHE_FILTERS if filters.get(name)])
+
+def ensure_cache_table(cursor):
+    """Cria a tabela de respostas, se ainda não existir."""
+    cursor.execute(CACHE_DDL)
+
+def cache_exists(cursor):
+    """A tabela de respostas já foi criada (por warm_cache)."""
+    return relation_kind(cursor, CACHE_TABLE) == 'r'
+
+def cached_version(cursor):
+    """Versão dos dados das respostas guardadas, ou None se o cache estiver vazio."""
+    if not cache_exists(cursor):
+        return None
+    cursor.execute(f"SELECT MIN(data_version) FROM {CACHE_TABLE}")
+    return cursor.fetchone()[0]
+
+def read_rollup(cursor, table=ROLLUP_TABLE):
+    """
+    Lê a rollup como um ColumnarData no formato de aggregation (períodos como ordinais
+    de 1º de janeiro de cada ano e value com a soma do grupo). Como as agregações dos
+    endpoints só usam somas por ano e rótulo, o resultado é o mesmo que sobre tb_chart.
+    """
+    names = ['analysis', 'label'] + list(CACHE_FILTERS)
+    cursor.execute(f"SELECT {', '.join(names)}, year, total_value FROM {table}")
+    rows = cursor.fetchall()
+    columns = {name: dictionary_encode(values) for name, values in zip(names, zip(*rows))} if rows else {}
+    years = np.array([row[-2] for row in rows], dtype=np.int64)
+    columns['period'] = (years - 1970).astype('datetime64[Y]').astype('datetime64[D]').astype(np.int64) + EPOCH_ORDINAL
+    columns['value'] = np.array([row[-1] for row in rows], dtype=np.float64)
+    return ColumnarData(len(rows), columns, np.zeros(len(rows), dtype=bool))
+
+def combinations(data, filters=DEFAULT_FILTERS):
+    """
+    Combinações de parâmetros pré-calculadas para cada indicador presente em data:
+    todos os rótulos ou um rótulo, sem filtros ou com um dos filters, com cada valor
+    não vazio daquele filtro no indicador. Gera (analysis, label, {filtro: valor}).
+    """
+    if not data.length:
+        return
+    analysis_column = data.columns['analysis']
+    for code, analysis in enumerate(analysis_column.values):
+        mask = analysis_column.codes == code
+        options = [{}]
+        for name in filters:
+            column = data.columns[name]
+            options += [{name: column.values[value]} for value in np.unique(column.codes[mask]) if column.values[value]]
+        labels = data.columns['label']
+        for label in [None] + sorted(labels.values[value] for value in np.unique(labels.codes[mask])):
+            for option in options:
+                yield analysis, label, option
+
+def compute_responses(data, filters=DEFAULT_FILTERS):
+    """
+    Calcula as respostas de todas as combinações com as funções de aggregation, para
+    cada agregação de AGGREGATIONS e intervalo de RANGES. Retorna uma lista de
+    (kind, analysis, range_years, label, filters, resposta).
+    """
+    responses = []
+    subsets = {}
+    for analysis, label, option in combinations(data, filters):
+        # Cada indicador é recortado uma única vez; as combinações filtram só o recorte
+        if analysis not in subsets:
+            subsets[analysis] = take(data, data.columns['analysis'].codes == data.columns['analysis'].values.index(analysis))
+        subset = subsets[analysis]
+        key = filter_key(**option)
+        for kind, aggregate in AGGREGATIONS.items():
+            for range_years in RANGES:
+                response = aggregate(subset, analysis, range_years, label=label, **option)
+                responses.append((kind, analysis, range_years, label or '', key, response))
+    return responses
+
+def warm_cache(cursor, filters=DEFAULT_FILTERS, force=False):
+    """
+    Recalcula o cache a partir da rollup, na transação do cursor, se a versão dos dados
+    mudou (ou sempre, com force). As respostas são substituídas de uma vez; os leitores
+    veem as anteriores até o COMMIT. Retorna o número de respostas gravadas (0 se o
+    cache já estava em dia).
+    """
+    if not rollup_exists(cursor):
+        raise RuntimeError(f"{ROLLUP_TABLE} não existe; execute rollup.py antes")
+    ensure_rollup_table(cursor)
+    ensure_cache_table(cursor)
+    # Lida antes da rollup: um COMMIT entre as duas leituras deixa o cache desatualizado
+    # (e recalculado na próxima execução), nunca com uma versão mais nova que os dados
+    version = data_version(cursor)
+    if not force and cached_version(cursor) == version:
+        return 0
+    responses = compute_responses(read_rollup(cursor), filters)
+    cursor.execute(f"DELETE FROM {CACHE_TABLE}")
+    _write_responses(cursor, CACHE_TABLE, responses, version)
+    return len(responses)
+
+def stage_cache(cursor, rollup_table, staged_table, version, filters=DEFAULT_FILTERS):
+    """
+    Calcula em staged_table, com a estrutura de CACHE_TABLE, as respostas da rollup
+    rollup_table com a versão dos dados version, sem tocar o cache atual. A troca é só
+    uma renomeação (ver staged_reload). Retorna o número de respostas.
+    """
+    ensure_cache_table(cursor)
+    cursor.execute(f"DROP TABLE IF EXISTS {staged_table}")
+    cursor.execute(f"CREATE TABLE {staged_table} (LIKE {CACHE_TABLE} INCLUDING ALL)")
+    responses = compute_responses(read_rollup(cursor, rollup_table), filters)
+    _write_responses(cursor, staged_table, responses, version)
+    return len(responses)
+
+def _write_responses(cursor, table, responses, version):
+    execute_values(cursor, f"""
+        INSERT INTO {table} (kind, analysis, range_years, label, filters, response, data_version) VALUES %s
+    """, [(kind, analysis, range_years, label, key, json.dumps(response, ensure_ascii=False), version)
+          for kind, analysis, range_years, label, key, response in responses],
+        template='(%s, %s, %s, %s, %s, %s::jsonb, %s)', page_size=1000)
+    cursor.execute(f"ANALYZE {table}")
+
+def cache_up_to_date(cursor):
+    """As respostas guardadas foram calculadas com a versão atual dos dados."""
+    return (relation_kind(cursor, DATA_VERSION_TABLE) == 'r' and cache_exists(cursor)
+            and cached_version(cursor) == data_version(cursor))
+
+def cached_response(cursor, kind, analysis, range_years=1, label=None, **filters):
+    """
+    Resposta guardada para a combinação, ou None se ela não foi pré-calculada ou se os
+    dados mudaram desde o cálculo. É uma busca pela chave primária e uma junção com a
+    única linha de DATA_VERSION_TABLE, a mesma consulta de ChartService.findCachedResponse.
+    """
+    if not cache_exists(cursor):
+        return None
+    cursor.execute(f"""
+        SELECT cache.response
+        FROM {CACHE_TABLE} AS cache
+        JOIN {DATA_VERSION_TABLE} AS version ON version.version = cache.data_version
+        WHERE cache.kind = %s AND cache.analysis = %s AND cache.range_years = %s
+          AND cache.label = %s AND cache.filters = %s
+    """, (kind, analysis, range_years, label or '', filter_key(**filters)))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def process_cache(filters=DEFAULT_FILTERS, force=False):
+    """
+    Recalcula o cache em uma única transação, repetida em erros transitórios. Retorna
+    o número de respostas gravadas (0 se já estava em dia), ou None em caso de erro.
+    """
+    start = time.perf_counter()
+    try:
+        count = run_in_transaction(warm_cache, filters, force)
+    except Exception as error:
+        print(f"Erro ao recalcular o cache de respostas: {error}")
+        return None
+
+    if count:
+        print(f"{count} respostas gravadas em {CACHE_TABLE} em {time.perf_counter() - start:.2f}s.")
+    else:
+        print(f"{CACHE_TABLE} já está em dia com os dados.")
+    return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pré-calcula as respostas dos endpoints de gráficos a partir da rollup anual.")
+    parser.add_argument('--filters', nargs='*', choices=CACHE_FILTERS, default=list(DEFAULT_FILTERS),
+                        help="Filtros pré-calculados, um de cada vez (padrão: %(default)s)")
+    parser.add_argument('--force', action='store_true', help="Recalcula mesmo que os dados não tenham mudado")
+    args = parser.parse_args()
+
+    if process_cache(tuple(args.filters), args.force) is None:
+        sys.exit(1)
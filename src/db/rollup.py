@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+import time
+import numpy as np
+from psycopg2.extras import execute_values
+from aggregation import ordinal_years
+from columnar import DictColumn
+from db_utils import run_in_transaction, FACT_TABLE
+
+# Somas e contagens anuais de tb_chart por analysis/label/source/country/state/city.
+# city entra na chave para que todos os filtros dos endpoints possam ser atendidos
+# a partir da rollup; nos dados atuais ela é sempre vazia e não aumenta o número de linhas.
+ROLLUP_TABLE = 'tb_chart_rollup_yearly'
+
+ROLLUP_DDL = f"""
+CREATE TABLE IF NOT EXISTS public.{ROLLUP_TABLE} (
+    analysis varchar(4000) NOT NULL,
+    "label" varchar(50) NOT NULL,
+    "source" varchar(4000) NOT NULL,
+    country varchar(2000) NOT NULL,
+    state varchar(2) NOT NULL,
+    city varchar(50) NOT NULL,
+    "year" smallint NOT NULL,
+    total_value float8 NOT NULL,
+    total_count bigint NOT NULL,
+    CONSTRAINT {ROLLUP_TABLE}_pkey PRIMARY KEY (analysis, "label", "source", country, state, city, "year")
+)
+"""
+
+# Dimensões da rollup que podem ser usadas como filtro, na ordem da chave primária
+ROLLUP_FILTERS = ('label', 'source', 'country', 'state', 'city')
+
+# Colunas da chave primária da rollup, na ordem da tabela
+ROLLUP_KEY = ('analysis', 'label', 'source', 'country', 'state', 'city', 'year')
+
+# Soma das diferenças em cada grupo; grupos que ficam sem registros são removidos
+APPLY_DELTA_QUERY = f"""
+INSERT INTO {ROLLUP_TABLE} (analysis, label, source, country, state, city, year, total_value, total_count)
+VALUES %s
+ON CONFLICT ON CONSTRAINT {ROLLUP_TABLE}_pkey DO UPDATE SET
+    total_value = {ROLLUP_TABLE}.total_value + EXCLUDED.total_value,
+    total_count = {ROLLUP_TABLE}.total_count + EXCLUDED.total_count
+RETURNING analysis, label, source, country, state, city, year, total_count
+"""
+
+# Versão dos dados de tb_chart, incrementada uma vez por transação que altera a rollup.
+# Todos os carregadores mantêm a rollup na mesma transação dos registros (RollupDelta,
+# rename_rollup_values, rebuild_rollup), então toda mudança nos dados muda a versão. O
+# incremento é feito por uma constraint trigger adiada: acontece no COMMIT, depois dos
+# demais bloqueios da transação, e fica visível junto com os dados; cargas paralelas só
+# disputam a linha da versão durante o COMMIT. Ver response_cache.
+DATA_VERSION_TABLE = 'tb_chart_data_version'
+
+DATA_VERSION_TRIGGER = f'{ROLLUP_TABLE}_data_version'
+
+DATA_VERSION_DDL = f"""
+CREATE TABLE IF NOT EXISTS public.{DATA_VERSION_TABLE} (
+    id bool NOT NULL DEFAULT true,
+    version bigint NOT NULL,
+    CONSTRAINT {DATA_VERSION_TABLE}_pkey PRIMARY KEY (id),
+    CONSTRAINT {DATA_VERSION_TABLE}_single_row CHECK (id)
+);
+
+INSERT INTO public.{DATA_VERSION_TABLE} (id, version) VALUES (true, 1) ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION public.{DATA_VERSION_TABLE}_bump() RETURNS trigger AS $$
+BEGIN
+    -- A trigger dispara uma vez por linha alterada; a versão só muda na primeira
+    IF current_setting('{DATA_VERSION_TABLE}.bumped', true) IS DISTINCT FROM 'on' THEN
+        PERFORM set_config('{DATA_VERSION_TABLE}.bumped', 'on', true);
+        UPDATE public.{DATA_VERSION_TABLE} SET version = version + 1;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+# Trigger da versão em uma tabela com a estrutura da rollup (ROLLUP_TABLE ou uma cópia
+# que vai substituí-la, ver stage_rollup)
+DATA_VERSION_TRIGGER_DDL = f"""
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = '{DATA_VERSION_TRIGGER}' AND tgrelid = 'public.{{table}}'::regclass) THEN
+        CREATE CONSTRAINT TRIGGER {DATA_VERSION_TRIGGER}
+        AFTER INSERT OR UPDATE OR DELETE ON public.{{table}}
+        DEFERRABLE INITIALLY DEFERRED
+        FOR EACH ROW EXECUTE FUNCTION public.{DATA_VERSION_TABLE}_bump();
+    END IF;
+END
+$$;
+"""
+
+def ensure_rollup_table(cursor):
+    """Cria a tabela de rollup e a versão dos dados (DATA_VERSION_TABLE), se ainda não existirem."""
+    cursor.execute(ROLLUP_DDL)
+    cursor.execute(DATA_VERSION_DDL)
+    cursor.execute(DATA_VERSION_TRIGGER_DDL.format(table=ROLLUP_TABLE))
+
+def data_version(cursor):
+    """
+    Versão atual dos dados. Se a própria transação já alterou a rollup, o incremento
+    adiado é antecipado (SET CONSTRAINTS ... IMMEDIATE) e a versão retornada o inclui.
+    """
+    cursor.execute(f"SET CONSTRAINTS {DATA_VERSION_TRIGGER} IMMEDIATE")
+    cursor.execute(f"SELECT version FROM {DATA_VERSION_TABLE}")
+    return cursor.fetchone()[0]
+
+def bump_data_version(cursor):
+    """
+    Incrementa a versão dos dados sem passar pela trigger (ex.: quando a rollup inteira é
+    trocada por outra tabela) e retorna a nova versão.
+    """
+    cursor.execute(f"UPDATE {DATA_VERSION_TABLE} SET version = version + 1 RETURNING version")
+    return cursor.fetchone()[0]
+
+def rollup_exists(cursor):
+    """A rollup já foi criada (por rebuild_rollup)."""
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (f'public.{ROLLUP_TABLE}',))
+    return cursor.fetchone()[0]
+
+def _delete_groups(cursor, keys):
+    """Remove da rollup os grupos com as chaves informadas."""
+    execute_values(cursor, f"""
+        DELETE FROM {ROLLUP_TABLE} AS rollup
+        USING (VALUES %s) AS emptied (analysis, label, source, country, state, city, year)
+        WHERE {' AND '.join(f'rollup.{column} = emptied.{column}' for column in ROLLUP_KEY)}
+    """, keys, template='(%s, %s, %s, %s, %s, %s, %s::smallint)')
+
+class RollupDelta:
+    """
+    Diferenças de soma e contagem por grupo da rollup (ROLLUP_KEY) causadas por um lote
+    de registros gravados ou removidos de FACT_TABLE.
+
+    As cargas acumulam os registros de cada bloco (add_columns, add) e os removidos
+    (subtract) e chamam apply() na mesma transação, de forma que a rollup só é alterada
+    nos grupos tocados e o custo acompanha o tamanho do lote, não o da tabela. As somas
+    em ponto flutuante podem diferir das de rebuild_rollup na última casa.
+    """
+
+    def __init__(self):
+        self.groups = {}
+
+    @classmethod
+    def for_table(cls, cursor, table):
+        """RollupDelta para uma carga em table, ou None se table não alimenta uma rollup existente."""
+        return cls() if table == FACT_TABLE and rollup_exists(cursor) else None
+
+    def add(self, key, total_value, total_count=1):
+        """Soma total_value e total_count ao grupo key (na ordem de ROLLUP_KEY)."""
+        group = self.groups.setdefault(key, [0.0, 0])
+        group[0] += total_value
+        group[1] += total_count
+
+    def add_columns(self, fields, period, value):
+        """
+        Soma um bloco de registros. fields mapeia cada coluna de ROLLUP_KEY, exceto year,
+        para um valor fixo ou uma DictColumn; period são ordinais de data e value os valores.
+        O agrupamento é feito com np.unique, uma iteração por grupo distinto.
+        """
+        if not len(value):
+            return
+        years = ordinal_years(period)
+        unique_years, year_codes = np.unique(years, return_inverse=True)
+        columns = [fields[name] if isinstance(fields[name], DictColumn) else DictColumn(np.zeros(len(value), dtype=np.int32), [fields[name]])
+                   for name in ROLLUP_KEY[:-1]]
+        codes = [np.asarray(column.codes, dtype=np.int64) for column in columns] + [year_codes]
+        shape = [len(column.values) for column in columns] + [len(unique_years)]
+        groups, inverse = np.unique(np.ravel_multi_index(codes, shape), return_inverse=True)
+        sums = np.bincount(inverse, weights=value, minlength=len(groups))
+        counts = np.bincount(inverse, minlength=len(groups))
+        for index, total_value, total_count in zip(zip(*np.unravel_index(groups, shape)), sums.tolist(), counts.tolist()):
+            key = tuple(column.values[code] for column, code in zip(columns, index[:-1])) + (int(unique_years[index[-1]]),)
+            self.add(key, total_value, total_count)
+
+    def subtract(self, rows):
+        """Desconta grupos removidos: linhas (chave na ordem de ROLLUP_KEY..., soma, contagem)."""
+        for *key, total_value, total_count in rows:
+            self.add(tuple(key), -total_value, -total_count)
+
+    def apply(self, cursor):
+        """
+        Aplica as diferenças acumuladas na rollup, dentro da transação do cursor, e as
+        descarta. Retorna o número de grupos tocados.
+        """
+        # Em ordem de chave: transações que atualizam os mesmos grupos (ex.: as fatias de
+        # data_mass_generator) os bloqueiam na mesma ordem e esperam umas pelas outras,
+        # em vez de entrar em deadlock
+        rows = sorted(key + (total_value, total_count) for key, (total_value, total_count) in self.groups.items() if total_count or total_value)
+        self.groups = {}
+        if not rows:
+            return 0
+        result = execute_values(cursor, APPLY_DELTA_QUERY, rows,
+                                template='(%s, %s, %s, %s, %s, %s, %s::smallint, %s, %s)', fetch=True)
+        emptied = [tuple(row[:-1]) for row in result if row[-1] <= 0]
+        if emptied:
+            _delete_groups(cursor, emptied)
+        return len(rows)
+
+def rename_rollup_values(cursor, column, mapping):
+    """
+    Aplica na rollup uma troca de valores em column (ex.: nomes de países por códigos),
+    juntando os grupos que passam a ter a mesma chave. Só os grupos com os valores
+    antigos são lidos e reescritos. Não faz nada se a rollup não existir.
+    """
+    if column not in ROLLUP_FILTERS:
+        raise ValueError(f"Coluna {column} não faz parte da chave da rollup")
+    if not mapping or not rollup_exists(cursor):
+        return 0
+    cursor.execute("CREATE TEMP TABLE tmp_rollup_rename (old_value varchar(4000) PRIMARY KEY, new_value varchar(4000) NOT NULL) ON COMMIT DROP")
+    execute_values(cursor, "INSERT INTO tmp_rollup_rename (old_value, new_value) VALUES %s", list(mapping.items()))
+    key = ['m.new_value' if name == column else f'rollup.{name}' for name in ROLLUP_KEY]
+    cursor.execute(f"""
+        CREATE TEMP TABLE tmp_rollup_moved ON COMMIT DROP AS
+        SELECT {', '.join(f'{expression} AS {name}' for expression, name in zip(key, ROLLUP_KEY))},
+               SUM(rollup.total_value) AS total_value, SUM(rollup.total_count) AS total_count
+        FROM {ROLLUP_TABLE} AS rollup
+        JOIN tmp_rollup_rename AS m ON rollup.{column} = m.old_value
+        GROUP BY {', '.join(key)}
+    """)
+    cursor.execute(f"""
+        DELETE FROM {ROLLUP_TABLE} AS rollup
+        USING tmp_rollup_rename AS m
+        WHERE rollup.{column} = m.old_value
+    """)
+    cursor.execute(f"""
+        INSERT INTO {ROLLUP_TABLE} (analysis, label, source, country, state, city, year, total_value, total_count)
+        SELECT * FROM tmp_rollup_moved
+        ON CONFLICT ON CONSTRAINT {ROLLUP_TABLE}_pkey DO UPDATE SET
+            total_value = {ROLLUP_TABLE}.total_value + EXCLUDED.total_value,
+            total_count = {ROLLUP_TABLE}.total_count + EXCLUDED.total_count
+    """)
+    moved = cursor.rowcount
+    cursor.execute("DROP TABLE tmp_rollup_rename, tmp_rollup_moved")
+    return moved
+
+# Grupos da rollup calculados do zero a partir de uma tabela (ou subconsulta)
+GROUPS_QUERY = """
+SELECT
+    analysis, label, source, country, state, city,
+    EXTRACT(YEAR FROM period)::smallint AS year,
+    SUM(value) AS total_value,
+    COUNT(value) AS total_count
+FROM {table}
+GROUP BY analysis, label, source, country, state, city, EXTRACT(YEAR FROM period)
+"""
+
+# Tolerância relativa na comparação das somas: as atualizações incrementais somam e
+# subtraem em outra ordem que o GROUP BY
+ROLLUP_TOLERANCE = 1e-6
+
+def _insert_groups(cursor, table, rollup_table):
+    """Grava em rollup_table os grupos da tabela (ou subconsulta) table e retorna o número de linhas."""
+    cursor.execute(f"""
+        INSERT INTO {rollup_table} (analysis, label, source, country, state, city, year, total_value, total_count)
+        {GROUPS_QUERY.format(table=table)}
+    """)
+    return cursor.rowcount
+
+def rollup_differences(cursor, table='tb_chart'):
+    """
+    Compara a rollup mantida incrementalmente com a que rebuild_rollup calcularia a
+    partir da tabela informada, sem alterá-la. Retorna a lista de (chave, rollup,
+    esperado), onde rollup e esperado são (total_value, total_count) ou None para
+    grupos que faltam ou sobram; vazia se as duas coincidem.
+    """
+    key = ', '.join(ROLLUP_KEY)
+    cursor.execute(f"""
+        SELECT {key}, rollup.total_value, rollup.total_count, expected.total_value, expected.total_count
+        FROM {ROLLUP_TABLE} AS rollup
+        FULL JOIN ({GROUPS_QUERY.format(table=table)}) AS expected USING ({key})
+        WHERE rollup.total_count IS DISTINCT FROM expected.total_count
+           OR ABS(rollup.total_value - expected.total_value) > %s * GREATEST(ABS(expected.total_value), 1)
+    """, (ROLLUP_TOLERANCE,))
+    size = len(ROLLUP_KEY)
+    return [(row[:size],
+             None if row[size + 1] is None else row[size:size + 2],
+             None if row[size + 3] is None else row[size + 2:])
+            for row in cursor.fetchall()]
+
+def rebuild_rollup(cursor, table='tb_chart'):
+    """Recalcula a rollup anual inteira a partir da tabela informada e retorna o número de linhas."""
+    ensure_rollup_table(cursor)
+    cursor.execute(f"DELETE FROM {ROLLUP_TABLE}")
+    return _insert_groups(cursor, table, ROLLUP_TABLE)
+
+def stage_rollup(cursor, table, staged_table):
+    """
+    Calcula em staged_table, com a estrutura e a trigger de versão de ROLLUP_TABLE, a
+    rollup inteira da tabela (ou subconsulta) table, sem tocar a rollup atual, que
+    continua servindo os leitores. A troca é só uma renomeação (ver staged_reload), e
+    quem a faz incrementa a versão com bump_data_version. Retorna o número de linhas.
+    """
+    ensure_rollup_table(cursor)
+    cursor.execute(f"DROP TABLE IF EXISTS {staged_table}")
+    cursor.execute(f"CREATE TABLE {staged_table} (LIKE {ROLLUP_TABLE} INCLUDING ALL)")
+    rows = _insert_groups(cursor, table, staged_table)
+    # Criada depois do INSERT: a carga da cópia não muda a versão dos dados atuais
+    cursor.execute(DATA_VERSION_TRIGGER_DDL.format(table=staged_table))
+    cursor.execute(f"ANALYZE {staged_table}")
+    return rows
+
+def fetch_bucketed_sums(cursor, analysis, range_years=1, start_year=None, end_year=None, **filters):
+    """
+    Soma por rótulo em períodos de range_years anos, como ChartService.findSum*, lida da rollup.
+
+    Os períodos começam em FLOOR(ano / range_years) * range_years. Os filtros aceitos
+    são os de ROLLUP_FILTERS; como a rollup é anual, o intervalo de datas é em anos.
+    Retorna uma lista de (início do período, rótulo, soma, contagem).
+    """
+    conditions = ['analysis = %s']
+    params = [analysis]
+    for name in ROLLUP_FILTERS:
+        if filters.get(name):
+            conditions.append(f'{name} = %s')
+            params.append(filters[name])
+    if start_year is not None:
+        conditions.append('year >= %s')
+        params.append(start_year)
+    if end_year is not None:
+        conditions.append('year <= %s')
+        params.append(end_year)
+
+    cursor.execute(f"""
+        SELECT (year / %s) * %s AS period_group, label, SUM(total_value), SUM(total_count)
+        FROM {ROLLUP_TABLE}
+        WHERE {' AND '.join(conditions)}
+        GROUP BY period_group, label
+        ORDER BY period_group ASC, label ASC
+    """, [range_years, range_years] + params)
+    return cursor.fetchall()
+
+def build_rollup():
+    """
+    Recalcula a rollup em uma única transação, repetida em erros transitórios; os leitores
+    veem a versão anterior até o COMMIT. Retorna o número de linhas, ou None em caso de erro.
+    """
+    def rebuild(cursor):
+        rows = rebuild_rollup(cursor)
+        cursor.execute(f"ANALYZE {ROLLUP_TABLE}")
+        return rows
+
+    start = time.perf_counter()
+    print(f"Recalculando {ROLLUP_TABLE}...")
+    try:
+        rows = run_in_transaction(rebuild)
+    except Exception as error:
+        print(f"Erro ao recalcular a rollup: {error}")
+        return None
+
+    print(f"Rollup anual recalculada: {rows} linhas em {time.perf_counter() - start:.2f}s.")
+    return rows
+
+def verify_rollup():
+    """
+    Confere a rollup com o recálculo a partir de tb_chart (rollup_differences) e lista
+    os grupos divergentes. Retorna o número de grupos divergentes, ou None em caso de erro.
+    """
+    try:
+        differences = run_in_transaction(rollup_differences)
+    except Exception as error:
+        print(f"Erro ao conferir a rollup: {error}")
+        return None
+
+    for key, stored, expected in differences[:20]:
+        print(f"  {key}: rollup {stored}, esperado {expected}")
+    print(f"Rollup anual conferida: {len(differences)} grupos divergentes.")
+    return len(differences)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=f"Recalcula ou confere {ROLLUP_TABLE}.")
+    parser.add_argument('--verify', action='store_true', help="Só compara a rollup com o recálculo a partir de tb_chart")
+    args = parser.parse_args()
+
+    if args.verify:
+        if verify_rollup() != 0:
+            sys.exit(1)
+    elif build_rollup() is None:
+        sys.exit(1)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import shutil
+import time
+from datetime import date
+import numpy as np
+from db_utils import get_db_connection
+from columnar import ColumnarData, DictColumn
+
+# Colunas exportadas e o tipo de cada arquivo de coluna. Colunas texto são gravadas
+# como códigos int32 que indexam a lista de valores distintos em dictionaries.json;
+# period é gravado como ordinal (date.toordinal), como no leitor colunar.
+SNAPSHOT_COLUMNS = {
+    'id': 'int32',
+    'country': 'str',
+    'state': 'str',
+    'city': 'str',
+    'source': 'str',
+    'period': 'date',
+    'label': 'str',
+    'value': 'float64',
+    'analysis': 'str',
+    'nutrient': 'str',
+}
+
+FILE_DTYPES = {'int32': '<i4', 'str': '<i4', 'date': '<i4', 'float64': '<f8'}
+
+METADATA_FILE = 'metadata.json'
+DICTIONARIES_FILE = 'dictionaries.json'
+
+DEFAULT_CHUNK_SIZE = 100000
+
+def encode_with(lookup, values):
+    """Codifica strings com um dicionário que cresce à medida que novos valores aparecem."""
+    return np.fromiter((lookup.setdefault(value, len(lookup)) for value in values), dtype=np.int32, count=len(values))
+
+def export_snapshot(output_dir, chunk_size=DEFAULT_CHUNK_SIZE, table='tb_chart'):
+    """
+    Exporta a tabela para um snapshot colunar em output_dir e retorna o número de registros.
+
+    A tabela é lida por um cursor do lado do servidor, em blocos de chunk_size registros,
+    e cada coluna é acrescentada ao seu próprio arquivo binário; a memória usada não
+    depende do tamanho da tabela. O snapshot é montado em um diretório temporário e só
+    substitui output_dir quando está completo.
+    """
+    temp_dir = output_dir.rstrip('/') + '.tmp'
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    os.makedirs(temp_dir)
+
+    names = list(SNAPSHOT_COLUMNS)
+    lookups = {name: {} for name, kind in SNAPSHOT_COLUMNS.items() if kind == 'str'}
+    files = {name: open(os.path.join(temp_dir, f'{name}.bin'), 'wb') for name in names}
+    conn = get_db_connection()
+    length = 0
+    try:
+        # Cursor nomeado: o PostgreSQL envia os registros aos poucos, em vez de todos de uma vez
+        with conn.cursor(name='tb_chart_snapshot') as cursor:
+            cursor.itersize = chunk_size
+            cursor.execute(f"SELECT {', '.join(names)} FROM {table}")
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for name, values in zip(names, zip(*rows)):
+                    kind = SNAPSHOT_COLUMNS[name]
+                    if kind == 'str':
+                        column = encode_with(lookups[name], values)
+                    elif kind == 'date':
+                        column = np.fromiter(map(date.toordinal, values), dtype=np.int32, count=len(values))
+                    else:
+                        column = np.array(values, dtype=FILE_DTYPES[kind])
+                    files[name].write(column.astype(FILE_DTYPES[kind], copy=False).tobytes())
+                length += len(rows)
+        conn.commit()
+    finally:
+        conn.close()
+        for file in files.values():
+            file.close()
+
+    with open(os.path.join(temp_dir, DICTIONARIES_FILE), 'w', encoding='utf-8') as file:
+        json.dump({name: list(lookup) for name, lookup in lookups.items()}, file, ensure_ascii=False)
+    with open(os.path.join(temp_dir, METADATA_FILE), 'w', encoding='utf-8') as file:
+        json.dump({
+            'table': table,
+            'length': length,
+            'exported_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'columns': {name: {'kind': kind, 'dtype': FILE_DTYPES[kind]} for name, kind in SNAPSHOT_COLUMNS.items()},
+        }, file, ensure_ascii=False, indent=2)
+
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.rename(temp_dir, output_dir)
+    return length
+
+def open_snapshot(snapshot_dir):
+    """
+    Abre um snapshot com np.memmap, sem carregar os dados na memória.
+
+    Retorna um ColumnarData, no mesmo formato do leitor colunar: colunas numéricas
+    como arrays mapeados e colunas texto como DictColumn (códigos mapeados + valores).
+    """
+    with open(os.path.join(snapshot_dir, METADATA_FILE), encoding='utf-8') as file:
+        metadata = json.load(file)
+    with open(os.path.join(snapshot_dir, DICTIONARIES_FILE), encoding='utf-8') as file:
+        dictionaries = json.load(file)
+
+    length = metadata['length']
+    columns = {}
+    for name, column in metadata['columns'].items():
+        path = os.path.join(snapshot_dir, f'{name}.bin')
+        data = np.memmap(path, dtype=column['dtype'], mode='r', shape=(length,)) if length else np.empty(0, column['dtype'])
+        columns[name] = DictColumn(data, dictionaries[name]) if column['kind'] == 'str' else data
+    return ColumnarData(length, columns, np.zeros(length, dtype=bool))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta tb_chart para um snapshot colunar em disco.")
+    parser.add_argument('output_dir', help="Diretório do snapshot (substituído se já existir)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Registros lidos por vez")
+    args = parser.parse_args()
+
+    try:
+        start = time.perf_counter()
+        total = export_snapshot(args.output_dir, args.chunk_size)
+        print(f"Snapshot de {total} registros gravado em '{args.output_dir}' em {time.perf_counter() - start:.2f}s.")
+    except Exception as error:
+        print(f"Erro ao exportar o snapshot: {error}")
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+
+import argparse
+import time
+from db_utils import get_db_connection, FACT_TABLE
+from dataset_specs import DATASETS, get_dataset
+from dimensions import VIEW_NAME, VIEW_QUERY, create_view, ensure_schema, relation_comments, relation_kind
+from indexes import create_indexes, rename_indexes
+from manifest import clear_manifest, save_manifest_entry
+from parallel_loader import load_all_parallel
+from response_cache import CACHE_TABLE, cache_exists, stage_cache
+from rollup import ROLLUP_TABLE, bump_data_version, data_version, rollup_exists, stage_rollup
+from update_countries import update_country_codes
+
+STAGING_TABLE = 'tb_chart_staging'
+
+# Cópias da rollup e do cache calculadas a partir de STAGING_TABLE antes da troca
+STAGED_ROLLUP_TABLE = f'{ROLLUP_TABLE}_staging'
+STAGED_CACHE_TABLE = f'{CACHE_TABLE}_staging'
+
+def create_staging_table(cursor):
+    """
+    Cria uma cópia vazia de tb_chart_fact sem índices e sem WAL (UNLOGGED).
+
+    A coluna id continua usando a sequência tb_chart_id_seq, que é transferida
+    para a nova tabela na troca. O esquema (dimensões, tb_chart_fact e a view
+    tb_chart) é criado ou migrado antes, se necessário (dimensions.ensure_schema).
+    """
+    ensure_schema(cursor)
+    cursor.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+    cursor.execute(f"""
+        CREATE UNLOGGED TABLE {STAGING_TABLE}
+        (LIKE {FACT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING COMMENTS)
+    """)
+
+def build_indexes(conn, workers=None):
+    """
+    Passa a tabela de staging a gravar WAL, cria a chave primária e, depois do COMMIT,
+    os índices secundários em paralelo (indexes.create_indexes), seguidos de ANALYZE.
+
+    A tabela passa a LOGGED antes dos índices porque SET LOGGED reescreve a tabela e
+    todos os índices existentes.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {STAGING_TABLE} SET LOGGED")
+        cursor.execute(f"ALTER TABLE {STAGING_TABLE} ADD CONSTRAINT {STAGING_TABLE}_pkey PRIMARY KEY (id)")
+    conn.commit()
+    return create_indexes(STAGING_TABLE, workers)
+
+def swap_tables(cursor):
+    """
+    Substitui tb_chart_fact pela tabela de staging e recria a view tb_chart sobre ela;
+    deve ser executado em uma única transação.
+
+    Os leitores enxergam a tabela antiga até o COMMIT e a nova a partir dele; a tabela
+    antiga é descartada inteira, sem deixar tuplas mortas para o VACUUM.
+    """
+    cursor.execute(f"SELECT obj_description('public.{FACT_TABLE}'::regclass, 'pg_class')")
+    table_comment = cursor.fetchone()[0]
+    view_comments = relation_comments(cursor, VIEW_NAME)
+
+    cursor.execute(f"LOCK TABLE {FACT_TABLE} IN ACCESS EXCLUSIVE MODE")
+    cursor.execute(f"ALTER SEQUENCE tb_chart_id_seq OWNED BY {STAGING_TABLE}.id")
+    cursor.execute(f"DROP VIEW {VIEW_NAME}")
+    cursor.execute(f"DROP TABLE {FACT_TABLE}")
+    cursor.execute(f"ALTER TABLE {STAGING_TABLE} RENAME TO {FACT_TABLE}")
+    cursor.execute(f"ALTER TABLE {FACT_TABLE} RENAME CONSTRAINT {STAGING_TABLE}_pkey TO {FACT_TABLE}_pkey")
+    rename_indexes(cursor, STAGING_TABLE, FACT_TABLE)
+    if table_comment:
+        cursor.execute(f"COMMENT ON TABLE {FACT_TABLE} IS %s", (table_comment,))
+    create_view(cursor, view_comments)
+
+def stage_derived_tables(cursor):
+    """
+    Calcula a partir da tabela de staging, fora da transação da troca, as cópias da
+    rollup e do cache de respostas (só dos que existem) que vão substituí-los. O cache
+    é gravado com a versão dos dados que a troca vai gerar. Retorna essa versão, ou
+    None se não há rollup.
+    """
+    cursor.execute(f"DROP TABLE IF EXISTS {STAGED_ROLLUP_TABLE}, {STAGED_CACHE_TABLE}")
+    if not rollup_exists(cursor):
+        return None
+    print(f"Calculando {STAGED_ROLLUP_TABLE}...")
+    stage_rollup(cursor, f"({VIEW_QUERY.format(fact_table=STAGING_TABLE)}) AS staging", STAGED_ROLLUP_TABLE)
+    version = data_version(cursor) + 1
+    if cache_exists(cursor):
+        print(f"Calculando {STAGED_CACHE_TABLE}...")
+        stage_cache(cursor, STAGED_ROLLUP_TABLE, STAGED_CACHE_TABLE, version)
+    return version
+
+def _replace_table(cursor, table, staged_table):
+    cursor.execute(f"DROP TABLE {table}")
+    cursor.execute(f"ALTER TABLE {staged_table} RENAME TO {table}")
+    cursor.execute(f"ALTER TABLE {table} RENAME CONSTRAINT {staged_table}_pkey TO {table}_pkey")
+
+def swap_derived_tables(cursor, version):
+    """
+    Substitui a rollup e o cache pelas cópias de stage_derived_tables, na transação da
+    troca de tb_chart_fact: só renomeações, sem recalcular nada com os bloqueios ativos.
+    A versão dos dados é incrementada, já que a rollup foi trocada sem passar pela trigger.
+    """
+    _replace_table(cursor, ROLLUP_TABLE, STAGED_ROLLUP_TABLE)
+    current = bump_data_version(cursor)
+    if cache_exists(cursor) and relation_kind(cursor, STAGED_CACHE_TABLE) == 'r':
+        _replace_table(cursor, CACHE_TABLE, STAGED_CACHE_TABLE)
+        if current != version:
+            # Outra transação mudou a versão depois do cálculo; as respostas continuam
+            # corretas, pois vêm da rollup que acabou de entrar
+            cursor.execute(f"UPDATE {CACHE_TABLE} SET data_version = %s", (current,))
+
+def record_manifest(cursor, results):
+    """
+    Registra no manifesto os arquivos carregados, para que a carga incremental os
+    reconheça, com o hash e os rótulos obtidos durante a carga (sem reler os CSVs).
+    Só as entradas dos conjuntos de DATASETS são substituídas.
+    """
+    clear_manifest(cursor, DATASETS)
+    for name, loaded, _, error, _, _, loaded_file in results:
+        if error:
+            continue
+        spec = get_dataset(name)
+        digest, labels = loaded_file
+        save_manifest_entry(cursor, name, digest, loaded, spec.source, spec.analysis, labels)
+
+def staged_reload(workers=None, max_connections=None):
+    """
+    Recarrega tb_chart com todos os conjuntos registrados, sem deixar os leitores
+    verem dados parciais.
+
+    Os CSVs são carregados em uma tabela de staging UNLOGGED e sem índices, que é
+    normalizada, indexada e analisada antes de substituir tb_chart atomicamente. A
+    rollup e o cache de respostas, se existirem, são recalculados a partir do staging
+    antes da troca e entram com ela por renomeação, de forma que os leitores só esperam
+    pelas renomeações. Se algum passo falhar, tb_chart permanece intacta.
+    """
+    start = time.perf_counter()
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            print(f"Criando a tabela {STAGING_TABLE}...")
+            create_staging_table(cursor)
+        conn.commit()
+
+        results = load_all_parallel(list(DATASETS), workers, max_connections, table=STAGING_TABLE)
+        failures = [result[0] for result in results if result[3]]
+        if failures:
+            raise RuntimeError(f"falha ao carregar {', '.join(failures)}")
+
+        # Os estados já chegam com a sigla da UF (loader.encode_dataset_columns)
+        print("\nNormalizando países...")
+        if update_country_codes(table=STAGING_TABLE) is None:
+            raise RuntimeError("falha ao normalizar os países")
+
+        print("Criando índices e atualizando estatísticas...")
+        build_indexes(conn, max_connections)
+
+        with conn.cursor() as cursor:
+            version = stage_derived_tables(cursor)
+        conn.commit()
+
+        with conn.cursor() as cursor:
+            print(f"Substituindo tb_chart por {STAGING_TABLE}...")
+            swap_start = time.perf_counter()
+            swap_tables(cursor)
+            if version is not None:
+                swap_derived_tables(cursor, version)
+            record_manifest(cursor, results)
+        conn.commit()
+        print(f"Troca concluída em {time.perf_counter() - swap_start:.2f}s.")
+
+        print(f"\nRecarga concluída em {time.perf_counter() - start:.2f}s.")
+    except Exception as error:
+        conn.rollback()
+        print(f"Erro durante a recarga; tb_chart não foi alterada: {error}")
+        raise
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recarrega tb_chart via tabela de staging e troca atômica.")
+    parser.add_argument('--workers', type=int, help="Número de processos (padrão: número de CPUs)")
+    parser.add_argument('--max-connections', type=int, help="Máximo de conexões simultâneas com o banco")
+    args = parser.parse_args()
+
+    staged_reload(args.workers, args.max_connections)
@@ -0,0 +1,77 @@
+import queue
+import threading
+from db_utils import BulkWriter, FACT_TABLE
+
+# Número padrão de blocos aguardando gravação; limita a memória usada pelo pipeline
+DEFAULT_QUEUE_SIZE = 2
+
+# Sinaliza o fim da fila para a thread de gravação
+_DONE = object()
+
+class BackgroundWriter:
+    """
+    Grava blocos já codificados via COPY em uma thread separada.
+
+    Os blocos chegam por uma fila limitada: quando ela está cheia, put() bloqueia até
+    a gravação de um bloco terminar, de forma que a leitura nunca se adianta mais do que
+    queue_size blocos. A thread é a única a usar o cursor enquanto estiver ativa.
+    """
+
+    def __init__(self, cursor, table=FACT_TABLE, binary=True, queue_size=DEFAULT_QUEUE_SIZE):
+        self.writer = BulkWriter(cursor, table=table, binary=binary)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name=f'copy-{table}', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is _DONE:
+                return
+            if self.error is not None:
+                continue  # descarta o restante da fila depois de um erro
+            payload, row_count = item
+            try:
+                self.writer.write_encoded(payload, row_count)
+                self.writer.flush()
+            except Exception as error:
+                self.error = error
+
+    def put(self, payload, row_count):
+        """Enfileira um bloco codificado; repassa o erro da thread de gravação, se houver."""
+        if self.error is not None:
+            raise self.error
+        self.queue.put((payload, row_count))
+
+    def close(self):
+        """Espera a gravação dos blocos pendentes e retorna o total de registros gravados."""
+        self.queue.put(_DONE)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.writer.rows_written
+
+    def abort(self):
+        """Encerra a thread sem repassar erros; usado quando a leitura falha."""
+        self.queue.put(_DONE)
+        self.thread.join()
+
+def run_pipeline(chunks, validate, transform, writer):
+    """
+    Executa o pipeline leitura -> validação -> transformação -> gravação.
+
+    chunks é um iterável de blocos (ex.: columnar.iter_csv_columns), validate recebe um
+    bloco e retorna as linhas aceitas, transform codifica o bloco para o COPY e writer é
+    um BackgroundWriter. A leitura e a conversão do próximo bloco acontecem enquanto o
+    anterior é gravado. Retorna o número de registros gravados.
+    """
+    try:
+        for chunk in chunks:
+            chunk = validate(chunk)
+            if chunk.length:
+                writer.put(transform(chunk), chunk.length)
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.close()
@@ -0,0 +1,50 @@
+import struct
+from collections import Counter
+from datetime import date, timedelta
+import numpy as np
+import pytest
+from db_utils import FACT_COLUMNS, PG_EPOCH_ORDINAL, encode_binary_columns, encode_binary_row
+
+COUNTRIES = ['BR', "Côte d'Ivoire", 'Türkiye', '日本']
+STATES = ['SP', 'PA', '']
+CITY = 'São José dos Campos'
+
+def split_tuples(data):
+    """Separa uma sequência de tuplas do formato binário do COPY (sem cabeçalho) em bytes por tupla."""
+    tuples, offset = [], 0
+    while offset < len(data):
+        start = offset
+        field_count, = struct.unpack_from('!h', data, offset)
+        assert field_count == len(FACT_COLUMNS)
+        offset += 2
+        for _ in range(field_count):
+            length, = struct.unpack_from('!i', data, offset)
+            offset += 4 + max(length, 0)
+        tuples.append(data[start:offset])
+    assert offset == len(data)
+    return tuples
+
+@pytest.mark.parametrize('nutrient', ['null', 'constant', 'array'])
+def test_binary_columns_match_rows(nutrient):
+    rng = np.random.default_rng(0)
+    count = 200
+    country_codes = rng.integers(len(COUNTRIES), size=count)
+    state_codes = rng.integers(len(STATES), size=count)
+    periods = rng.integers(0, 9000, size=count).astype(np.int32)
+    label_ids = rng.integers(1, 30, size=count).astype(np.int16)
+    values = rng.normal(0, 1e6, size=count)
+    values[:3] = [0.0, -0.0, 1e-300]
+    nutrient_ids = {'null': None, 'constant': 2, 'array': rng.integers(1, 4, size=count).astype(np.int16)}[nutrient]
+
+    columns = encode_binary_columns(
+        (country_codes, COUNTRIES), (state_codes, STATES), CITY, 7, periods, label_ids, values, 3, nutrient_ids)
+    rows = [
+        encode_binary_row(
+            COUNTRIES[country_codes[i]], STATES[state_codes[i]], CITY, 7,
+            date.fromordinal(PG_EPOCH_ORDINAL) + timedelta(days=int(periods[i])), int(label_ids[i]), values[i], 3,
+            nutrient_ids[i] if isinstance(nutrient_ids, np.ndarray) else nutrient_ids)
+        for i in range(count)
+    ]
+
+    # As colunas agrupam as linhas pelos campos texto: mesma multiplicidade, outra ordem
+    assert Counter(split_tuples(columns)) == Counter(rows)
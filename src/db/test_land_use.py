@@ -0,0 +1,56 @@
+from collections import Counter
+from db_utils import read_csv_file
+from land_use import CLOSURE_TABLE, LAND_USE_FILE, LEVEL_VIEW, closure_rows, load_land_use, parse_land_use_classes
+
+def read_classes():
+    return parse_land_use_classes(read_csv_file(LAND_USE_FILE))
+
+def expected_descendants(classes, land_use):
+    # Pela posição na hierarquia: a própria classe e as que estão abaixo dela
+    return {other.code for other in classes if other.path == land_use.path or other.path.startswith(land_use.path + '.')}
+
+def test_closure_has_one_row_per_pair():
+    classes = read_classes()
+    rows = closure_rows(classes)
+    assert set(Counter((ancestor, descendant) for ancestor, descendant, _, _ in rows).values()) == {1}
+    # Um ancestral por nível, do primeiro até o da própria classe
+    per_class = Counter(descendant for _, descendant, _, _ in rows)
+    assert per_class == {land_use.code: land_use.level for land_use in classes}
+
+def test_descendant_query(cursor):
+    classes = read_classes()
+    load_land_use(cursor, classes)
+    for land_use in classes:
+        cursor.execute(f"SELECT descendant_code FROM {CLOSURE_TABLE} WHERE ancestor_code = %s", (land_use.code,))
+        descendants = [code for code, in cursor.fetchall()]
+        assert len(descendants) == len(set(descendants))
+        assert set(descendants) == expected_descendants(classes, land_use)
+
+def test_level_view_has_one_row_per_level(cursor):
+    classes = read_classes()
+    load_land_use(cursor, classes)
+    max_level = max(land_use.level for land_use in classes)
+    levels = {land_use.code: land_use.level for land_use in classes}
+    cursor.execute(f"SELECT descendant_code, ancestor_level, ancestor_code, is_padding FROM {LEVEL_VIEW}")
+    rows = cursor.fetchall()
+    assert Counter(descendant for descendant, _, _, _ in rows) == {code: max_level for code in levels}
+    for descendant, level, ancestor, is_padding in rows:
+        assert is_padding == (level > levels[descendant])
+        assert ancestor == descendant or not is_padding
+
+def test_level_sums_match_level_one(cursor):
+    # Um valor por classe, agregado pela junção por ancestor_level descrita em LEVEL_VIEW_DDL
+    classes = read_classes()
+    load_land_use(cursor, classes)
+    cursor.execute("CREATE TEMP TABLE tmp_indicator (code int2, value float8) ON COMMIT DROP")
+    cursor.executemany("INSERT INTO tmp_indicator VALUES (%s, %s)",
+                       [(land_use.code, float(index + 1)) for index, land_use in enumerate(classes)])
+    cursor.execute(f"""
+        SELECT level.ancestor_level, SUM(indicator.value)
+        FROM tmp_indicator AS indicator
+        JOIN {LEVEL_VIEW} AS level ON level.descendant_code = indicator.code
+        GROUP BY level.ancestor_level
+    """)
+    sums = dict(cursor.fetchall())
+    assert len(sums) == max(land_use.level for land_use in classes)
+    assert set(sums.values()) == {sum(range(1, len(classes) + 1))}
@@ -0,0 +1,73 @@
+from decimal import Decimal
+from pathlib import Path
+import psycopg2.extensions
+import pytest
+from dimensions import relation_kind
+from response_cache import cached_response, warm_cache
+from rollup import rebuild_rollup, rollup_exists
+
+SERVICE_FILE = Path(__file__).resolve().parents[1] / 'app' / 'chart' / 'chart.service.ts'
+
+# Tipos do node-pg: numeric (oid 1700) chega ao ChartService como texto; float8 como número
+NUMERIC_AS_TEXT = psycopg2.extensions.new_type((1700,), 'NUMERIC_AS_TEXT', lambda value, cursor: value)
+
+# Consulta e result.map de cada endpoint em ChartService, por (kind, range_years)
+SUM_METHODS = ['findSumAnnual', 'findSumBiennial', 'findSumTriennial', 'findSumQuadrennial', 'findSumQuintennial']
+LIVE_ENDPOINTS = {
+    **{('sum', range_years): (method, lambda row, analysis: {'period': row['period_group'], 'entry': [row['label'], row['total_value']]})
+       for range_years, method in enumerate(SUM_METHODS, 1)},
+    ('percentage', 1): ('findPercentageAnnual', lambda row, analysis: {'period': row['start_period_group'], 'entry': [analysis, row['percentual_total']]}),
+    ('sma', 1): ('findMobileAverageAnnual', lambda row, analysis: {'period': row['start_period_group'], 'entry': [analysis, row['percentual_total']]}),
+    **{('percentage', range_years): ('findPercentage', lambda row, analysis: {
+        'period': f"{row['start_period_group']}-{row['end_period_group']}", 'entry': [analysis, row['percentual_total']]})
+       for range_years in range(2, 6)},
+    **{('sma', range_years): ('findMobileAverage', lambda row, analysis: {
+        'period': f"{row['start_period_group']}-{row['end_period_group']}", 'entry': [row['label'], row['media_total']]})
+       for range_years in range(2, 6)},
+}
+
+def service_query(method, analysis, range_years):
+    """Consulta de ChartService.<method> (template literal const query), filtrada só por analysis."""
+    source = SERVICE_FILE.read_text()
+    body = source[source.index(f'async {method}('):]
+    query = body[body.index('const query = `') + len('const query = `'):body.index('`;')]
+    return (query.replace('${whereClause}', f"WHERE tb_chart.analysis = '{analysis}'")
+            .replace('${range-1}', str(range_years - 1)).replace('${range}', str(range_years)))
+
+def live_response(cursor, kind, analysis, range_years):
+    """Resposta do endpoint sem o cache: a consulta do serviço com os tipos do node-pg."""
+    method, to_item = LIVE_ENDPOINTS[kind, range_years]
+    psycopg2.extensions.register_type(NUMERIC_AS_TEXT, cursor)
+    cursor.execute(service_query(method, analysis, range_years))
+    names = [column.name for column in cursor.description]
+    return [to_item(dict(zip(names, row)), analysis) for row in cursor.fetchall()]
+
+def assert_same_value(cached, live):
+    assert type(cached) is type(live)
+    if isinstance(live, str):
+        # Mesmas casas decimais do ROUND; o último dígito pode variar com a ordem das somas
+        exponent = Decimal(live).as_tuple().exponent
+        assert Decimal(cached).as_tuple().exponent == exponent
+        assert abs(Decimal(cached) - Decimal(live)) <= Decimal(1).scaleb(exponent)
+    elif live is not None:
+        assert cached == pytest.approx(live, rel=1e-9)
+
+def test_cached_responses_match_live_queries(cursor):
+    if relation_kind(cursor, 'tb_chart') is None:
+        pytest.skip("tb_chart não existe; aplique init.sql")
+    if not rollup_exists(cursor):
+        rebuild_rollup(cursor)
+    warm_cache(cursor, filters=(), force=True)
+    cursor.execute("SELECT DISTINCT analysis FROM tb_chart")
+    analyses = [analysis for analysis, in cursor.fetchall()]
+    if not analyses:
+        pytest.skip("tb_chart está vazia")
+
+    for analysis in analyses:
+        for kind, range_years in LIVE_ENDPOINTS:
+            cached = cached_response(cursor, kind, analysis, range_years)
+            live = live_response(cursor, kind, analysis, range_years)
+            assert [item['period'] for item in cached] == [item['period'] for item in live], (kind, analysis, range_years)
+            for cached_item, live_item in zip(cached, live):
+                assert cached_item['entry'][0] == live_item['entry'][0]
+                assert_same_value(cached_item['entry'][1], live_item['entry'][1])
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from data_mass_generator import ProfileSampler, delete_synthetic, profile_dataset
+from dataset_specs import get_dataset
+from db_utils import BulkWriter, FACT_TABLE
+from dimensions import relation_kind
+from loader import load_dataset, load_dataset_incremental
+from rollup import RollupDelta, rebuild_rollup, rollup_differences, rollup_exists
+from update_countries import apply_country_codes
+
+# Conjunto pequeno, com nomes de países (normalizados por apply_country_codes)
+DATASET = 'ouro_area_agricola_OCDE'
+
+def write_synthetic(cursor, name, scale=2):
+    """Grava scale cópias sintéticas do conjunto como uma fatia de generate_realistic."""
+    sampler = ProfileSampler(profile_dataset(name))
+    total = sampler.rows * scale
+    writer = BulkWriter(cursor, table=FACT_TABLE, binary=True)
+    rollup = RollupDelta.for_table(cursor, FACT_TABLE)
+    payload = sampler.encode(np.random.default_rng(0), writer.dimensions, get_dataset(name), 0, total, rollup)
+    writer.write_encoded(payload, total)
+    writer.close()
+    rollup.apply(cursor)
+    return total
+
+def test_incremental_rollup_matches_rebuild(cursor):
+    if relation_kind(cursor, 'tb_chart') is None:
+        pytest.skip("tb_chart não existe; aplique init.sql")
+    if not rollup_exists(cursor):
+        rebuild_rollup(cursor)
+    assert rollup_differences(cursor) == []
+    spec = get_dataset(DATASET)
+
+    assert load_dataset(cursor, spec) > 0
+    assert rollup_differences(cursor) == [], "carga"
+
+    deleted, loaded = load_dataset_incremental(cursor, DATASET, spec, force=True)
+    assert deleted >= loaded > 0
+    assert rollup_differences(cursor) == [], "recarga incremental"
+
+    report = apply_country_codes(cursor)
+    assert report['resolved']
+    assert rollup_differences(cursor) == [], "troca de nomes de países"
+
+    written = write_synthetic(cursor, DATASET)
+    assert rollup_differences(cursor) == [], "geração sintética"
+
+    assert delete_synthetic(cursor, [DATASET]) == written
+    assert rollup_differences(cursor) == [], "remoção sintética"
@@ -0,0 +1,65 @@
+import csv
+import numpy as np
+from columnar import columns_from_rows, decode
+from dataset_specs import get_dataset
+from loader import columnar_types
+from validation import REASONS, ChunkValidator, Quarantine
+import validation
+
+# country, state, period, label, value (COUNTRY_STATE_LAYOUT)
+SPEC = get_dataset('ouro_amonia_agro')
+HEADER = ['country', 'state', 'date', 'label', 'value']
+VALID = ['BR', 'SP', '2020-01-01', 'Fertilizante', '1.5']
+
+# Um bloco com uma linha válida e uma linha para cada motivo, na ordem de REASONS
+DIRTY_CHUNK = [
+    VALID,
+    ['BR', 'SP', '2020-01-01', 'Fertilizante'],
+    ['BR', 'SP', '2020-01-01', 'Fertilizante', 'abc'],
+    ['BR', 'SP', '2020-13-01', 'Fertilizante', '1.0'],
+    ['BR', 'SP', '1850-01-01', 'Fertilizante', '1.0'],
+    ['BR', 'XX', '2020-01-01', 'Fertilizante', '1.0'],
+    ['BR', 'SP', '2020-01-01', 'Outro rótulo', '1.0'],
+    VALID[:-1] + ['2.5'],
+]
+
+def validate_chunks(validator, chunks):
+    """Valida os blocos como stream_dataset e retorna os valores das linhas aceitas."""
+    accepted = []
+    for rows in chunks:
+        data = validator.validate(columns_from_rows(list(rows), SPEC.columns, columnar_types(SPEC)), rows)
+        accepted.extend(zip(decode(data.columns['state']), data.columns['period'].tolist(), data.columns['value'].tolist()))
+    return accepted
+
+def write_source(tmp_path, rows):
+    path = tmp_path / SPEC.file
+    with open(path, 'w', newline='') as file:
+        csv.writer(file).writerows([HEADER] + rows)
+    return str(path)
+
+def test_each_reason_is_quarantined(tmp_path):
+    second_chunk = [VALID[:-1] + ['3.0'], ['BR', 'RJ', '2020-01-01', 'Fertilizante', '4.0']]
+    quarantine = Quarantine(write_source(tmp_path, DIRTY_CHUNK + second_chunk), tmp_path / 'quarentena')
+    validator = ChunkValidator(SPEC, quarantine)
+    accepted = validate_chunks(validator, [DIRTY_CHUNK, second_chunk])
+    validator.close()
+
+    assert [(state, value) for state, _, value in accepted] == [('SP', 1.5), ('RJ', 4.0)]
+    # A chave repetida é rejeitada dentro do bloco e no bloco seguinte
+    assert validator.counts == {**dict.fromkeys(REASONS, 1), 'chave_duplicada': 2}
+    with open(quarantine.path, newline='') as file:
+        lines = list(csv.reader(file))
+    assert lines[0] == ['linha', 'motivo'] + HEADER
+    assert [(int(line), reason) for line, reason, *_ in lines[1:]] == list(zip(range(3, 11), REASONS + ('chave_duplicada',)))
+    assert lines[1][2:] == DIRTY_CHUNK[1]
+
+def test_hash_collision_is_not_a_duplicate(monkeypatch):
+    # Todos os hashes iguais: só os valores da chave distinguem as linhas
+    monkeypatch.setattr(validation, '_column_hash', lambda column: np.zeros(len(getattr(column, 'codes', column)), dtype=np.uint64))
+    first = [VALID, ['BR', 'RJ', '2020-01-01', 'Fertilizante', '2.0'], ['BR', 'SP', '2021-01-01', 'Fertilizante', '3.0']]
+    second = [['BR', 'MG', '2020-01-01', 'Fertilizante', '4.0'], ['BR', 'RJ', '2020-01-01', 'Fertilizante', '5.0']]
+    validator = ChunkValidator(SPEC)
+    accepted = validate_chunks(validator, [first, second])
+
+    assert [value for _, _, value in accepted] == [1.5, 2.0, 3.0, 4.0]
+    assert validator.summary() == {'chave_duplicada': 1}
@@ -1,6 +1,9 @@
-import os
+import sys
+from functools import lru_cache
 from iso3166 import countries
-from db_utils import get_db_connection
+from psycopg2.extras import execute_values
+from db_utils import run_in_transaction, FACT_TABLE
+from rollup import rename_rollup_values
 
 # Mapeamento manual para os nomes de países que não estão padronizados
 country_name_to_iso = {
@@ -27,60 +30,91 @@ country_name_to_iso = {
     "Viet Nam": "VN"
 }
 
-def update_country_codes():
+@lru_cache(maxsize=None)
+def resolve_country_code(country_name):
+    """Resolve um nome de país para o código ISO 3166-1 alfa-2; retorna None se não encontrar."""
+    # Supondo que valores numéricos (ex.: "1") representam o Brasil
+    if country_name.isdigit():
+        return "BR"
+
+    name = country_name.strip()
+    country_code = country_name_to_iso.get(name)
+    if country_code:
+        return country_code
     try:
-        # Conectando ao banco de dados usando o utilitário
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        return countries.get(name).alpha2
+    except KeyError:
+        return None
+
+def apply_country_codes(cursor, table=FACT_TABLE):
+    """
+    Resolve e substitui os nomes de países da tabela dentro da transação do cursor; em
+    FACT_TABLE, os grupos da rollup com esses nomes são movidos para os códigos.
+    Retorna o relatório descrito em update_country_codes.
+    """
+    report = {'updated': 0, 'resolved': {}, 'unresolved': {}}
 
-        # Consulta para selecionar registros com nomes de países ou valores numéricos
-        select_query = """
-        SELECT id, country FROM tb_chart
-        WHERE LENGTH(country) > 2 OR country ~ '^[0-9]+$'
-        """
-        cursor.execute(select_query)
-        rows = cursor.fetchall()
+    # Valores distintos de países com nomes ou valores numéricos
+    select_query = f"""
+    SELECT country, COUNT(*) FROM {table}
+    WHERE LENGTH(country) > 2 OR country ~ '^[0-9]+$'
+    GROUP BY country
+    """
+    cursor.execute(select_query)
 
-        # Mapeamento e atualização dos códigos de países
-        updated_count = 0
-        for row in rows:
-            record_id, country_name = row
+    for country_name, count in cursor.fetchall():
+        country_code = resolve_country_code(country_name)
+        if country_code:
+            report['resolved'][country_name] = country_code
+        else:
+            report['unresolved'][country_name.strip()] = report['unresolved'].get(country_name.strip(), 0) + count
 
-            # Verifica se o valor de `country` é um número
-            if country_name.isdigit():
-                # Supondo que o número "1" representa o Brasil
-                country_code = "BR"
-            else:
-                # Tenta obter o código ISO 3166-1 alfa-2 para o país
-                country_code = country_name_to_iso.get(country_name.strip())
-                if not country_code:
-                    try:
-                        country_code = countries.get(country_name.strip()).alpha2
-                    except KeyError:
-                        print(f"País não encontrado: {country_name.strip()}")
-                        continue
+    if report['resolved']:
+        cursor.execute("""
+            CREATE TEMP TABLE tmp_country_code (
+                country_name varchar(2000) PRIMARY KEY,
+                country_code varchar(2) NOT NULL
+            ) ON COMMIT DROP
+        """)
+        execute_values(cursor, "INSERT INTO tmp_country_code (country_name, country_code) VALUES %s", list(report['resolved'].items()))
 
-            # Atualiza o registro no banco de dados
-            update_query = """
-            UPDATE tb_chart
-            SET country = %s, updated_at = NOW()
-            WHERE id = %s
-            """
-            cursor.execute(update_query, (country_code, record_id))
-            updated_count += 1
+        # Atualiza todos os registros com uma única junção
+        cursor.execute(f"""
+            UPDATE {table} AS chart
+            SET country = m.country_code, updated_at = NOW()
+            FROM tmp_country_code AS m
+            WHERE chart.country = m.country_name
+        """)
+        report['updated'] = cursor.rowcount
+        if table == FACT_TABLE:
+            rename_rollup_values(cursor, 'country', report['resolved'])
+    return report
 
-        # Confirmando a transação
-        conn.commit()
-        print(f"\nTotal de registros atualizados: {updated_count}")
+def update_country_codes(table=FACT_TABLE):
+    """
+    Substitui nomes de países e códigos numéricos da tabela (tb_chart_fact por padrão) pelo
+    código ISO 3166-1 alfa-2.
 
+    Cada valor distinto de country é resolvido uma única vez e o resultado é aplicado
+    com um único UPDATE ... FROM, de forma que o custo depende do número de países
+    distintos e não do número de registros; a transação é repetida em erros transitórios.
+    Retorna um relatório com os registros atualizados, os nomes resolvidos e os nomes
+    não encontrados (com o número de registros), ou None em caso de erro.
+    """
+    try:
+        report = run_in_transaction(apply_country_codes, table)
     except Exception as error:
         print(f"Erro ao atualizar os códigos dos países: {error}")
-    finally:
-        # Fecha o cursor e a conexão
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+        return None
+
+    print(f"\nTotal de registros atualizados: {report['updated']} ({len(report['resolved'])} países distintos)")
+    if report['unresolved']:
+        print("Países não encontrados (registros):")
+        for country_name, count in sorted(report['unresolved'].items()):
+            print(f"  {country_name}: {count}")
+
+    return report
 
 if __name__ == "__main__":
-    update_country_codes()
+    if update_country_codes() is None:
+        sys.exit(1)
@@ -1,5 +1,9 @@
-from db_utils import get_db_connection
+from db_utils import run_in_transaction, FACT_TABLE
+from geocodes import GEOCODE_FILE, MANUAL_CORRECTIONS
+from rollup import rename_rollup_values
+from psycopg2.extras import execute_values
 import csv
+import sys
 
 def load_geocode_mapping(filename):
     """Carrega o mapeamento de geocódigos para estados a partir de um arquivo CSV."""
@@ -14,57 +18,79 @@ def load_geocode_mapping(filename):
             geocode_to_state[geocode] = state
     return geocode_to_state
 
-def update_states(filename):
-    try:
-        # Conexão com o banco de dados usando o utilitário
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Carregar o mapeamento dos geocódigos
-        geocode_to_state = load_geocode_mapping(filename)
-
-        # Atualiza os estados na tabela tb_chart
-        for geocode, state in geocode_to_state.items():
-            update_query = """
-                UPDATE tb_chart
-                SET state = %s
-                WHERE state = %s
-            """
-            cursor.execute(update_query, (state, geocode))
+def apply_state_mapping(cursor, geocode_to_state, table=FACT_TABLE):
+    """
+    Aplica o mapeamento geocódigo -> UF na tabela, dentro da transação do cursor; em
+    FACT_TABLE, os grupos da rollup com os geocódigos são movidos para as siglas.
+    Retorna (registros alterados por UF, estados ainda numéricos ou nulos).
+    """
+    cursor.execute("""
+        CREATE TEMP TABLE tmp_geocode_state (
+            geocode varchar(20) PRIMARY KEY,
+            state varchar(2) NOT NULL
+        ) ON COMMIT DROP
+    """)
+    execute_values(cursor, "INSERT INTO tmp_geocode_state (geocode, state) VALUES %s", list(geocode_to_state.items()))
 
-        # Corrige os estados restantes com código 1 e 34, se existirem
-        manual_corrections = {'1': 'DF', '34': 'SP'}
-        for old_code, new_state in manual_corrections.items():
-            cursor.execute("UPDATE tb_chart SET state = %s WHERE state = %s", (new_state, old_code))
+    # Atualiza os estados da tabela com uma única junção
+    cursor.execute(f"""
+        WITH updated AS (
+            UPDATE {table} AS chart
+            SET state = m.state
+            FROM tmp_geocode_state AS m
+            WHERE chart.state = m.geocode
+            RETURNING chart.state
+        )
+        SELECT state, COUNT(*) FROM updated GROUP BY state ORDER BY state
+    """)
+    updated_by_state = dict(cursor.fetchall())
+    if table == FACT_TABLE:
+        rename_rollup_values(cursor, 'state', geocode_to_state)
 
-        # Confirma as mudanças
-        conn.commit()
-        print("Estados atualizados com sucesso.")
+    # Verificação dos estados que ainda estão numéricos ou inválidos
+    cursor.execute(f"""
+        SELECT DISTINCT state
+        FROM {table}
+        WHERE state ~ '^[0-9]+$' OR state IS NULL
+    """)
+    return updated_by_state, [state for state, in cursor.fetchall()]
 
-        # Verificação dos estados que ainda estão numéricos ou inválidos
-        check_query = """
-            SELECT DISTINCT state
-            FROM tb_chart
-            WHERE state ~ '^[0-9]+$' OR state IS NULL
-        """
-        cursor.execute(check_query)
-        invalid_states = cursor.fetchall()
+def update_states(filename, table=FACT_TABLE):
+    """
+    Normaliza os códigos numéricos de estado da tabela (tb_chart_fact por padrão) para a sigla da UF.
+    As cargas já gravam a sigla (loader.encode_dataset_columns); isto só é necessário para
+    registros gravados antes disso.
 
-        if invalid_states:
-            print("Estados ainda numéricos ou inválidos encontrados:")
-            for state in invalid_states:
-                print(state[0])
-        else:
-            print("Nenhum estado numérico ou inválido encontrado.")
+    O mapeamento distinto geocódigo -> UF (incluindo as correções manuais) é
+    carregado em uma tabela temporária e aplicado com um único UPDATE ... FROM,
+    em vez de um UPDATE por geocódigo, em uma transação repetida em erros transitórios.
+    Retorna o número de registros alterados por UF, ou None em caso de erro.
+    """
+    try:
+        # Carregar o mapeamento dos geocódigos, com as correções manuais
+        geocode_to_state = load_geocode_mapping(filename)
+        for old_code, new_state in MANUAL_CORRECTIONS.items():
+            geocode_to_state.setdefault(old_code, new_state)
 
+        updated_by_state, invalid_states = run_in_transaction(apply_state_mapping, geocode_to_state, table)
     except Exception as e:
         print("Erro ao atualizar os estados:", e)
+        return None
+
+    print("Estados atualizados com sucesso.")
+    for state, count in updated_by_state.items():
+        print(f"  {state}: {count} registros")
+    print(f"Total de registros atualizados: {sum(updated_by_state.values())}")
+
+    if invalid_states:
+        print("Estados ainda numéricos ou inválidos encontrados:")
+        for state in invalid_states:
+            print(state)
+    else:
+        print("Nenhum estado numérico ou inválido encontrado.")
 
-    finally:
-        # Fecha a conexão com o banco de dados
-        if conn:
-            cursor.close()
-            conn.close()
+    return updated_by_state
 
 if __name__ == "__main__":
-    update_states('src/db/ouro_ibge_geocodigo.csv')
+    if update_states(GEOCODE_FILE) is None:
+        sys.exit(1)
@@ -0,0 +1,218 @@
+import csv
+import os
+from datetime import date
+from functools import lru_cache
+import numpy as np
+from columnar import DictColumn, INVALID_DATE, take
+from dataset_specs import LABELS_BY_ANALYSIS
+from geocodes import geocode_index
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Diretório dos arquivos de quarentena, um CSV por arquivo carregado
+QUARANTINE_DIR = os.getenv('QUARANTINE_DIR', os.path.join(DATA_DIR, 'quarentena'))
+
+# Datas aceitas em period; o início é o mesmo usado pela API (ChartService.getWhereClause)
+MIN_PERIOD = date(1900, 1, 1)
+
+# Motivos de rejeição, na ordem em que são verificados; cada linha recebe só o primeiro
+# motivo encontrado. O código gravado na quarentena é o nome do motivo.
+REASONS = (
+    'linha_incompleta',
+    'valor_invalido',
+    'data_invalida',
+    'data_fora_do_intervalo',
+    'uf_desconhecida',
+    'rotulo_desconhecido',
+    'chave_duplicada',
+)
+
+# Multiplicador usado para combinar os hashes das colunas da chave
+_HASH_MULTIPLIER = np.uint64(0x100000001B3)
+
+@lru_cache(maxsize=None)
+def known_states():
+    """Códigos aceitos em state: os do índice de geocódigos do IBGE (UFs, siglas e municípios)."""
+    return geocode_index().codes()
+
+def _unknown(column, allowed):
+    """Máscara das linhas de uma DictColumn cujo valor não está em allowed (um teste por valor distinto)."""
+    unknown = np.fromiter((value not in allowed for value in column.values), dtype=bool, count=len(column.values))
+    return unknown[column.codes]
+
+def _column_hash(column):
+    """Hash de 64 bits de cada linha de uma coluna, calculado uma vez por valor distinto."""
+    if isinstance(column, DictColumn):
+        hashes = np.fromiter((hash(value) for value in column.values), dtype=np.int64, count=len(column.values))
+        return hashes.view(np.uint64)[column.codes]
+    return np.asarray(column).astype(np.int64).view(np.uint64)
+
+def _column_values(column):
+    """Valor de cada linha de uma coluna; os códigos de uma DictColumn só valem no seu bloco."""
+    if isinstance(column, DictColumn):
+        return np.array(column.values, dtype=object)[column.codes]
+    return np.asarray(column)
+
+class Quarantine:
+    """
+    Grava as linhas rejeitadas de um arquivo em QUARANTINE_DIR/<arquivo>, com o número da
+    linha no arquivo original e o motivo, seguidos das colunas originais. O arquivo só é
+    criado quando a primeira linha é rejeitada.
+    """
+
+    def __init__(self, source_path, directory=None):
+        self.source_path = source_path
+        self.path = os.path.join(directory or QUARANTINE_DIR, os.path.basename(source_path))
+        self._file = None
+        self._writer = None
+
+    def _open(self):
+        with open(self.source_path, 'r', newline='') as file:
+            header = next(csv.reader(file), [])
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self.path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(['linha', 'motivo'] + header)
+
+    def write(self, lines, reasons, rows):
+        """Grava as linhas rejeitadas (números das linhas, motivos e valores originais)."""
+        if self._writer is None:
+            self._open()
+        self._writer.writerows([line, reason] + list(row) for line, reason, row in zip(lines, reasons, rows))
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def remove_previous(self):
+        """Remove a quarentena de uma carga anterior do mesmo arquivo."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+class ChunkValidator:
+    """
+    Valida blocos de colunas de um DatasetSpec de uma só vez, sem laço por linha.
+
+    Verifica, nesta ordem: linhas incompletas, valores não numéricos, datas inválidas ou
+    fora de [MIN_PERIOD, hoje], UF desconhecida (ver known_states), rótulo fora de
+    LABELS_BY_ANALYSIS para o indicador do spec e chaves repetidas. A chave é formada por
+    todas as colunas do spec exceto value; a primeira ocorrência é aceita e as seguintes,
+    mesmo em outros blocos, são rejeitadas. As chaves são comparadas por um hash de 64 bits;
+    quando o hash se repete, a repetição é confirmada pelos valores da chave.
+
+    As linhas rejeitadas vão para a quarentena (se houver) e são contadas por motivo.
+    """
+
+    def __init__(self, spec, quarantine=None):
+        self.spec = spec
+        self.quarantine = quarantine
+        self.width = max(spec.columns.values()) + 1
+        self.key_columns = [name for name in spec.columns if name != 'value']
+        self.labels = LABELS_BY_ANALYSIS.get(spec.analysis)
+        self.counts = dict.fromkeys(REASONS, 0)
+        self._seen = np.empty(0, dtype=np.uint64)
+        # Valores das colunas da chave de cada hash em _seen, na mesma ordem
+        self._seen_values = [np.empty(0, dtype=object) for _ in self.key_columns]
+        self._offset = 0
+
+    def _reasons(self, data, rows):
+        """Código (índice em REASONS + 1) do primeiro motivo de rejeição de cada linha; 0 se válida."""
+        codes = np.zeros(data.length, dtype=np.int8)
+
+        def reject(mask, reason):
+            codes[(codes == 0) & mask] = REASONS.index(reason) + 1
+
+        columns = data.columns
+        if rows is not None:
+            reject(np.fromiter(map(len, rows), dtype=np.int64, count=len(rows)) < self.width, 'linha_incompleta')
+        if 'value' in columns:
+            reject(~np.isfinite(columns['value']), 'valor_invalido')
+        if 'period' in columns:
+            period = columns['period']
+            reject(period == INVALID_DATE, 'data_invalida')
+            reject((period < MIN_PERIOD.toordinal()) | (period > date.today().toordinal()), 'data_fora_do_intervalo')
+        # Outros erros de conversão que não puderam ser atribuídos a uma coluna
+        reject(data.errors, 'linha_incompleta')
+        if 'state' in columns:
+            reject(_unknown(columns['state'], known_states()), 'uf_desconhecida')
+        if 'label' in columns and self.labels is not None:
+            reject(_unknown(columns['label'], self.labels), 'rotulo_desconhecido')
+
+        reject(self._duplicates(data, codes == 0), 'chave_duplicada')
+        return codes
+
+    def _duplicates(self, data, candidates):
+        """
+        Máscara das linhas candidatas cuja chave já apareceu (neste bloco ou em blocos
+        anteriores). Só as linhas com um hash repetido são comparadas pelos valores da
+        chave, de forma que uma colisão de hashes não rejeita uma linha válida.
+        """
+        positions = np.flatnonzero(candidates)
+        keys = np.zeros(len(positions), dtype=np.uint64)
+        for name in self.key_columns:
+            keys = (keys * _HASH_MULTIPLIER) ^ _column_hash(data.columns[name])[positions]
+        values = [_column_values(data.columns[name])[positions] for name in self.key_columns]
+
+        # Hashes repetidos dentro do bloco ou já vistos em blocos anteriores
+        order = np.argsort(keys, kind='stable')
+        same = keys[order[1:]] == keys[order[:-1]]
+        suspect = np.zeros(len(keys), dtype=bool)
+        suspect[order[1:][same]] = True
+        suspect[order[:-1][same]] = True
+        first = np.searchsorted(self._seen, keys, side='left')
+        last = np.searchsorted(self._seen, keys, side='right')
+        suspect |= last > first
+
+        # Confirmação pelos valores, na ordem das linhas: a primeira ocorrência é aceita
+        repeated = np.zeros(len(keys), dtype=bool)
+        groups = {}
+        for index in np.flatnonzero(suspect).tolist():
+            group = groups.get(int(keys[index]))
+            if group is None:
+                group = groups[int(keys[index])] = {
+                    tuple(column[seen] for column in self._seen_values) for seen in range(first[index], last[index])}
+            key = tuple(column[index] for column in values)
+            if key in group:
+                repeated[index] = True
+            else:
+                group.add(key)
+
+        duplicates = np.zeros(data.length, dtype=bool)
+        duplicates[positions[repeated]] = True
+        seen = np.concatenate([self._seen, keys[~repeated]])
+        order = np.argsort(seen, kind='stable')
+        self._seen = seen[order]
+        self._seen_values = [np.concatenate([previous, column[~repeated]])[order]
+                             for previous, column in zip(self._seen_values, values)]
+        return duplicates
+
+    def validate(self, data, rows=None):
+        """
+        Retorna as linhas válidas do bloco. rows são as linhas originais do CSV
+        correspondentes ao bloco, gravadas na quarentena quando rejeitadas.
+        """
+        codes = self._reasons(data, rows)
+        rejected = np.flatnonzero(codes)
+        if len(rejected):
+            for code, count in enumerate(np.bincount(codes[rejected], minlength=len(REASONS) + 1)[1:]):
+                self.counts[REASONS[code]] += int(count)
+            if self.quarantine is not None:
+                lines = (rejected + self._offset + 2).tolist()  # linha no arquivo, contando o cabeçalho
+                rejected_rows = [rows[index] if rows is not None else [] for index in rejected.tolist()]
+                reasons = [REASONS[code - 1] for code in codes[rejected].tolist()]
+                self.quarantine.write(lines, reasons, rejected_rows)
+        self._offset += data.length
+        return take(data, codes == 0) if len(rejected) else data
+
+    @property
+    def rejected(self):
+        return sum(self.counts.values())
+
+    def summary(self):
+        """Contagem das linhas rejeitadas por motivo, só com os motivos que ocorreram."""
+        return {reason: count for reason, count in self.counts.items() if count}
+
+    def close(self):
+        if self.quarantine is not None:
+            self.quarantine.close()